@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+from telemetry_log import read_cpu_temperature
+
+"""
+Adaptive recording profile.
+The recorder samples CPU load, SoC temperature, the write-behind queue (SD
+write throughput) and the dropped-frame rate every loop; the controller
+steps one profile down as soon as any of them is under pressure, and one
+step back up after a sustained healthy period. Pressure switches are
+applied at the next segment boundary. A flight phase set by telecommand
+caps the best allowed profile and is applied right away.
+
+Profiles go from best (index 0) to lightest.
+"""
+
+PROFILES = (
+    {"name": "640x480@120", "size": (640, 480), "frame_duration": 8333, "bitrate": None},
+    {"name": "640x480@60", "size": (640, 480), "frame_duration": 16667, "bitrate": 5_000_000},
+    {"name": "480x360@30", "size": (480, 360), "frame_duration": 33333, "bitrate": 2_500_000},
+)
+PHASES = {  # phase id: (name, best allowed profile)
+    0: ("pad", 2),
+    1: ("ascent", 0),
+    2: ("descent", 1),
+    3: ("auto", 0),
+}
+PAD_PHASE, ASCENT_PHASE, DESCENT_PHASE, AUTO_PHASE = range(4)
+DEFAULT_PHASE = AUTO_PHASE
+
+MAX_DROP_RATE = 0.01  # share of frames lost
+MAX_TEMPERATURE = 75.0  # C, the Pi firmware soft-throttles at 80
+MAX_LOAD = 0.9  # share of CPU time busy, all cores
+MAX_QUEUE_FILL = 0.5  # share of the write-behind queue in use
+WINDOW_SAMPLES = 20  # drop and write rates are measured over the last 20 samples (10 s)
+PRESSURE_SAMPLES = 4  # consecutive samples under pressure before stepping down
+HEALTHY_SAMPLES = 60  # consecutive healthy samples before stepping up
+
+
+def read_cpu_times():
+    """(busy, total) jiffies from /proc/stat, None where unavailable"""
+    try:
+        with open("/proc/stat") as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    return sum(values) - idle, sum(values)
+
+
+class ProfileController:
+
+    def __init__(self, index=0, log=print):
+        self.index = index
+        self.phase = DEFAULT_PHASE
+        self.ceiling = PHASES[DEFAULT_PHASE][1]
+        self.log = log
+        self.lock = threading.Lock()
+        self.switches = 0
+        self.healthy_streak = 0
+        self.pressure_streak = 0
+        self.immediate = None  # target set by a phase change, applied without waiting
+        self.reason = ""
+        self.pressure = None  # description of what is under pressure, None when healthy
+        self.metrics = {}
+        self.window = deque(maxlen=WINDOW_SAMPLES)  # (time, frames, dropped, bytes) per sample
+        self.last_cpu = read_cpu_times()
+
+    @property
+    def profile(self):
+        return PROFILES[self.index]
+
+    def set_phase(self, phase):
+        if phase not in PHASES:
+            self.log(f"Unknown flight phase {phase}, ignored")
+            return
+        with self.lock:
+            self.phase = phase
+            self.ceiling = PHASES[phase][1]
+            if self.index != self.ceiling:
+                self.immediate = self.ceiling
+                self.reason = f"phase {PHASES[phase][0]}"
+        self.log(f"Flight phase: {PHASES[phase][0]}")
+
+    def sample(self, frames, dropped, bytes_written, queue_fill, load=None, temperature=None):
+        """Called by the recording loop with cumulative counters"""
+        now = time.monotonic()
+        if load is None:
+            # CPU busy share since the previous sample; the load average lags by minutes
+            cpu = read_cpu_times()
+            load = 0.0
+            if cpu and self.last_cpu and cpu[1] > self.last_cpu[1]:
+                load = (cpu[0] - self.last_cpu[0]) / (cpu[1] - self.last_cpu[1])
+            self.last_cpu = cpu
+        if temperature is None:
+            temperature = read_cpu_temperature()
+        with self.lock:
+            self.window.append((now, frames, dropped, bytes_written))
+            if len(self.window) < 2:
+                return
+            first = self.window[0]
+            elapsed = now - first[0]
+            new_frames = frames - first[1] + dropped - first[2]
+            drop_rate = (dropped - first[2]) / new_frames if new_frames > 0 else 0.0
+            write_rate = (bytes_written - first[3]) / elapsed if elapsed > 0 else 0.0
+            self.metrics = {"drop_rate": drop_rate, "temperature": temperature, "load": load,
+                            "queue_fill": queue_fill, "write_rate": write_rate}
+            pressure = []
+            if drop_rate > MAX_DROP_RATE:
+                pressure.append(f"drop rate {drop_rate:.1%}")
+            if temperature == temperature and temperature > MAX_TEMPERATURE:  # nan: no sensor
+                pressure.append(f"temperature {temperature:.1f} C")
+            if load > MAX_LOAD:
+                pressure.append(f"load {load:.2f}")
+            if queue_fill > MAX_QUEUE_FILL:
+                pressure.append(f"write queue {queue_fill:.0%} full")
+            if pressure:
+                self.healthy_streak = 0
+                self.pressure_streak += 1
+                self.pressure = ", ".join(pressure)
+            else:
+                self.healthy_streak += 1
+                self.pressure_streak = 0
+                self.pressure = None
+
+    def target(self):
+        """(profile index, immediate) if a switch is due, else None"""
+        with self.lock:
+            if self.immediate is not None:
+                return self.immediate, True
+            if self.pressure_streak >= PRESSURE_SAMPLES and self.index < len(PROFILES) - 1:
+                self.reason = self.pressure
+                return self.index + 1, False
+            if self.index > self.ceiling and self.healthy_streak >= HEALTHY_SAMPLES:
+                self.reason = f"healthy for {self.healthy_streak} samples"
+                return self.index - 1, False
+            if self.index < self.ceiling:
+                self.reason = f"phase {PHASES[self.phase][0]}"
+                return self.ceiling, False
+            return None
+
+    def switched(self, index):
+        with self.lock:
+            previous = self.index
+            self.index = index
+            self.switches += 1
+            self.healthy_streak = 0
+            self.pressure_streak = 0
+            self.immediate = None
+            self.pressure = None
+            self.window.clear()
+            reason = self.reason
+        self.log(f"Profile switch: {PROFILES[previous]['name']} -> {PROFILES[index]['name']} ({reason})")
+
+    def status_counters(self):
+        """Compact form for the status frame and the telemetry log"""
+        return {"profile": self.index, "phase": self.phase, "profile_switches": self.switches}
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+"""
+End-to-end benchmark on the mock camera backend (no Pi needed).
+Runs the recording loop and monitor of task_manager.CameraManager, then
+the telecommand dispatcher of test_video.CameraManager, in a scratch
+directory, and reports frames written, segment boundary gaps, CPU time per
+thread and command latency.
+
+Usage: python bench_camera.py [--seconds 10] [--segment 2] [--drop-rate 0.01]
+                              [--stall-every 600 --stall-seconds 0.2] [--json out.json]
+"""
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def thread_cpu_times():
+    """CPU seconds per live thread, keyed by thread name"""
+    times = {}
+    for thread in threading.enumerate():
+        try:
+            clock = time.pthread_getcpuclockid(thread.ident)
+            times[thread.name] = time.clock_gettime(clock)
+        except (AttributeError, OSError, TypeError):
+            continue
+    return times
+
+
+def bench_recording(seconds, segment_seconds):
+    import camera_utils
+    import task_manager
+    from pts_analysis import analyze_directory
+
+    manager = task_manager.CameraManager()
+    picam = camera_utils.init_camera()
+    stop_event = threading.Event()
+    camera_thread = threading.Thread(target=camera_utils.record_h264_segments, name="camera",
+                                     args=(picam, manager, None, stop_event),
+                                     kwargs={"segment_seconds": segment_seconds})
+    threading.Thread(target=manager.monitor_size, name="monitor", daemon=True).start()
+
+    wall_start = time.perf_counter()
+    camera_thread.start()
+    time.sleep(seconds)
+    cpu = thread_cpu_times()
+    stop_event.set()
+    camera_thread.join()
+    wall = time.perf_counter() - wall_start
+
+    output = manager.recording_output
+    pts = analyze_directory(manager.main_video_path)
+    gaps = [g["gap_ms"] for g in pts["boundary_gaps"] if g["gap_ms"] is not None]
+    write_behind = manager.write_behind
+    return {
+        "wall_seconds": wall,
+        "frames_written": output.frames_written,
+        "bytes_written": output.bytes_written,
+        "frames_dropped": output.frames_dropped,
+        "segments": pts["segments"],
+        "effective_fps": pts["effective_fps"],
+        "max_boundary_gap_ms": max(gaps) if gaps else None,
+        "write_latency": output.storage.latency_percentiles() if output.storage else {},
+        "write_behind_high_water": write_behind.high_water_bytes if write_behind else 0,
+        "backpressure_events": write_behind.backpressure_events if write_behind else 0,
+        "cpu_seconds_per_thread": cpu,
+        "frame_stats": manager.frame_stats.snapshot() if manager.frame_stats else None,
+    }
+
+
+def bench_commands(repeats):
+    import test_video
+
+    manager = test_video.CameraManager()
+    manager.SELFIE_DELAY = 0
+    manager.picam = test_video.camera_utils.init_camera()
+    latencies = {}
+
+    def dispatcher():
+        while True:
+            received_at, payload = manager.tc_queue.get()
+            if payload is None:
+                return
+            manager.dispatch(received_at, payload)
+            latencies.setdefault(payload.hex(), []).append(manager.last_tc_latency)
+
+    # Drop the START queued by the constructor, the sequence below drives it
+    manager.tc_queue.get()
+    thread = threading.Thread(target=dispatcher, name="dispatcher")
+    thread.start()
+    for _ in range(repeats):
+        manager.submit(manager.START_RECORDING_OPCODE)
+        time.sleep(0.5)
+        manager.submit(manager.SELFIE_OPCODE)
+        time.sleep(0.2)
+        manager.submit(manager.STOP_RECORDING_OPCODE)
+        time.sleep(0.2)
+    manager.tc_queue.put((time.monotonic(), None))
+    thread.join()
+    test_video.camera_utils.still_worker.shutdown(wait=True)
+    return {opcode: {"mean_ms": sum(v) / len(v) * 1e3, "max_ms": max(v) * 1e3}
+            for opcode, v in latencies.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark on the mock camera")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--segment", type=float, default=2, help="segment length in seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--stall-every", type=int, default=0)
+    parser.add_argument("--stall-seconds", type=float, default=0.0)
+    parser.add_argument("--commands", type=int, default=3, help="START/SELFIE/STOP rounds")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    os.environ["GTXR_CAMERA_BACKEND"] = "mock"
+    sys.path.insert(0, REPO_DIR)
+    import mock_camera
+    mock_camera.SETTINGS.update(drop_rate=args.drop_rate, stall_every=args.stall_every,
+                                stall_seconds=args.stall_seconds)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        results = {
+            "recording": bench_recording(args.seconds, args.segment),
+            "commands": bench_commands(args.commands),
+        }
+        os.chdir(REPO_DIR)
+
+    rec = results["recording"]
+    print(f"Frames written: {rec['frames_written']} in {rec['wall_seconds']:.1f} s "
+          f"({rec['segments']} segments, {rec['frames_dropped']} dropped)")
+    print(f"Effective fps: {rec['effective_fps']}")
+    print(f"Largest segment boundary gap: {rec['max_boundary_gap_ms']} ms")
+    print(f"Write latency: {rec['write_latency']}")
+    print(f"Write-behind high water: {rec['write_behind_high_water']} bytes, "
+          f"backpressure events: {rec['backpressure_events']}")
+    if rec["frame_stats"]:
+        stats = rec["frame_stats"]
+        print(f"Frame stats: {stats['frames']} sensor frames, {stats['sensor_drops']} dropped, "
+              f"interval p99 < {stats['interval_p99']} us, latency p99 < {stats['latency_p99']} us")
+    print("CPU seconds per thread:")
+    for name, cpu in sorted(rec["cpu_seconds_per_thread"].items()):
+        print(f"\t{name}: {cpu:.3f}")
+    print("Command latency (receive to execution):")
+    for opcode, stats in results["commands"].items():
+        print(f"\t0x{opcode}: mean {stats['mean_ms']:.3f} ms, max {stats['max_ms']:.3f} ms")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
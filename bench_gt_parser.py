@@ -0,0 +1,79 @@
+import random
+import time
+from gt_packet_rasp_pi import GTPacketParser, build_gt_packet, crc16_ccitt_false
+
+"""
+Microbenchmark: per-byte GTPacketParser.read_byte vs bulk GTPacketParser.feed
+Usage: python bench_gt_parser.py [n_packets] [chunk_size]
+"""
+
+
+def crc16_ccitt_false_bitwise(data: bytes) -> int:
+    """Original bit-by-bit CRC, kept here as the reference"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= (byte << 8)
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+    return crc
+
+
+def make_stream(n_packets, seed=0):
+    rng = random.Random(seed)
+    payloads = [bytes(rng.randrange(256) for _ in range(rng.randrange(1, 256)))
+                for _ in range(n_packets)]
+    return payloads, b"".join(build_gt_packet(p) for p in payloads)
+
+
+def bench_per_byte(stream):
+    parser = GTPacketParser()
+    received = []
+    start = time.perf_counter()
+    for byte in stream:
+        success, payload = parser.read_byte(byte)
+        if success:
+            received.append(payload)
+    return time.perf_counter() - start, received
+
+
+def bench_feed(stream, chunk_size):
+    parser = GTPacketParser()
+    received = []
+    start = time.perf_counter()
+    for i in range(0, len(stream), chunk_size):
+        received.extend(parser.feed(stream[i:i + chunk_size]))
+    return time.perf_counter() - start, received
+
+
+def bench_crc(stream):
+    start = time.perf_counter()
+    crc16_ccitt_false_bitwise(stream)
+    bitwise = time.perf_counter() - start
+    start = time.perf_counter()
+    crc16_ccitt_false(stream)
+    table = time.perf_counter() - start
+    return bitwise, table
+
+
+if __name__ == "__main__":
+    import sys
+    n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+
+    payloads, stream = make_stream(n_packets)
+    print(f"{n_packets} packets, {len(stream)} bytes, chunk size {chunk_size}")
+
+    bitwise, table = bench_crc(stream)
+    print(f"CRC bitwise: {bitwise * 1e3:8.2f} ms  ({len(stream) / bitwise / 1e3:8.1f} kB/s)")
+    print(f"CRC table:   {table * 1e3:8.2f} ms  ({len(stream) / table / 1e3:8.1f} kB/s)")
+
+    t_byte, rx_byte = bench_per_byte(stream)
+    t_feed, rx_feed = bench_feed(stream, chunk_size)
+    assert rx_byte == payloads and rx_feed == payloads, "parser output mismatch"
+    print(f"read_byte:   {t_byte * 1e3:8.2f} ms  ({len(stream) / t_byte / 1e3:8.1f} kB/s)")
+    print(f"feed:        {t_feed * 1e3:8.2f} ms  ({len(stream) / t_feed / 1e3:8.1f} kB/s)")
+    print(f"Speedup: {t_byte / t_feed:.1f}x  (link at 115200 baud is ~11.5 kB/s)")
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import random
+import select
+import subprocess
+import threading
+import time
+import tty
+from datetime import datetime
+from gt_packet import GTPacket
+from gt_packet_rasp_pi import GTPacketParser, build_gt_packet
+
+"""
+Serial link benchmark over pty pairs (no socat, no hardware).
+The camera side is a GTPacket on the pty slave; the flight computer side
+writes to the pty master, paced at the simulated baud rate (a pty itself
+has no baud rate), with random bit flips at the given bit-error rate.
+
+For each (baud, payload size, BER) case:
+    throughput  packets/s received by the camera, CPU per packet,
+                CRC-reject rate
+    latency     ping/pong round trip percentiles (camera echoes each
+                payload; the return wire time is added from the baud rate)
+
+Usage: python bench_serial_link.py [--bauds 115200 921600] [--sizes 8 64 255]
+                                   [--bers 0 1e-5 1e-4] [--packets 200] [--out results.json]
+"""
+
+
+def wire_time(n_bytes, baud):
+    return n_bytes * 10 / baud  # 8N1: 10 bits per byte
+
+
+def corrupt(frame, ber, rng):
+    if not ber:
+        return frame
+    data = bytearray(frame)
+    for i in range(len(data) * 8):
+        if rng.random() < ber:
+            data[i // 8] ^= 1 << (i % 8)
+    return bytes(data)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+class LinkPair:
+
+    def __init__(self, baud):
+        self.baud = baud
+        self.master, slave = os.openpty()
+        tty.setraw(self.master)
+        self.slave_name = os.ttyname(slave)
+        self.gt = GTPacket(self.slave_name, baudrate=baud, timeout=0.2)
+        os.close(slave)
+
+    def paced_write(self, data):
+        time.sleep(wire_time(len(data), self.baud))
+        os.write(self.master, data)
+
+    def close(self):
+        self.gt.close()
+        os.close(self.master)
+
+
+def bench_throughput(baud, size, ber, packets, seed=0):
+    rng = random.Random(seed)
+    link = LinkPair(baud)
+    received = []
+    last_received = [0.0]
+    done = threading.Event()
+
+    def on_packet(payload):
+        received.append(payload)
+        last_received[0] = time.perf_counter()
+        if len(received) >= packets:
+            done.set()
+
+    frames = [build_gt_packet(rng.randbytes(size)) for _ in range(packets)]
+    link.gt.start_listener(on_packet)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for frame in frames:
+        link.paced_write(corrupt(frame, ber, rng))
+    sent = time.perf_counter()
+    done.wait(0.5 + wire_time(len(frames[0]), baud) * 4)
+    cpu = time.process_time() - cpu_start
+    # Lost packets never arrive: stop the clock at the last one that did
+    elapsed = max(sent, last_received[0]) - start
+    link.close()
+    return {
+        "packets_per_second": len(received) / elapsed,
+        "payload_bytes_per_second": len(received) * size / elapsed,
+        "cpu_us_per_packet": cpu / max(1, len(received)) * 1e6,
+        "crc_reject_rate": 1 - len(received) / packets,
+    }
+
+
+def bench_latency(baud, size, ber, packets, seed=1):
+    rng = random.Random(seed)
+    link = LinkPair(baud)
+    link.gt.start_listener(link.gt.send)  # camera echoes every payload
+    parser = GTPacketParser()
+    rtts = []
+    lost = 0
+    for seq in range(packets):
+        payload = seq.to_bytes(4, "big") + rng.randbytes(max(0, size - 4))
+        frame = build_gt_packet(payload[:max(1, size)])
+        start = time.perf_counter()
+        link.paced_write(corrupt(frame, ber, rng))
+        deadline = start + 0.2 + wire_time(len(frame), baud) * 2
+        answered = False
+        while not answered and time.perf_counter() < deadline:
+            ready, _, _ = select.select([link.master], [], [], max(0.0, deadline - time.perf_counter()))
+            if ready:
+                answered = any(p == frame[3:-2] for p in parser.feed(os.read(link.master, 4096)))
+        if answered:
+            rtts.append(time.perf_counter() - start + wire_time(len(frame), baud))
+        else:
+            lost += 1
+    link.close()
+    rtts.sort()
+    return {
+        "rtt_ms": {f"p{p}": percentile(rtts, p) * 1e3 for p in (50, 90, 99)} if rtts else {},
+        "lost": lost,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GT serial link benchmark over pty pairs")
+    parser.add_argument("--bauds", type=int, nargs="+", default=[115200, 921600])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 64, 255])
+    parser.add_argument("--bers", type=float, nargs="+", default=[0.0, 1e-4])
+    parser.add_argument("--packets", type=int, default=200)
+    parser.add_argument("--out", default=None, help="JSON results file (default: serial_link_<ts>.json)")
+    args = parser.parse_args()
+
+    results = []
+    for baud in args.bauds:
+        for size in args.sizes:
+            for ber in args.bers:
+                case = {"baud": baud, "payload_size": size, "ber": ber}
+                case["throughput"] = bench_throughput(baud, size, ber, args.packets)
+                case["latency"] = bench_latency(baud, size, ber, max(1, args.packets // 4))
+                results.append(case)
+                t = case["throughput"]
+                rtt = case["latency"]["rtt_ms"]
+                print(f"{baud:>7} baud {size:>3} B ber {ber:g}: {t['packets_per_second']:8.1f} pkt/s, "
+                      f"{t['cpu_us_per_packet']:7.1f} us CPU/pkt, reject {t['crc_reject_rate'] * 100:5.1f}%, "
+                      f"rtt p50 {rtt.get('p50', float('nan')):.2f} ms p99 {rtt.get('p99', float('nan')):.2f} ms")
+
+    out = args.out or f"serial_link_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out, "w") as f:
+        json.dump({"timestamp": datetime.now().isoformat(), "revision": git_revision(),
+                   "packets": args.packets, "results": results}, f, indent=2)
+    print(f"Results saved to {out}")
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import random
+import resource
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import tty
+from gt_packet_rasp_pi import GTPacketParser, build_gt_packet
+from status_frame import parse_status
+
+"""
+Threaded layout (test_video.CameraManager, one interpreter) against the
+supervised process layout (supervisor.py) on the mock camera, with a
+simulated flight computer on a pty pair:
+    - answers the PING of the port discovery
+    - streams --noise bytes/s of corrupted GT frames (115200 baud is
+      ~11.5 kB/s, a USB gadget port is much faster): the parser's worst
+      case, every frame costs a pure-Python CRC before it is rejected
+    - polls TELEMETRY up to --poll times per second, one request in flight
+      (round trip time)
+    - sends a no-op SET_PHASE every --command-every seconds and reads its
+      dispatch latency back from the next status frames
+The frame timing is the sensor to encoder output p99 of the status frame
+(how late frames leave the mock sensor thread, bucket upper edge).
+
+Usage: python bench_supervisor.py [--seconds 20] [--noise 11520] [--poll 20] [--json out.json]
+"""
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+TELEMETRY = bytes([0x04])
+SET_PHASE_AUTO = bytes([0x09, 3])  # already the default phase: no camera restart
+PING_OPCODE, PONG_OPCODE = 0x07, 0x08
+POLL_TIMEOUT = 0.5  # s
+LAYOUTS = {
+    "threaded": ["-c", "import test_video as t; t.CameraManager.SERIAL_PORTS = [{port!r}]; "
+                       "t.CameraManager().start()"],
+    "processes": [os.path.join(REPO_DIR, "supervisor.py"), "--port", "{port}"],
+}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_layout(layout, seconds, warmup, noise, poll, command_every):
+    scratch = tempfile.mkdtemp(prefix=f"bench_{layout}_")
+    master, slave = os.openpty()
+    tty.setraw(master)
+    port = os.ttyname(slave)
+    argv = [sys.executable] + [arg.format(port=port) for arg in LAYOUTS[layout]]
+    env = dict(os.environ, GTXR_CAMERA_BACKEND="mock", PYTHONPATH=REPO_DIR, PYTHONUNBUFFERED="1")
+    cpu_before = children_cpu()
+    with open(os.path.join(scratch, "output.txt"), "w") as out:
+        process = subprocess.Popen(argv, cwd=scratch, env=env, stdout=out, stderr=subprocess.STDOUT)
+
+    # 200-byte frames with a bad CRC, back to back
+    frame = bytearray(build_gt_packet(bytes(random.randrange(256) for _ in range(200))))
+    frame[-1] ^= 0xFF
+    junk = bytes(frame) * (noise // len(frame) // 100 + 2)
+
+    parser = GTPacketParser()
+    rtts = []
+    command_latencies = []
+    poll_sent = None  # send time of the TELEMETRY request in flight
+    commands = []  # send times of SET_PHASE not yet matched with a status frame
+    last_status = None
+    linked_at = None
+    start = time.monotonic()
+    next_poll = next_command = next_noise = start
+    try:
+        while True:
+            now = time.monotonic()
+            if linked_at is not None and now - linked_at > warmup + seconds:
+                break
+            if now - start > 60 and linked_at is None:
+                raise RuntimeError(f"{layout}: no link after 60 s, see {scratch}/output.txt")
+            measuring = linked_at is not None and now - linked_at > warmup
+            if linked_at is not None:
+                if poll_sent is not None and now - poll_sent > POLL_TIMEOUT:
+                    poll_sent = None  # lost, e.g. sent while the port was being reopened
+                if poll_sent is None and now >= next_poll:
+                    os.write(master, build_gt_packet(TELEMETRY))
+                    poll_sent = now
+                    next_poll = now + 1 / poll
+                if measuring and now >= next_command:
+                    os.write(master, build_gt_packet(SET_PHASE_AUTO))
+                    commands.append(now)
+                    next_command += command_every
+                if noise and now >= next_noise:
+                    os.write(master, junk[:max(1, int(noise / 100))])
+                    next_noise += 0.01
+            readable, _, _ = select.select([master], [], [], 0.002)
+            if not readable:
+                continue
+            received = time.monotonic()
+            for payload in parser.feed(os.read(master, 4096)):
+                if payload[0] == PING_OPCODE:
+                    os.write(master, build_gt_packet(bytes([PONG_OPCODE]) + payload[1:]))
+                    if linked_at is None:
+                        linked_at = received
+                        next_poll = next_noise = received
+                        next_command = received + warmup
+                elif payload[0] == TELEMETRY[0]:
+                    last_status = parse_status(payload)
+                    if poll_sent is not None:
+                        sent, poll_sent = poll_sent, None
+                        if received - linked_at > warmup:
+                            rtts.append(received - sent)
+                        # The first status frame requested 100 ms after a command carries its latency
+                        if commands and sent - commands[0] > 0.1:
+                            commands.pop(0)
+                            command_latencies.append(last_status["last_latency_us"] / 1e6)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(20)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        os.close(master)
+        os.close(slave)
+
+    return {
+        "layout": layout,
+        "telemetry_rtt_ms": {"p50": percentile(rtts, 50) * 1e3, "p99": percentile(rtts, 99) * 1e3,
+                             "samples": len(rtts)},
+        "command_latency_ms": {"p50": percentile(command_latencies, 50) * 1e3,
+                               "p99": percentile(command_latencies, 99) * 1e3,
+                               "samples": len(command_latencies)},
+        "frame_latency_p99_us": last_status["latency_p99_us"],
+        "frame_interval_p99_us": last_status["interval_p99_us"],
+        "frames_dropped": last_status["frames_dropped"],
+        "cpu_seconds": children_cpu() - cpu_before,
+        "scratch": scratch,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threaded vs supervised process layout")
+    parser.add_argument("--seconds", type=float, default=20, help="measured seconds per layout")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--noise", type=int, default=11520, help="line noise, bytes per second")
+    parser.add_argument("--poll", type=float, default=20, help="TELEMETRY requests per second")
+    parser.add_argument("--command-every", type=float, default=0.25, help="seconds between commands")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), action="append")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for layout in args.layout or ("threaded", "processes"):
+        result = run_layout(layout, args.seconds, args.warmup, args.noise, args.poll, args.command_every)
+        results.append(result)
+        print(f"{layout:>10}: telemetry RTT p50 {result['telemetry_rtt_ms']['p50']:.2f} ms "
+              f"p99 {result['telemetry_rtt_ms']['p99']:.2f} ms | command latency "
+              f"p50 {result['command_latency_ms']['p50']:.2f} ms p99 {result['command_latency_ms']['p99']:.2f} ms | "
+              f"frame latency p99 < {result['frame_latency_p99_us']} us, "
+              f"interval p99 < {result['frame_interval_p99_us']} us, {result['frames_dropped']} dropped | "
+              f"CPU {result['cpu_seconds']:.1f} s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
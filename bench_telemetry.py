@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+import tty
+from gt_packet import GTPacket
+from gt_packet_rasp_pi import GTPacketParser, build_gt_packet
+from status_frame import parse_status
+
+"""
+TELEMETRY_OPCODE round trip over a pty pair.
+The camera side is a real test_video.CameraManager (mock camera backend,
+no recording): its GTPacket listener thread hands every frame to
+CameraManager.submit, whose gt_link.GTLink answers with the
+pre-assembled StatusFrame. The flight computer side is the pty master.
+Usage: python bench_telemetry.py [n_requests]
+"""
+
+TELEMETRY_OPCODE = b'\x04'
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def run(n_requests=500):
+    os.environ.setdefault("GTXR_CAMERA_BACKEND", "mock")
+    from test_video import CameraManager
+
+    # CameraManager creates its videos_/logs/ directories in the working directory
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="bench_telemetry_"))
+    try:
+        manager = CameraManager()
+    finally:
+        os.chdir(cwd)
+    manager.status.update(recording=True, segment_index=42, bytes_written=123456789,
+                          free_disk=8 * 1024 ** 3, frames_dropped=3)
+    master, slave = os.openpty()
+    tty.setraw(master)
+    gt = GTPacket(port=os.ttyname(slave), timeout=0.5)
+    manager.link.gt_port = gt
+    gt.start_listener(manager.submit)
+    request = build_gt_packet(TELEMETRY_OPCODE)
+    parser = GTPacketParser()
+    latencies = []
+    last = None
+    try:
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            os.write(master, request)
+            responses = []
+            while not responses:
+                responses = parser.feed(os.read(master, 256))
+            latencies.append(time.perf_counter() - start)
+            last = responses[-1]
+    finally:
+        gt.close()
+        os.close(master)
+
+    latencies.sort()
+    return latencies, parse_status(last)
+
+
+if __name__ == "__main__":
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latencies, last = run(n)
+    print(f"{n} telemetry requests over a pty pair")
+    for p in (50, 90, 99):
+        print(f"p{p}: {percentile(latencies, p) * 1e3:.3f} ms")
+    print(f"max: {latencies[-1] * 1e3:.3f} ms")
+    print(f"Last status: {last}")
@@ -0,0 +1,16 @@
+import os
+
+"""
+Selects the camera stack: the real picamera2 by default, or the
+hardware-free mock with GTXR_CAMERA_BACKEND=mock (set it before importing
+camera_utils or any output module).
+"""
+
+BACKEND = os.environ.get("GTXR_CAMERA_BACKEND", "picamera2")
+
+if BACKEND == "mock":
+    from mock_camera import Picamera2, H264Encoder, FileOutput, Output
+else:
+    from picamera2 import Picamera2
+    from picamera2.encoders import H264Encoder
+    from picamera2.outputs import FileOutput, Output
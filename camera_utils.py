@@ -1,88 +1,308 @@
-from picamera2 import Picamera2
-from picamera2.encoders import H264Encoder
-from picamera2.outputs import FileOutput
+from camera_backend import Picamera2, H264Encoder, FileOutput
 from datetime import datetime
 import time
 import os
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from adaptive_profile import PROFILES, ProfileController
+from segment_output import SegmentedOutput
+from segment_manifest import ManifestWriter
+from preroll_output import PrerollOutput
+from storage import StorageManager
+from write_behind import WriteBehindOutput
+from frame_stats import FrameStats
+from motion_detector import MotionDetector
+from thumbnails import ThumbnailSampler, capture_arrays, thumbnail_path, write_thumbnail
 
-def init_camera():
+FRAME_DURATION = PROFILES[0]["frame_duration"]  # us, 120 fps
+LORES_SIZE = (320, 240)  # YUV420 preview stream, source of the thumbnails
+THUMBNAIL_SECONDS = 10  # one video thumbnail every N seconds
+
+def init_camera(modes=None):
+    """modes: configurations to build up front (default all, the rest are built on first use)"""
     try:
         picam2 = Picamera2()
     except Exception as e:
         print(f"No cams available: {e}")
         return None
+    precompute_configurations(picam2, modes)
     return picam2
 
+# Camera configurations are built once per camera and reused
+config_cache = {}
+applied_mode = {}
+still_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="still-jpeg")
+
+
+def still_configuration(picam2):
+    # PiCamv2.1 max resolution: (3280,2464), PiCamv3  defaults to (4608, 2592)
+    return picam2.create_still_configuration(
+        main={"size": (3280, 2464)}, 
+        lores={"size": LORES_SIZE},
+        controls={
+            "AfMode": 0,            # 0 = Manual focus
+            "LensPosition": 0.0     # 0.0 ≈ infinity
+        })
+
+
+def video_configuration(picam2, profile=PROFILES[0]):
+    frame_duration = profile["frame_duration"]
+    return picam2.create_video_configuration(
+        main={"size": profile["size"], "format": "XBGR8888"}, # for PiCamv3,this defaults to (1536, 864)
+        lores={"size": LORES_SIZE},
+        controls={
+            "FrameDurationLimits": (frame_duration, frame_duration),  # 1/120 sec = 8333 μs
+            #"ExposureTime": 300,  # Very short exposure (μs), adjust as needed
+            #"AnalogueGain": 1.0,  # Low ISO, expecting high light
+            "NoiseReductionMode": 0,  # cdn_off equivalent
+            "AfMode": 0,            # 0 = Manual focus
+            "LensPosition": 0.0     # 0.0 ≈ infinity
+        })
+
+
+def profile_mode(index):
+    """Configuration cache key of a recording profile; profile 0 is plain video"""
+    return "video" if index == 0 else f"video:{PROFILES[index]['name']}"
+
+
+CONFIG_BUILDERS = {"still": still_configuration, "video": video_configuration}
+for index, profile in enumerate(PROFILES[1:], 1):
+    CONFIG_BUILDERS[profile_mode(index)] = partial(video_configuration, profile=profile)
+
+
+def get_configuration(picam2, mode):
+    key = (id(picam2), mode)
+    if key not in config_cache:
+        config_cache[key] = CONFIG_BUILDERS[mode](picam2)
+    return config_cache[key]
+
+
+def precompute_configurations(picam2, modes=None):
+    for mode in modes or CONFIG_BUILDERS:
+        get_configuration(picam2, mode)
+
+
+def configure_mode(picam2, mode):
+    """Configure from the cache, skipping it if the camera is already in this mode"""
+    if applied_mode.get(id(picam2)) == mode:
+        return
+    picam2.configure(get_configuration(picam2, mode))
+    applied_mode[id(picam2)] = mode
+
+
 def take_selfie(picam2):
     """
     Captures a high-quality still image using the Pi Camera v1.2.
     The image is saved with a timestamp in the filename.
     """
-    # PiCamv2.1 max resolution: (3280,2464), PiCamv3  defaults to (4608, 2592)
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     path = f"photos/selfie_{ts}.jpg"
 
     try:
         # Configure for still capture at max quality
-        config = picam2.create_still_configuration(
-            main={"size": (3280, 2464)}, 
-            controls={
-                "AfMode": 0,            # 0 = Manual focus
-                "LensPosition": 0.0     # 0.0 ≈ infinity
-            })
-        picam2.configure(config)
+        configure_mode(picam2, "still")
         picam2.start()
-        picam2.capture_file(path)
+        request = picam2.capture_request()
+        try:
+            request.save("main", path)
+            thumb = capture_arrays(request, picam2.camera_config)
+        finally:
+            request.release()
         print(f"Selfie taken and saved to {path}")
+        # Small preview next to the photo, for the GT downlink
+        still_worker.submit(write_thumbnail, thumb[0], thumbnail_path(path), thumb[1])
     except Exception as e:
         print(f"Error, Photo Unsuccessful: {e}")
     finally:
         picam2.stop()
 
 
-def record_h264_segments(picam2, camera_manager, duration=7200, stop_event=None):
+def save_still(image, path):
     try:
-        # Configuration
-        video_config = picam2.create_video_configuration(
-            main={"size": (640, 480), "format": "XBGR8888"}, # for PiCamv3,this defaults to (1536, 864)
-            controls={
-                "FrameDurationLimits": (8333, 8333),  # 1/120 sec = 8333 μs
-                #"ExposureTime": 300,  # Very short exposure (μs), adjust as needed
-                #"AnalogueGain": 1.0,  # Low ISO, expecting high light
-                "NoiseReductionMode": 0,  # cdn_off equivalent
-                "AfMode": 0,            # 0 = Manual focus
-                "LensPosition": 0.0     # 0.0 ≈ infinity
-            })
-        picam2.configure(video_config)
+        image.convert("RGB").save(path, quality=90)
+        print(f"Still saved to {path}")
+    except Exception as e:
+        print(f"Error, Photo Unsuccessful: {e}")
+    return path
+
+
+def take_still_while_recording(picam2):
+    """
+    Grabs the next frame of the main stream while the H264 recording keeps
+    running. The request is released right after the copy; JPEG encoding
+    happens on the still worker thread. Returns a future with the path.
+    """
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = f"photos/still_{ts}.jpg"
+    request = picam2.capture_request()
+    try:
+        image = request.make_image("main")
+        thumb = capture_arrays(request, picam2.camera_config)
+    finally:
+        request.release()
+    future = still_worker.submit(save_still, image, path)
+    still_worker.submit(write_thumbnail, thumb[0], thumbnail_path(path), thumb[1])
+    return future
+
+
+def record_h264_segments(picam2, camera_manager, duration=7200, stop_event=None,
+                         segment_seconds=30, segment_frames=None, segment_bytes=None,
+                         preroll_seconds=None, thumbnail_seconds=THUMBNAIL_SECONDS, motion=False):
+    """
+    Records continuously into rotating segments. The encoder is never
+    restarted: SegmentedOutput switches files on the next keyframe once a
+    segment reaches segment_seconds / segment_frames / segment_bytes.
+    With preroll_seconds set the recorder starts armed: only the last
+    preroll_seconds are kept in memory until camera_manager.preroll_output
+    is triggered, and profile switches are held until then. A thumbnail
+    is saved every thumbnail_seconds.
+    With motion set, the lores stream is watched for motion: events go to
+    the manifest and to camera_manager.motion_event(state, pts_us).
+    """
+    output = None
+    preroll = None
+    sampler = None
+    detector = None
+    segments = None
+    controller = getattr(camera_manager, "profile_controller", None)
+    if controller is None:
+        controller = ProfileController(log=getattr(camera_manager, "log", print))
+        camera_manager.profile_controller = controller
+    try:
+        profile = controller.profile
+        configure_mode(picam2, profile_mode(controller.index))
         picam2.start()
 
-        segment_length = 30
-        encoder = H264Encoder()
+        segments = SegmentedOutput(camera_manager.main_video_path, segment_seconds=segment_seconds,
+                                   segment_frames=segment_frames, segment_bytes=segment_bytes,
+                                   on_segment=getattr(camera_manager, "segment_started", None),
+                                   frame_duration=profile["frame_duration"],
+                                   storage=StorageManager(camera_manager.main_video_path),
+                                   manifest=ManifestWriter(camera_manager.main_video_path))
+        camera_manager.recording_output = segments
+        # Frames are queued in memory and written by a separate thread, so an
+        # SD card stall does not block the encoder
+        output = WriteBehindOutput(segments)
+        write_behind = output
+        camera_manager.write_behind = output
+        if preroll_seconds:
+            output = PrerollOutput(output, seconds=preroll_seconds)
+            preroll = output
+            camera_manager.preroll_output = output
+            print(f"Armed: keeping {preroll_seconds} s of pre-roll, at most {output.max_bytes} bytes")
+        # Per-frame counters: request callback plus a second encoder output
+        stats = FrameStats(profile["frame_duration"])
+        camera_manager.frame_stats = stats
+        picam2.post_callback = stats.post_callback
+        if motion:
+            detector = motion_detector(camera_manager, stats, segments)
+            picam2.post_callback = chain_callbacks(stats.post_callback, detector.post_callback)
+            detector.start()
+        picam2.start_recording(profile_encoder(profile), [output, stats])
+        if thumbnail_seconds:
+            sampler = ThumbnailSampler(picam2, camera_manager.main_video_path,
+                                       interval=thumbnail_seconds, worker=still_worker)
+            sampler.start()
 
-        i = 0
         start_time = time.time()
-        while not (stop_event and stop_event.is_set()):
-            filename = f"{camera_manager.main_video_path}video_{i:03d}.h264"
-            pts_filename = f"{camera_manager.main_video_path}video_{i:03d}.pts"
-            print(f"Recording segment: {filename}")
-            with open(pts_filename, "w") as pts_output:
-                picam2.start_recording(encoder, filename, pts=pts_filename)
-                time.sleep(segment_length)
-                picam2.stop_recording()
-            i += 1
-            if i > 100 and duration and (time.time() - start_time) >= duration: 
+        stop_event = stop_event or threading.Event()
+        pending = None  # (profile index, boundary event) waiting for the segment to end
+        while True:
+            boundary = pending[1] if pending is not None else None
+            if boundary is not None and boundary.wait(0.5):
+                # Frames after the boundary are skipped: switch as soon as the segment closes
+                switch_profile(picam2, controller, pending[0], output, stats, segments)
+                pending = None
+                continue
+            if stop_event.is_set() or (boundary is None and stop_event.wait(0.5)):
+                break
+            if segments.segment_index > 100 and duration and (time.time() - start_time) >= duration: 
                 print("Duration reached. Ending recording.")
                 break
+            controller.sample(segments.frames_written, segments.frames_dropped,
+                              segments.bytes_written, write_behind.queued_bytes / write_behind.max_bytes)
+            if preroll is not None and not preroll.triggered:
+                # Restarting the encoder empties the pre-roll: switches wait for the trigger,
+                # whose frames write_behind then drains to disk before the restart
+                continue
+            target = controller.target()
+            if target is not None:
+                index, immediate = target
+                if immediate:
+                    pending = (index, None)
+                elif pending is None or pending[0] != index:
+                    pending = (index, segments.request_boundary())
+            elif pending is not None:
+                # Pressure went away before the segment ended
+                segments.cancel_boundary()
+                pending = None
+            if pending is not None and pending[1] is None:
+                switch_profile(picam2, controller, pending[0], output, stats, segments)
+                pending = None
     
     except KeyboardInterrupt:
         print("Stopping recording due to keyboard interrupt.")
     except Exception as e:
         print(f"Error: Camera video configuration unsuccessful: {e}") 
     finally:
+        if sampler is not None:
+            sampler.stop()
+        if output is not None:
+            picam2.stop_recording()
+        if detector is not None:
+            detector.stop()
+        if segments is not None and segments.manifest:
+            segments.manifest.close()
+        picam2.post_callback = None
         picam2.stop()
 
 
+def chain_callbacks(*callbacks):
+    def callback(request):
+        for c in callbacks:
+            c(request)
+    return callback
+
+
+def motion_detector(camera_manager, stats, segments):
+    """MotionDetector on the lores stream, events stamped on the recording's PTS timeline"""
+    def pts_of(sensor_us):
+        if stats.base_us < 0:
+            return None
+        return sensor_us - stats.base_us + segments.timestamp_offset
+
+    def on_event(state, pts_us, score):
+        if segments.manifest:
+            segments.manifest.event("motion", state, pts_us, score=round(score, 2))
+        handler = getattr(camera_manager, "motion_event", None)
+        if handler:
+            handler(state, pts_us)
+
+    return MotionDetector(LORES_SIZE, on_event=on_event, pts_of=pts_of)
+
+
+def profile_encoder(profile):
+    # One IDR per second (with SPS/PPS repeated) bounds how far a segment
+    # can overrun its length and keeps every segment decodable on its own
+    iperiod = round(1_000_000 / profile["frame_duration"])
+    return H264Encoder(bitrate=profile["bitrate"], repeat=True, iperiod=iperiod)
+
+
+def switch_profile(picam2, controller, index, output, stats, segments):
+    """Restart the camera and encoder with another profile; the output chain is kept"""
+    start = time.monotonic()
+    picam2.stop_recording()
+    profile = PROFILES[index]
+    configure_mode(picam2, profile_mode(index))
+    segments.frame_duration = profile["frame_duration"]
+    stats.restart(profile["frame_duration"])
+    picam2.start_recording(profile_encoder(profile), [output, stats])
+    controller.switched(index)
+    print(f"Camera restarted in {(time.monotonic() - start) * 1e3:.0f} ms")
+
+
 ####### Deprecated functionalities:
 
 # Video in one single take, deprecated
@@ -111,6 +331,7 @@ def record_and_pipe_video(picam2, camera_manager, duration=None, stop_event=None
         }
     )
     picam2.configure(video_config)
+    applied_mode.pop(id(picam2), None)
     output_pattern = f"{camera_manager.main_video_path}video%03d.mp4"
 
     framerate = 120
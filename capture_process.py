@@ -0,0 +1,92 @@
+import queue
+import signal
+import threading
+import time
+import camera_utils
+from test_video import CameraManager
+from supervisor import recv_command
+
+"""
+Capture child of supervisor.py: the only process that imports the camera
+stack. It runs test_video's recorder and telecommand handlers unchanged;
+commands arrive from the link process through the command pipe instead of
+the serial port, and the counters the status frame needs are published to
+the "capture" region of the shared status block.
+"""
+
+PUBLISH_PERIOD = 0.5  # s, also the heartbeat period
+
+
+class CaptureManager(CameraManager):
+
+    def __init__(self, status, commands):
+        self.shared = status
+        self.commands = commands
+        self.command_count = 0
+        self.stopping = threading.Event()
+        super().__init__()
+
+    def read_commands(self):
+        """Moves commands from the pipe into the dispatcher queue"""
+        while not self.stopping.is_set():
+            try:
+                command = recv_command(self.commands, PUBLISH_PERIOD)
+            except (EOFError, OSError):
+                break
+            if command is not None:
+                self.command_count += 1
+                self.tc_queue.put(command)
+
+    def publish(self):
+        output = self.recording_output
+        stats = self.frame_stats
+        write_behind = self.write_behind
+        counters = {
+            "recording": self.camera_busy,
+            "storage_full": bool(output and output.storage and output.storage.storage_full),
+            "segment_index": output.segment_index if output else -1,
+            "segment_bytes": output.segment_byte_count if output else 0,
+            "frames_written": output.frames_written if output else 0,
+            "bytes_written": output.bytes_written if output else 0,
+            "frames_dropped": output.frames_dropped if output else 0,
+            "last_latency_us": min(int(self.last_tc_latency * 1e6), 0xFFFFFFFF),
+            "commands": self.command_count,
+            "queue_bytes": write_behind.queued_bytes if write_behind else 0,
+            "queue_high_water": write_behind.high_water_bytes if write_behind else 0,
+            "backpressure": write_behind.backpressure_events if write_behind else 0,
+            "video_path": self.main_video_path.encode()[:64],
+        }
+        if stats is not None:
+            counters.update(stats.status_counters())
+        counters.update(self.profile_controller.status_counters())
+        self.shared.write("capture", **counters)
+
+    def shutdown(self, signum=None, frame=None):
+        self.stopping.set()
+
+    def start(self):
+        signal.signal(signal.SIGTERM, self.shutdown)
+        self.picam = camera_utils.init_camera()
+        threading.Thread(target=self.read_commands, name="commands", daemon=True).start()
+        while not self.stopping.is_set():
+            try:
+                try:
+                    received_at, payload = self.tc_queue.get(timeout=PUBLISH_PERIOD)
+                except queue.Empty:
+                    pass
+                else:
+                    self.dispatch(received_at, payload)
+                self.publish()
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                print(e)
+        # Close the segment and the manifest properly before exiting
+        if self.camera_busy:
+            self.handle_stop_recording(b"")
+        self.publish()
+
+
+def run_capture(status, commands):
+    manager = CaptureManager(status, commands)
+    manager.start()
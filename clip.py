@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+from segment_manifest import event_ranges, load_manifest, plan_clip
+
+"""
+Cuts a time range out of a recording by stream copy, using the segment
+manifest: only the bytes from the keyframe at or before the start to the
+keyframe at or after the end are read, with their lines of the .pts files.
+Times are seconds from the recording's first frame: the manifest's first
+pts_us is subtracted, as the PTS timeline does not start at 0 after a
+pre-roll or a restart.
+
+The output is a raw .h264 with a matching timecode v2 .pts file, remuxed
+to .mkv with the exact timestamps when mkvmerge is installed.
+
+Usage: python clip.py videos_<ts>/ --start 3 --end 10 [-o clip.h264] [--remux]
+       python clip.py videos_<ts>/ --start 3 --end 10 --plan   (byte ranges as JSON,
+       for fetching only those bytes from the Pi)
+       python clip.py videos_<ts>/ --event 0 [--before 2 --after 2]   (around the
+       first motion event in the manifest; --events lists them)
+"""
+
+EVENT_MARGIN = 2.0  # seconds kept before and after a motion event
+
+
+
+def read_pts_lines(path, first, end):
+    """Timecode lines first..end-1 of a segment's .pts file (header excluded)"""
+    lines = []
+    with open(path) as f:
+        next(f, None)
+        for i, line in enumerate(f):
+            if i >= end:
+                break
+            if i >= first:
+                lines.append(line)
+    return lines
+
+
+def first_pts_us(segments):
+    """PTS of the recording's first frame, the origin of the clip times"""
+    for index in sorted(segments):
+        if segments[index]["idrs"]:
+            return segments[index]["idrs"][0][0]
+    return 0
+
+
+def extract_clip(directory, start_s, end_s, out_path):
+    segments, _ = load_manifest(directory)
+    origin = first_pts_us(segments)
+    plan = plan_clip(segments, origin + int(start_s * 1e6), origin + int(end_s * 1e6))
+    if not plan:
+        raise ValueError(f"No frames between {start_s} s and {end_s} s in {directory}")
+    copied = 0
+    pts_path = os.path.splitext(out_path)[0] + ".pts"
+    with open(out_path, "wb") as out, open(pts_path, "w") as pts_out:
+        pts_out.write("# timecode format v2\n")
+        for part in plan:
+            base = os.path.join(directory, f"video_{part['segment']:03d}")
+            with open(base + ".h264", "rb") as f:
+                f.seek(part["start"])
+                remaining = part["end"] - part["start"]
+                while remaining:
+                    block = f.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        break
+                    out.write(block)
+                    remaining -= len(block)
+                    copied += len(block)
+            if os.path.exists(base + ".pts"):
+                pts_out.writelines(read_pts_lines(base + ".pts", part["first_frame"], part["end_frame"]))
+    return plan, copied, pts_path, origin
+
+
+def remux(h264_path, pts_path):
+    if not shutil.which("mkvmerge"):
+        print("mkvmerge not installed, keeping the raw .h264")
+        return None
+    out = os.path.splitext(h264_path)[0] + ".mkv"
+    subprocess.run(["mkvmerge", "-q", "-o", out, "--timestamps", f"0:{pts_path}", h264_path], check=True)
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream-copy a time range out of a recording")
+    parser.add_argument("directory")
+    parser.add_argument("--start", type=float, help="seconds")
+    parser.add_argument("--end", type=float, help="seconds")
+    parser.add_argument("--event", type=int, help="cut around the N-th motion event instead")
+    parser.add_argument("--before", type=float, default=EVENT_MARGIN, help="seconds kept before the event")
+    parser.add_argument("--after", type=float, default=EVENT_MARGIN, help="seconds kept after the event")
+    parser.add_argument("--events", action="store_true", help="list the motion events and exit")
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--remux", action="store_true", help="also write an .mkv with mkvmerge")
+    parser.add_argument("--plan", action="store_true", help="print the byte ranges as JSON and exit")
+    args = parser.parse_args()
+
+    if args.events or args.event is not None:
+        segments, events = load_manifest(args.directory)
+        origin = first_pts_us(segments)
+        ranges = [(start_us - origin, end_us - origin if end_us is not None else None)
+                  for start_us, end_us in event_ranges(events)]
+        if args.events:
+            for i, (start_us, end_us) in enumerate(ranges):
+                end = f"{end_us / 1e6:.3f} s" if end_us is not None else "recording end"
+                print(f"{i}: {start_us / 1e6:.3f} s - {end}")
+            raise SystemExit
+        if not 0 <= args.event < len(ranges):
+            parser.error(f"no motion event {args.event} ({len(ranges)} in the manifest)")
+        start_us, end_us = ranges[args.event]
+        args.start = max(0.0, start_us / 1e6 - args.before)
+        args.end = (end_us if end_us is not None else start_us) / 1e6 + args.after
+    elif args.start is None or args.end is None:
+        parser.error("--start and --end are required unless --event is given")
+
+    if args.plan:
+        segments, _ = load_manifest(args.directory)
+        origin = first_pts_us(segments)
+        plan = plan_clip(segments, origin + int(args.start * 1e6), origin + int(args.end * 1e6))
+        print(json.dumps(plan, indent=2))
+        raise SystemExit
+
+    name = os.path.basename(os.path.normpath(args.directory))
+    out = args.output or f"{name}_{args.start:g}-{args.end:g}s.h264"
+    start = time.perf_counter()
+    plan, copied, pts_path, origin = extract_clip(args.directory, args.start, args.end, out)
+    elapsed = time.perf_counter() - start
+    print(f"{out}: {copied} bytes from {len(plan)} segment(s) in {elapsed * 1e3:.1f} ms "
+          f"(starts at {(plan[0]['first_pts_us'] - origin) / 1e6:.3f} s)")
+    if args.remux:
+        mkv = remux(out, pts_path)
+        if mkv:
+            print(f"Remuxed to {mkv}")
@@ -5,5 +5,19 @@ if [ -z "$1" ]; then
     exit 1
 fi
 
-scp -r gtxr@pi-netanyahu.local:/home/gtxr/gtxr-picamera/"$1" videos/"$1" 
-exit 0
\ No newline at end of file
+PI=gtxr@pi-netanyahu.local
+PORT=8765
+
+# Pi-side server, on the Pi's loopback only (it has no authentication);
+# exits by itself after 10 idle minutes (a second copy just fails to bind)
+ssh -f "$PI" "cd /home/gtxr/gtxr-picamera && nohup picamvenv/bin/python sync_recordings.py serve --port $PORT --idle-timeout 600 > logs/sync_server.txt 2>&1 &"
+
+# Reached through an ssh tunnel, closed when this script exits
+ssh -N -o ExitOnForwardFailure=yes -L "$PORT:localhost:$PORT" "$PI" &
+TUNNEL=$!
+trap 'kill $TUNNEL 2>/dev/null' EXIT
+sleep 2
+
+# Fetches only what is missing or changed, resumes partial files, verifies crc32s;
+# run it again after a dropped connection
+python sync_recordings.py pull "http://localhost:$PORT" "$1" videos/
@@ -1,20 +1,7 @@
 #!/bin/bash
 
-# Define video directories here:
+# Define video directories here (leave empty to process every videos_* directory):
 DIRS=("videos_20250712_102041")
 
-for DIR in "${DIRS[@]}"
-do
-    echo "Processing $DIR"
-
-    cd "$DIR" || { echo "Directory $DIR not found"; continue; }
-
-    ls video*.h264 | sort | sed "s/^/file '/;s/$/'/" > files.txt
-
-    ffmpeg -r 110 -f concat -safe 0 -i files.txt -c:v libx264 -preset slow -crf 18 "$DIR"_slowmo.mp4
-
-    # ffmpeg -i "$DIR"_slowmo.mp4 -vf "setpts=(1/4)*PTS" -an "$DIR"_realtime.mp4
-
-    cd ..
-done
-
+# Quality re-encode, timing taken from the .pts files; use --mode remux for a fast stream copy
+python3 postprocess.py --mode encode "${DIRS[@]}"
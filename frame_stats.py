@@ -0,0 +1,189 @@
+import time
+from array import array
+from bisect import bisect_right
+from camera_backend import Output
+
+"""
+Per-frame instrumentation with fixed-size, array-backed counters.
+FrameStats hooks both ends of the pipeline:
+    post_callback(request)  Picamera2 request callback: sensor frame
+                            interval and dropped sensor sequence numbers
+    outputframe(...)        extra encoder output: encoded frame size and
+                            sensor timestamp to encoder output latency
+Nothing but integers is created per frame. snapshot() copies the counters
+for the monitor thread and the status frame.
+
+Encoder timestamps start at 0 on the first encoded frame; the latency is
+measured against the newest sensor timestamp seen at that first frame, so
+it can read low by the encoder's queue depth at start (a frame or two).
+"""
+
+FRAMES, SENSOR_DROPS, ENCODED, ENCODED_BYTES, KEYFRAMES = range(5)
+COUNTERS = ("frames", "sensor_drops", "encoded", "encoded_bytes", "keyframes")
+
+INTERVAL_FACTORS = (0.5, 0.9, 0.97, 0.99, 1.01, 1.03, 1.1, 1.5, 2.5, 3.5, 5, 10)
+LATENCY_EDGES_US = (1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 256000, 512000)
+SIZE_EDGES = tuple(1 << n for n in range(8, 21))  # 256 B .. 1 MB
+GAP_EDGES = (2, 3, 4, 6, 11, 31)  # frames lost in one sequence gap
+OVERFLOW = 0xFFFFFFFF  # percentile beyond the last bucket edge
+
+
+def monotonic_us():
+    try:
+        # libcamera sensor timestamps count from boot
+        return time.clock_gettime_ns(time.CLOCK_BOOTTIME) // 1000
+    except (AttributeError, OSError):
+        return time.monotonic_ns() // 1000
+
+
+class Histogram:
+    """Fixed buckets: counts[i] holds values below edges[i], the last one the overflow"""
+
+    def __init__(self, edges):
+        self.edges = array("q", edges)
+        self.counts = array("Q", bytes(8 * (len(self.edges) + 1)))
+
+    def add(self, value):
+        self.counts[bisect_right(self.edges, value)] += 1
+
+    def percentile(self, p):
+        """Upper edge of the bucket holding the p-th percentile (None if empty)"""
+        total = sum(self.counts)
+        if not total:
+            return None
+        target = total * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.edges[i] if i < len(self.edges) else OVERFLOW
+        return None
+
+    def snapshot(self):
+        return {"edges": list(self.edges), "counts": list(self.counts)}
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+
+
+class FrameStats(Output):
+
+    def __init__(self, frame_duration):
+        super().__init__()
+        self.frame_duration = frame_duration
+        self.counters = array("Q", bytes(8 * len(COUNTERS)))
+        self.interval = Histogram(int(frame_duration * f) for f in INTERVAL_FACTORS)
+        self.latency = Histogram(LATENCY_EDGES_US)
+        self.size = Histogram(SIZE_EDGES)
+        self.gaps = Histogram(GAP_EDGES)
+        self.last_sensor_us = -1
+        self.last_sequence = -1
+        self.base_us = -1  # sensor time of encoder timestamp 0
+
+    def post_callback(self, request):
+        metadata = request.get_metadata()
+        sensor_us = metadata.get("SensorTimestamp", 0) // 1000
+        sequence = metadata.get("SensorSequence", -1)
+        counters = self.counters
+        counters[FRAMES] += 1
+        if self.last_sensor_us >= 0:
+            self.interval.add(sensor_us - self.last_sensor_us)
+        if self.last_sequence >= 0 and sequence > self.last_sequence + 1:
+            lost = sequence - self.last_sequence - 1
+            counters[SENSOR_DROPS] += lost
+            self.gaps.add(lost)
+        self.last_sensor_us = sensor_us
+        self.last_sequence = sequence
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio:
+            return
+        counters = self.counters
+        counters[ENCODED] += 1
+        counters[ENCODED_BYTES] += len(frame)
+        if keyframe:
+            counters[KEYFRAMES] += 1
+        self.size.add(len(frame))
+        if timestamp is None or self.last_sensor_us < 0:
+            return
+        if self.base_us < 0:
+            self.base_us = self.last_sensor_us - timestamp
+        self.latency.add(monotonic_us() - self.base_us - timestamp)
+
+    def snapshot(self):
+        """Copy of every counter and histogram, plus the p50/p99 bucket edges"""
+        snap = dict(zip(COUNTERS, self.counters))
+        for name in ("interval", "latency", "size", "gaps"):
+            histogram = getattr(self, name)
+            snap[name] = histogram.snapshot()
+            snap[f"{name}_p50"] = histogram.percentile(50)
+            snap[f"{name}_p99"] = histogram.percentile(99)
+        return snap
+
+    def status_counters(self):
+        """Compact form for the status frame and the telemetry log"""
+        return {
+            "sensor_drops": self.counters[SENSOR_DROPS],
+            "interval_p99_us": self.interval.percentile(99) or 0,
+            "latency_p99_us": self.latency.percentile(99) or 0,
+        }
+
+    def summary(self):
+        snap = self.snapshot()
+        return (f"{snap['frames']} sensor frames ({snap['sensor_drops']} dropped), "
+                f"{snap['encoded']} encoded, interval p99 < {snap['interval_p99']} us, "
+                f"latency p99 < {snap['latency_p99']} us, size p99 < {snap['size_p99']} B")
+
+    def restart(self, frame_duration=None):
+        """Camera and encoder restarted: timestamps and sequence numbers start over.
+        With a new frame_duration (profile switch) the interval buckets are rebuilt
+        around it; intervals measured at the old rate are dropped"""
+        if frame_duration and frame_duration != self.frame_duration:
+            self.frame_duration = frame_duration
+            self.interval = Histogram(int(frame_duration * f) for f in INTERVAL_FACTORS)
+        self.last_sensor_us = -1
+        self.last_sequence = -1
+        self.base_us = -1
+
+    def reset(self):
+        for i in range(len(self.counters)):
+            self.counters[i] = 0
+        for histogram in (self.interval, self.latency, self.size, self.gaps):
+            histogram.reset()
+        self.restart()
+
+
+if __name__ == "__main__":
+    # Overhead per frame of both hooks, as a share of one core at 120 fps
+    import argparse
+
+    parser = argparse.ArgumentParser(description="FrameStats overhead benchmark")
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--fps", type=float, default=120)
+    args = parser.parse_args()
+
+    frame_duration = int(1e6 / args.fps)
+
+    class Request:
+        def __init__(self):
+            self.metadata = {"SensorTimestamp": 0, "SensorSequence": 0}
+
+        def get_metadata(self):
+            return self.metadata
+
+    request = Request()
+    frame = bytes(6000)
+    stats = FrameStats(frame_duration)
+    stats.start()
+    now_ns = monotonic_us() * 1000
+    start = time.thread_time()
+    for i in range(args.frames):
+        request.metadata["SensorTimestamp"] = now_ns + i * frame_duration * 1000
+        request.metadata["SensorSequence"] = i + (i // 1000)  # one drop every 1000 frames
+        stats.post_callback(request)
+        stats.outputframe(frame, i % 120 == 0, i * frame_duration)
+    cpu = time.thread_time() - start
+    per_frame_us = cpu / args.frames * 1e6
+    print(stats.summary())
+    print(f"{per_frame_us:.2f} us CPU per frame, {per_frame_us * args.fps / 1e4:.3f}% of one core at {args.fps:g} fps")
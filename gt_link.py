@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+import gt_packet
+from try_ports import try_ports, PING_OPCODE, PONG_OPCODE
+from gt_transfer import FileSender, ACK_OPCODE, DONE_OPCODE
+
+"""
+Serial side of the payload, shared by the threaded test_video.CameraManager
+and the link process of supervisor.py. The GTPacket listener thread answers
+TELEMETRY from a pre-assembled status frame and PING with a PONG, feeds
+transfer ACK/DONE to the running FileSender and starts downlinks itself;
+every other telecommand goes to on_command(received_at, payload).
+run() keeps the link up: the port is rediscovered when the listener dies
+(e.g. /dev/ttyGS0 disappears while the USB cable is out).
+"""
+
+TELEMETRY_OPCODE = 0x04
+DOWNLINK_OPCODE = 0x06  # payload: path of a photo or clip to send back
+RETRY_SECONDS = 2  # port discovery retry period while the link is down
+
+
+class GTLink:
+
+    def __init__(self, on_command, telemetry_packet, ports=None, log=print):
+        self.on_command = on_command
+        self.telemetry_packet = telemetry_packet  # () -> status frame packet bytes
+        self.ports = ports  # None: the try_ports default list
+        self.log = log
+        self.gt_port = None
+        self.serial_portname = ""
+        self.transfer = None
+        # Random start: ids from an earlier boot must not match a new transfer
+        self.transfer_id = int.from_bytes(os.urandom(2), "big")
+        self.packets = 0
+        self.forwarded = 0
+        self.telemetry_requests = 0
+
+    # Listener thread
+    def submit(self, payload: bytes):
+        received_at = time.monotonic()
+        self.packets += 1
+        opcode = payload[0]
+        if opcode == TELEMETRY_OPCODE:
+            # Answered straight from the listener thread, never waits behind a task
+            self.telemetry_requests += 1
+            self.send_telemetry()
+        elif opcode == PING_OPCODE:
+            port = self.gt_port
+            if port is not None:
+                port.send(bytes([PONG_OPCODE]) + payload[1:])
+        elif opcode in (ACK_OPCODE, DONE_OPCODE):
+            # Transfer acknowledgements drive the sender's window directly
+            transfer = self.transfer
+            if transfer is not None:
+                transfer.handle_packet(payload)
+        elif opcode == DOWNLINK_OPCODE:
+            self.handle_downlink(payload)
+        else:
+            self.forwarded += 1
+            self.on_command(received_at, payload)
+
+    def send_telemetry(self):
+        port = self.gt_port
+        if port is not None:
+            port.write_packet(self.telemetry_packet())
+
+    def handle_downlink(self, payload):
+        path = os.path.realpath(payload[1:].decode(errors="replace"))
+        if os.path.commonpath([path, os.getcwd()]) != os.getcwd() or not os.path.isfile(path):
+            self.log(f"Downlink failed, no such file: {payload[1:]!r}")
+            return
+        if self.transfer is not None:
+            self.log("Downlink failed, a transfer is already running")
+            return
+        port = self.gt_port
+        if port is None:
+            return
+        self.transfer_id = (self.transfer_id + 1) & 0xFFFF
+        self.transfer = FileSender(port.send, path, file_id=self.transfer_id, baud=port.ser.baudrate)
+        self.log(f"Sending {path}: {self.transfer.size} bytes in {self.transfer.chunks} chunks")
+        threading.Thread(target=self.run_transfer, args=(self.transfer,), daemon=True).start()
+
+    def run_transfer(self, sender):
+        try:
+            ok = sender.run()
+            self.log(f"Transfer of {sender.name} {'done' if ok else 'failed'} "
+                     f"({sender.retransmissions} retransmissions)")
+        finally:
+            self.transfer = None
+
+    # Link thread / process
+    def open_link(self):
+        port = try_ports(self.ports)
+        if port is None:
+            return False
+        self.serial_portname = port
+        self.gt_port = gt_packet.GTPacket(port, timeout=1)
+        self.gt_port.start_listener(self.submit)
+        return True
+
+    def run(self, period=RETRY_SECONDS, on_tick=None):
+        """Keeps the link up, calling on_tick() every period seconds"""
+        warned = False
+        next_attempt = 0.0
+        while True:
+            try:
+                if self.gt_port is not None and not self.gt_port.listening:
+                    self.log(f"Serial link on {self.serial_portname} lost, reconnecting")
+                    self.close()
+                if self.gt_port is None and time.monotonic() >= next_attempt:
+                    if self.open_link():
+                        self.log(f"Serial link up on {self.serial_portname}")
+                        warned = False
+                    else:
+                        next_attempt = time.monotonic() + RETRY_SECONDS
+                        if not warned:
+                            print("No flight computer found, retrying")
+                            warned = True
+                if on_tick is not None:
+                    on_tick()
+            except Exception as e:
+                print(f"Error in link thread: {e}")
+            time.sleep(period)
+
+    def close(self):
+        port, self.gt_port = self.gt_port, None
+        if port is not None:
+            try:
+                port.close()
+            except Exception:
+                pass
@@ -2,6 +2,10 @@ import serial
 import struct
 import crcmod
 import time
+import threading
+import asyncio
+from collections import deque
+from gt_packet_rasp_pi import GTPacketParser
 
 # Packet structure:
 # <header byte 1><header byte 2><payload length><data/opcode><crc byte 1><crc byte 2>
@@ -10,8 +14,20 @@ HEADER = bytes([0x47, 0x54])  # 'GT'
 CRC_FUNC = crcmod.mkCrcFun(0x11021, rev=False, initCrc=0xFFFF, xorOut=0) # CRC-16-CCITT-FALSE
 
 class GTPacket:
-    def __init__(self, port, baudrate=115200, timeout=None):
+    def __init__(self, port, baudrate=115200, timeout=None, debug=False, chunk_size=None):
         self.ser = serial.Serial(port, baudrate, timeout=timeout)
+        self.debug = debug
+        self.chunk_size = chunk_size  # None: read whatever in_waiting reports
+        self.parser = GTPacketParser()
+        self.pending = deque()
+        self.read_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.listener_thread = None
+        self.listener_stop = threading.Event()
+
+    def log(self, msg):
+        if self.debug:
+            print(msg)
 
     def build_packet(self, data: bytes) -> bytes:
         length = len(data)
@@ -21,64 +37,137 @@ class GTPacket:
 
     def send(self, data: bytes):
         packet = self.build_packet(data)
-        self.ser.write(packet)
-        print(f"Sent: {packet.hex()}")
+        with self.write_lock:
+            self.ser.write(packet)
+        self.log(f"Sent: {packet.hex()}")
+
+    def write_packet(self, packet: bytes):
+        """Write an already assembled frame (e.g. a cached status frame)"""
+        with self.write_lock:
+            self.ser.write(packet)
+        self.log(f"Sent: {packet.hex()}")
+
+    def read_chunk(self) -> bytes:
+        """One read call: blocks (up to the port timeout) for the first byte,
+        then returns everything that is already waiting."""
+        size = self.chunk_size or max(1, self.ser.in_waiting)
+        return self.ser.read(size)
+
+    def process_chunk(self, chunk: bytes) -> list:
+        packets = self.parser.feed(chunk)
+        for payload in packets:
+            self.log(f"Received valid packet: {payload.hex()}")
+        return packets
 
     def receive(self):
-        while True:
-            byte = self.ser.read(1)
-            if byte == b'\x47':  # look for first header byte
-                print("byte1")
-                second = self.ser.read(1)
-                if second == b'\x54':
-                    print("byte2")
-                    length = self.ser.read(1)
-                    if not length:
-                        print("not length")
-                        continue
-                    length_val = length[0]
-                    payload = self.ser.read(length_val)
-                    crc = self.ser.read(2)
-                    if len(payload) != length_val or len(crc) != 2:
-                        print("Invalid packet size")
-                        continue
-
-                    calc_crc = CRC_FUNC(payload)
-                    recv_crc = struct.unpack('>H', crc)[0]
-                    if calc_crc == recv_crc:
-                        print(f"Received valid packet: {payload.hex()}")
-                        return payload
-                    else:
-                        print(f"CRC mismatch! Expected {calc_crc:04X}, got {recv_crc:04X}")
-                else:
-                    continue
-            print("it")
+        """Return the next valid payload, or None if the port timeout expires"""
+        with self.read_lock:
+            while not self.pending:
+                chunk = self.read_chunk()
+                if not chunk:
+                    return None
+                self.pending.extend(self.process_chunk(chunk))
+            return self.pending.popleft()
+
+    # Callback API: a background thread hands every payload to callback(payload)
+    def start_listener(self, callback):
+        if self.listener_thread and self.listener_thread.is_alive():
+            raise RuntimeError("Listener already running")
+        self.listener_stop.clear()
+        self.listener_thread = threading.Thread(target=self._listen, args=(callback,), daemon=True)
+        self.listener_thread.start()
+
+    @property
+    def listening(self):
+        """False once the listener died, e.g. the USB gadget went away"""
+        return self.listener_thread is not None and self.listener_thread.is_alive()
+
+    def stop_listener(self):
+        self.listener_stop.set()
+        if hasattr(self.ser, "cancel_read"):
+            self.ser.cancel_read()
+        if self.listener_thread:
+            self.listener_thread.join()
+            self.listener_thread = None
+
+    def _listen(self, callback):
+        while not self.listener_stop.is_set():
+            try:
+                payload = self.receive()
+            except serial.SerialException as e:
+                print(f"Serial listener stopped: {e}")
+                break
+            if payload is None:
+                continue
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Error in packet callback: {e}")
+
+    # asyncio API: async for packet in gt.packets()
+    async def packets(self):
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        fd = self.ser.fileno()
+        loop.add_reader(fd, ready.set)
+        try:
+            while True:
+                while self.pending:
+                    yield self.pending.popleft()
+                await ready.wait()
+                ready.clear()
+                with self.read_lock:
+                    waiting = self.ser.in_waiting
+                    if waiting:
+                        self.pending.extend(self.process_chunk(self.ser.read(waiting)))
+        finally:
+            loop.remove_reader(fd)
 
     def close(self):
+        if self.listener_thread:
+            self.stop_listener()
         self.ser.close()
 
 if __name__ == "__main__":
-    from mock_serial import MockSerial
+    # Loopback demo over a pty pair (replaces the socat mockup)
+    import os
+    import tty
 
-    device = MockSerial()
-    device.open()
-
-    gt = GTPacket(port="/dev/pts/3")
+    master, slave = os.openpty()
+    tty.setraw(master)
+    gt = GTPacket(port=os.ttyname(slave), timeout=1, debug=True)
 
     try:
-        # Prepare a mock serial device
-        device.stub(receive_bytes=gt.build_packet(b'\x01\x02'), send_bytes=gt.build_packet(b'\x01'))  # Mock packet: GT + length 2 + data 01+  CRC
+        first = gt.build_packet(b'\x01\x02')
+        second = gt.build_packet(b'\x03')
+        corrupted = bytearray(gt.build_packet(b'\x04'))
+        corrupted[3] ^= 0xFF
 
-        # Send command with opcode/data
-        print("Sending:")
-        gt.send(b'\x01')
-        time.sleep(5)
+        # Packet split across two writes, then corrupted + valid in one write
+        os.write(master, first[:3])
+        time.sleep(0.05)
+        os.write(master, first[3:])
+        os.write(master, bytes(corrupted) + second)
+        print(f"Parsed: {gt.receive()}")
+        print(f"Parsed: {gt.receive()}")
 
-        # Wait for a response
-        # response = gt.receive()
-        # print(f"Parsed Response: {response}")
-    except Exception as e:
-        print(e)
+        # Callback API
+        gt.start_listener(lambda payload: print(f"Callback got: {payload.hex()}"))
+        os.write(master, gt.build_packet(b'\x05') + gt.build_packet(b'\x06'))
+        time.sleep(0.2)
+        gt.stop_listener()
+
+        # asyncio API
+        async def main():
+            os.write(master, gt.build_packet(b'\x07'))
+            async for packet in gt.packets():
+                print(f"Async got: {packet.hex()}")
+                break
+        asyncio.run(main())
+
+        # Sending side
+        gt.send(b'\x01')
+        print(f"Master read: {os.read(master, 64).hex()}")
     finally:
-        
         gt.close()
+        os.close(master)
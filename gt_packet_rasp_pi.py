@@ -10,17 +10,30 @@ WAIT_CRC_1 = 4
 WAIT_CRC_2 = 5
 
 
-def crc16_ccitt_false(data: bytes) -> int:
-    """CRC-16-CCITT-FALSE implementation"""
-    crc = 0xFFFF
-    for byte in data:
-        crc ^= (byte << 8)
+def _make_crc16_table() -> list:
+    """Precompute the 256-entry lookup table for CRC-16-CCITT-FALSE"""
+    table = []
+    for i in range(256):
+        crc = i << 8
         for _ in range(8):
             if crc & 0x8000:
                 crc = (crc << 1) ^ 0x1021
             else:
                 crc <<= 1
-            crc &= 0xFFFF  # keep crc 16-bit
+            crc &= 0xFFFF
+        table.append(crc)
+    return table
+
+
+CRC16_TABLE = _make_crc16_table()
+
+
+def crc16_ccitt_false(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16-CCITT-FALSE implementation (table driven).
+    Pass a previous result as `crc` to continue a running checksum."""
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
     return crc
 
 
@@ -31,6 +44,7 @@ class GTPacketParser:
         self.payload_pos = 0
         self.payload = bytearray()
         self.crc_bytes = bytearray(2)
+        self.buffer = bytearray()  # unconsumed bytes for feed()
 
     def reset(self):
         self.state = WAIT_HEADER_1
@@ -85,6 +99,48 @@ class GTPacketParser:
 
         return False, b''
 
+    def feed(self, buf: bytes) -> list:
+        """Feed a whole chunk (e.g. the result of serial.read). Returns the list
+        of every complete, CRC-valid payload found. Partial frames are kept
+        until the next call, so frames may be split across chunks."""
+        packets = []
+        data = self.buffer
+        data += buf
+        header = bytes((GT_HEADER_1, GT_HEADER_2))
+        pos = 0
+        end = len(data)
+        while True:
+            start = data.find(header, pos)
+            if start < 0:
+                # Keep a trailing 'G' in case the 'T' arrives in the next chunk
+                if end and data[-1] == GT_HEADER_1:
+                    pos = max(pos, end - 1)
+                else:
+                    pos = end
+                break
+            if start + 3 > end:
+                pos = start
+                break
+            length = data[start + 2]
+            if length == 0:
+                # build_gt_packet never emits empty payloads, resync
+                pos = start + 1
+                continue
+            frame_end = start + 3 + length + 2
+            if frame_end > end:
+                pos = start
+                break
+            payload = bytes(data[start + 3:start + 3 + length])
+            received_crc = (data[frame_end - 2] << 8) | data[frame_end - 1]
+            if crc16_ccitt_false(payload) == received_crc:
+                pos = frame_end
+                packets.append(payload)
+            else:
+                # CRC mismatch, the header may have been part of the payload
+                pos = start + 1
+        del data[:pos]
+        return packets
+
 
 def build_gt_packet(data: bytes) -> bytes:
     """Construct a GT packet from a data payload"""
@@ -123,4 +179,8 @@ if __name__ == "__main__":
         success, received_payload = parser.read_byte(byte)
         if success:
             print(f"Received full payload: {received_payload}")
-            print(f"Payload matches original? {received_payload == payload}")
\ No newline at end of file
+            print(f"Payload matches original? {received_payload == payload}")
+    # Same stream fed as one chunk, as it would come from serial.read
+    print("\nFeeding whole packet to parser...")
+    for received_payload in GTPacketParser().feed(packet + build_gt_packet(b"second")):
+        print(f"Received full payload: {received_payload}")
@@ -0,0 +1,417 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from gt_packet_rasp_pi import GT_MAX_PAYLOAD_SIZE
+
+"""
+Reliable file transfer on top of GT frames.
+
+The file is cut into numbered chunks that fill a GT frame. The sender keeps
+a sliding window of chunks in flight; the receiver answers with selective
+ACKs (first missing chunk + a bitmap of the following ones). Chunks missing
+below the highest received one are retransmitted immediately, anything
+else after a timeout. The receiver writes chunks straight into a
+preallocated .part file and persists its bitmap, so an interrupted transfer
+resumes where it stopped when the same file is offered again.
+
+Frames (payload of a GT packet, big endian):
+    OFFER  op, file id u16, size u32, chunks u32, chunk size u16, crc32 u32, name
+    DATA   op, file id u16, chunk u32, data
+    ACK    op, file id u16, first missing chunk u32, bitmap of the next chunks
+    DONE   op, file id u16, ok u8
+"""
+
+OFFER_OPCODE = 0x10
+DATA_OPCODE = 0x11
+ACK_OPCODE = 0x12
+DONE_OPCODE = 0x13
+TRANSFER_OPCODES = (OFFER_OPCODE, DATA_OPCODE, ACK_OPCODE, DONE_OPCODE)
+
+OFFER = struct.Struct(">BHIIHI")
+DATA = struct.Struct(">BHI")
+ACK = struct.Struct(">BHI")
+DONE = struct.Struct(">BHB")
+CHUNK_SIZE = GT_MAX_PAYLOAD_SIZE - DATA.size
+ACK_BITMAP_BYTES = 32  # covers the 256 chunks after the first missing one
+FRAME_OVERHEAD = 5  # GT header, length and CRC
+
+
+def file_crc32(path):
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+
+def frame_time(payload_size, baud):
+    return (payload_size + FRAME_OVERHEAD) * 10 / baud
+
+
+class FileSender:
+
+    def __init__(self, send, path, file_id=1, name=None, window=64, baud=115200, max_idle=30.0):
+        self.send = send  # callable taking one GT payload
+        self.path = path
+        self.file_id = file_id
+        self.name = name or os.path.basename(path)
+        self.window = window
+        self.max_idle = max_idle
+        # A chunk is late once a whole window could have gone out and come back
+        self.timeout = 2 * window * frame_time(GT_MAX_PAYLOAD_SIZE, baud) + 0.5
+
+        self.size = os.path.getsize(path)
+        self.chunks = max(1, -(-self.size // CHUNK_SIZE))
+        self.crc32 = file_crc32(path)
+        self.condition = threading.Condition()
+        self.acked = bytearray(self.chunks)
+        self.base = 0
+        self.sent_at = {}
+        self.sent_once = bytearray(self.chunks)
+        self.offer_acked = False
+        self.result = None  # True/False once DONE arrives
+        self.cancelled = False
+
+        self.chunks_sent = 0
+        self.retransmissions = 0
+
+    def offer_payload(self):
+        return OFFER.pack(OFFER_OPCODE, self.file_id, self.size, self.chunks, CHUNK_SIZE,
+                          self.crc32) + self.name.encode()[:GT_MAX_PAYLOAD_SIZE - OFFER.size]
+
+    def handle_packet(self, payload):
+        """Feed every received ACK/DONE payload here (listener thread)"""
+        op = payload[0]
+        if op == ACK_OPCODE and len(payload) >= ACK.size:
+            _, file_id, base = ACK.unpack_from(payload)
+            if file_id != self.file_id:
+                return
+            bitmap = payload[ACK.size:]
+            with self.condition:
+                self.offer_acked = True
+                for seq in range(self.base, min(base, self.chunks)):
+                    self.acked[seq] = 1
+                highest = base - 1
+                for i in range(len(bitmap) * 8):
+                    seq = base + 1 + i
+                    if seq < self.chunks and bitmap[i // 8] & (0x80 >> (i % 8)):
+                        self.acked[seq] = 1
+                        highest = seq
+                self.base = max(self.base, min(base, self.chunks))
+                # Serial links keep order: a hole below the highest received
+                # chunk is a loss, resend it now rather than after the timeout
+                newest = self.sent_at.get(highest)
+                if newest is not None:
+                    for seq in range(self.base, highest):
+                        sent = self.sent_at.get(seq)
+                        if not self.acked[seq] and sent is not None and sent <= newest:
+                            del self.sent_at[seq]
+                self.condition.notify_all()
+        elif op == DONE_OPCODE and len(payload) >= DONE.size:
+            _, file_id, ok = DONE.unpack_from(payload)
+            if file_id == self.file_id:
+                with self.condition:
+                    self.result = bool(ok)
+                    self.condition.notify_all()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+    def run(self):
+        """Blocks until the receiver confirms the file; returns True on success"""
+        last_progress = time.monotonic()
+        offered_at = 0.0
+        with open(self.path, "rb") as f:
+            while True:
+                with self.condition:
+                    now = time.monotonic()
+                    if self.result is not None:
+                        return self.result
+                    if self.cancelled:
+                        return False
+                    if now - last_progress > self.max_idle:
+                        print(f"Transfer of {self.name} timed out")
+                        return False
+                    if not self.offer_acked:
+                        # The receiver's first ACK tells us what it already has
+                        if now - offered_at > self.timeout:
+                            self.send(self.offer_payload())
+                            offered_at = now
+                        self.condition.wait(0.05)
+                        continue
+                    while self.base < self.chunks and self.acked[self.base]:
+                        self.base += 1
+                    if now - last_progress > self.timeout and now - offered_at > self.timeout:
+                        # No progress: DONE lost, or a restarted receiver that ignores our
+                        # DATA. Offering again gets DONE resent or the .part resumed
+                        self.send(self.offer_payload())
+                        offered_at = now
+                    to_send = []
+                    for seq in range(self.base, min(self.base + self.window, self.chunks)):
+                        if self.acked[seq]:
+                            continue
+                        sent = self.sent_at.get(seq)
+                        if sent is None or now - sent > self.timeout:
+                            if self.sent_once[seq]:
+                                self.retransmissions += 1
+                            self.sent_once[seq] = 1
+                            to_send.append(seq)
+                            self.sent_at[seq] = now
+                    before = self.base
+                for seq in to_send:
+                    f.seek(seq * CHUNK_SIZE)
+                    self.send(DATA.pack(DATA_OPCODE, self.file_id, seq) + f.read(CHUNK_SIZE))
+                    self.chunks_sent += 1
+                with self.condition:
+                    if not to_send:
+                        self.condition.wait(0.05)
+                    if self.base != before or self.result is not None:
+                        last_progress = time.monotonic()
+
+
+class FileReceiver:
+
+    def __init__(self, send, directory, ack_every=16, persist_every=64):
+        self.send = send
+        self.directory = directory
+        self.ack_every = ack_every
+        self.persist_every = persist_every
+        self.lock = threading.Lock()
+        self.file_id = None
+        self.file = None
+        self.received = None
+        self.completed = {}  # (file id, name, size, crc32) -> final path
+        self.on_complete = None
+
+    def part_paths(self, name):
+        final = os.path.join(self.directory, os.path.basename(name))
+        return final, final + ".part", final + ".part.map"
+
+    def handle_packet(self, payload):
+        op = payload[0]
+        with self.lock:
+            if op == OFFER_OPCODE and len(payload) >= OFFER.size:
+                self.open_transfer(payload)
+            elif op == DATA_OPCODE and len(payload) >= DATA.size:  # a 0-byte file has one empty chunk
+                self.write_chunk(payload)
+
+    def open_transfer(self, payload):
+        _, file_id, size, chunks, chunk_size, crc32 = OFFER.unpack_from(payload)
+        name = payload[OFFER.size:].decode(errors="replace")
+        if (file_id, name, size, crc32) in self.completed:
+            # Our DONE got lost, repeat it. The id alone is not enough: a
+            # rebooted sender may reuse it for another file
+            self.send(DONE.pack(DONE_OPCODE, file_id, 1))
+            return
+        if self.file_id == file_id and self.file:
+            self.send_ack()
+            return
+        self.close_file()
+        final, part, map_path = self.part_paths(name)
+        self.key = struct.pack(">IIHI", size, chunks, chunk_size, crc32)
+        self.received = bytearray(chunks)
+        if os.path.exists(part) and os.path.exists(map_path):
+            with open(map_path, "rb") as m:
+                saved = m.read()
+            if saved[:len(self.key)] == self.key and len(saved) == len(self.key) + chunks:
+                self.received = bytearray(saved[len(self.key):])
+                print(f"Resuming {name}: {sum(self.received)}/{chunks} chunks already here")
+        mode = "r+b" if os.path.exists(part) and any(self.received) else "w+b"
+        self.file = open(part, mode)
+        if mode == "w+b":
+            self.file.truncate(size)
+        self.file_id = file_id
+        self.name = name
+        self.size = size
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.crc32 = crc32
+        self.paths = (final, part, map_path)
+        self.unacked = 0
+        self.unpersisted = 0
+        self.send_ack()
+
+    def first_missing(self):
+        missing = self.received.find(0)
+        return self.chunks if missing < 0 else missing
+
+    def send_ack(self):
+        base = self.first_missing()
+        bitmap = bytearray(ACK_BITMAP_BYTES)
+        for i in range(ACK_BITMAP_BYTES * 8):
+            seq = base + 1 + i
+            if seq >= self.chunks:
+                break
+            if self.received[seq]:
+                bitmap[i // 8] |= 0x80 >> (i % 8)
+        self.send(ACK.pack(ACK_OPCODE, self.file_id, base) + bytes(bitmap))
+        self.unacked = 0
+
+    def persist(self):
+        with open(self.paths[2], "wb") as m:
+            m.write(self.key + bytes(self.received))
+        self.unpersisted = 0
+
+    def write_chunk(self, payload):
+        _, file_id, seq = DATA.unpack_from(payload)
+        if file_id != self.file_id or self.file is None or seq >= self.chunks:
+            if any(key[0] == file_id for key in self.completed):
+                self.send(DONE.pack(DONE_OPCODE, file_id, 1))
+            return
+        if self.received[seq]:
+            self.send_ack()  # duplicate: the sender missed our ACK
+            return
+        expected = self.first_missing()
+        self.file.seek(seq * self.chunk_size)
+        self.file.write(payload[DATA.size:])
+        self.received[seq] = 1
+        self.unacked += 1
+        self.unpersisted += 1
+        if self.unpersisted >= self.persist_every:
+            self.file.flush()
+            self.persist()
+        complete = self.first_missing() >= self.chunks
+        if complete:
+            self.finish()
+        elif self.unacked >= self.ack_every or seq > expected or seq == self.chunks - 1:
+            self.send_ack()
+
+    def finish(self):
+        final, part, map_path = self.paths
+        self.file.close()
+        self.file = None
+        ok = file_crc32(part) == self.crc32
+        if ok:
+            os.replace(part, final)
+            if os.path.exists(map_path):
+                os.remove(map_path)
+            self.completed[(self.file_id, self.name, self.size, self.crc32)] = final
+            print(f"Received {final} ({self.size} bytes)")
+        else:
+            # Start over on the next offer
+            print(f"CRC mismatch for {self.name}, discarding")
+            os.remove(part)
+            if os.path.exists(map_path):
+                os.remove(map_path)
+        self.send(DONE.pack(DONE_OPCODE, self.file_id, 1 if ok else 0))
+        self.file_id = None
+        if ok and self.on_complete:
+            self.on_complete(final)
+
+    def close_file(self):
+        if self.file:
+            self.file.flush()
+            self.persist()
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        with self.lock:
+            self.close_file()
+
+
+if __name__ == "__main__":
+    # Ground side: --fetch asks the camera for a file and receives it.
+    # Without --port, a local demo: sender and receiver on two pty pairs joined
+    # by a relay that paces bytes at the baud rate and flips bits at the given
+    # bit-error rate
+    import argparse
+    import random
+    import select
+    import tempfile
+    import tty
+    from gt_packet import GTPacket
+    from bench_serial_link import corrupt, wire_time
+
+    parser = argparse.ArgumentParser(description="GT file transfer over a simulated serial link")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="file size in bytes")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--ber", type=float, default=1e-5)
+    parser.add_argument("--window", type=int, default=64)
+    parser.add_argument("--interrupt", type=float, default=None,
+                        help="stop the first attempt after this many seconds and resume")
+    parser.add_argument("--port", default=None, help="serial port of the camera link")
+    parser.add_argument("--fetch", default=None, help="path on the camera, e.g. photos/selfie.jpg")
+    parser.add_argument("--dest", default="photos", help="where fetched files go")
+    args = parser.parse_args()
+
+    if args.port:
+        os.makedirs(args.dest, exist_ok=True)
+        link = GTPacket(args.port, baudrate=args.baud, timeout=0.1)
+        receiver = FileReceiver(link.send, args.dest)
+        finished = threading.Event()
+        receiver.on_complete = lambda path: finished.set()
+        link.start_listener(receiver.handle_packet)
+        link.send(b"\x06" + args.fetch.encode())  # DOWNLINK_OPCODE in test_video
+        try:
+            finished.wait()
+        except KeyboardInterrupt:
+            print("Interrupted, run again to resume")
+        receiver.close()
+        link.close()
+        raise SystemExit
+
+    def open_pair():
+        master, slave = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        return master, os.ttyname(slave)
+
+    def relay(src, dst, stop, rng):
+        while not stop.is_set():
+            ready, _, _ = select.select([src], [], [], 0.05)
+            if not ready:
+                continue
+            data = os.read(src, 64)
+            time.sleep(wire_time(len(data), args.baud))
+            os.write(dst, corrupt(data, args.ber, rng))
+
+    master_a, port_a = open_pair()
+    master_b, port_b = open_pair()
+    stop = threading.Event()
+    for src, dst, seed in ((master_a, master_b, 1), (master_b, master_a, 2)):
+        threading.Thread(target=relay, args=(src, dst, stop, random.Random(seed)), daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        source = os.path.join(scratch, "selfie.jpg")
+        with open(source, "wb") as f:
+            f.write(os.urandom(args.size))
+        inbox = os.path.join(scratch, "inbox")
+        os.makedirs(inbox)
+
+        pi = GTPacket(port_a, baudrate=args.baud, timeout=0.1)
+        ground = GTPacket(port_b, baudrate=args.baud, timeout=0.1)
+        receiver = FileReceiver(ground.send, inbox)
+        ground.start_listener(receiver.handle_packet)
+
+        attempts = [args.interrupt, None] if args.interrupt else [None]
+        start = time.perf_counter()
+        for limit in attempts:
+            sender = FileSender(pi.send, source, window=args.window, baud=args.baud)
+            pi.start_listener(sender.handle_packet)
+            if limit:
+                threading.Timer(limit, sender.cancel).start()
+            ok = sender.run()
+            pi.stop_listener()
+            print(f"Attempt: ok={ok}, {sender.chunks_sent} chunks sent, "
+                  f"{sender.retransmissions} retransmissions")
+            if limit:
+                time.sleep(0.5)  # let frames still on the wire arrive
+                receiver.close()
+        elapsed = time.perf_counter() - start
+
+        received = os.path.join(inbox, "selfie.jpg")
+        intact = os.path.exists(received) and file_crc32(received) == file_crc32(source)
+        link_rate = args.baud / 10
+        print(f"{args.size} bytes in {elapsed:.2f} s: {args.size / elapsed:.0f} B/s "
+              f"({args.size / elapsed / link_rate * 100:.1f}% of the {link_rate:.0f} B/s link), "
+              f"ber {args.ber:g}, intact={intact}")
+        stop.set()
+        pi.close()
+        ground.close()
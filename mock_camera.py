@@ -0,0 +1,274 @@
+import os
+import random
+import threading
+import time
+
+"""
+Hardware-free stand-ins for Picamera2, H264Encoder and the picamera2
+outputs, used when GTXR_CAMERA_BACKEND=mock (see camera_backend.py).
+Recording produces synthetic Annex-B H264 frames and microsecond
+timestamps at the fps set by FrameDurationLimits.
+
+Tunable through SETTINGS or GTXR_MOCK_* environment variables:
+    bitrate        bits/s of the synthetic stream
+    speed          1.0 = real time, 0 = as fast as possible
+    drop_rate      probability a frame is dropped (timestamp still advances)
+    stall_every    every N frames the encoder stalls ...
+    stall_seconds  ... for this long
+    configure_seconds  simulated cost of configure()
+"""
+
+SETTINGS = {
+    "bitrate": float(os.environ.get("GTXR_MOCK_BITRATE", 5_000_000)),
+    "speed": float(os.environ.get("GTXR_MOCK_SPEED", 1.0)),
+    "drop_rate": float(os.environ.get("GTXR_MOCK_DROP_RATE", 0.0)),
+    "stall_every": int(os.environ.get("GTXR_MOCK_STALL_EVERY", 0)),
+    "stall_seconds": float(os.environ.get("GTXR_MOCK_STALL_SECONDS", 0.0)),
+    "configure_seconds": float(os.environ.get("GTXR_MOCK_CONFIGURE_SECONDS", 0.05)),
+}
+
+IDR_NAL = b"\x00\x00\x00\x01\x65"
+P_NAL = b"\x00\x00\x00\x01\x41"
+SPS_PPS = b"\x00\x00\x00\x01\x67" + bytes(12) + b"\x00\x00\x00\x01\x68" + bytes(4)
+
+
+def sensor_clock_ns():
+    """libcamera SensorTimestamp clock"""
+    try:
+        return time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+    except (AttributeError, OSError):
+        return time.monotonic_ns()
+
+
+class Output:
+    """Same contract as picamera2.outputs.Output"""
+
+    def __init__(self, pts=None):
+        self.recording = False
+        self.ptsoutput = pts
+
+    def start(self):
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        pass
+
+
+class FileOutput(Output):
+
+    def __init__(self, file=None, pts=None):
+        super().__init__(pts=pts)
+        self.fileoutput = open(file, "wb") if isinstance(file, str) else file
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if self.recording and self.fileoutput:
+            self.fileoutput.write(frame)
+
+    def stop(self):
+        super().stop()
+        if self.fileoutput:
+            self.fileoutput.flush()
+
+
+class H264Encoder:
+
+    def __init__(self, bitrate=None, repeat=False, iperiod=None, framerate=None, qp=None, profile=None):
+        self.bitrate = bitrate
+        self.repeat = repeat
+        self.iperiod = iperiod or 60
+        self._output = []
+
+    @property
+    def output(self):
+        return self._output
+
+    @output.setter
+    def output(self, value):
+        outputs = value if isinstance(value, list) else [value]
+        for out in outputs:
+            if not isinstance(out, Output):
+                raise RuntimeError("Must pass Output")
+        self._output = outputs
+
+
+class FakeImage:
+
+    def __init__(self, size):
+        self.size = size
+
+    def convert(self, mode):
+        return self
+
+    def save(self, path, **kwargs):
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8" + bytes(1024) + b"\xff\xd9")
+
+
+class FakeRequest:
+
+    def __init__(self, picam2, timestamp_ns, sequence):
+        self.picam2 = picam2
+        self.metadata = {
+            "SensorTimestamp": timestamp_ns,
+            "FrameDuration": picam2.frame_duration,
+            "SensorSequence": sequence,
+        }
+
+    def get_metadata(self):
+        return self.metadata
+
+    def make_image(self, name="main"):
+        return FakeImage(self.picam2.stream_size(name))
+
+    def make_array(self, name="main"):
+        import numpy as np
+        width, height = self.picam2.stream_size(name)
+        if name == "lores":
+            # picamera2 lores streams are YUV420: Y plane then U and V, height * 3/2 rows
+            return np.full((height * 3 // 2, width), 128, dtype=np.uint8)
+        return np.zeros((height, width, 4), dtype=np.uint8)
+
+    def save(self, name, path, format=None):
+        self.make_image(name).save(path)
+
+    def release(self):
+        pass
+
+
+class Picamera2:
+
+    def __init__(self, camera_num=0):
+        self.camera_config = None
+        self.started = False
+        self.post_callback = None
+        self.pre_callback = None
+        self.frame_duration = 33333
+        self.encoder = None
+        self.recording_thread = None
+        self.recording_stop = threading.Event()
+        self.sequence = 0
+
+    # Configuration
+    def create_configuration(self, kind, main=None, lores=None, controls=None, **kwargs):
+        config = {"kind": kind, "main": dict(main or {}), "controls": dict(controls or {})}
+        if lores:
+            config["lores"] = dict(lores)
+        return config
+
+    def create_still_configuration(self, main=None, lores=None, controls=None, **kwargs):
+        return self.create_configuration("still", main, lores, controls)
+
+    def create_video_configuration(self, main=None, lores=None, controls=None, **kwargs):
+        return self.create_configuration("video", main, lores, controls)
+
+    def create_preview_configuration(self, main=None, lores=None, controls=None, **kwargs):
+        return self.create_configuration("preview", main, lores, controls)
+
+    def configure(self, config):
+        if self.started:
+            raise RuntimeError("Camera must be stopped before configuring")
+        time.sleep(SETTINGS["configure_seconds"])
+        self.camera_config = config
+        limits = config.get("controls", {}).get("FrameDurationLimits")
+        self.frame_duration = limits[0] if limits else 33333
+
+    def stream_size(self, name):
+        stream = (self.camera_config or {}).get(name) or {}
+        return tuple(stream.get("size", (640, 480)))
+
+    def set_controls(self, controls):
+        if "FrameDurationLimits" in controls:
+            self.frame_duration = controls["FrameDurationLimits"][0]
+
+    # Running
+    def start(self, config=None, show_preview=False):
+        if config is not None:
+            self.configure(config)
+        self.started = True
+
+    def stop(self):
+        self.stop_recording()
+        self.started = False
+
+    def capture_file(self, path, name="main", format=None):
+        self.capture_request().make_image(name).save(path)
+
+    def capture_request(self, flush=None):
+        if not self.started:
+            raise RuntimeError("Camera is not running")
+        time.sleep(self.frame_duration / 1e6)
+        self.sequence += 1
+        return FakeRequest(self, sensor_clock_ns(), self.sequence)
+
+    # Recording
+    def start_encoder(self, encoder, output=None, pts=None, quality=None, name=None):
+        if output is not None:
+            if isinstance(output, str):
+                output = FileOutput(output, pts=pts)
+            encoder.output = output
+        self.encoder = encoder
+        for out in encoder.output:
+            out.start()
+        self.recording_stop.clear()
+        self.recording_thread = threading.Thread(target=self.produce_frames, args=(encoder,),
+                                                 name="mock-encoder", daemon=True)
+        self.recording_thread.start()
+
+    def start_recording(self, encoder, output, pts=None, config=None, quality=None, name=None):
+        if config is not None:
+            self.configure(config)
+        self.start_encoder(encoder, output, pts=pts)
+        self.start()
+
+    def stop_encoder(self, encoders=None):
+        if self.recording_thread is None:
+            return
+        self.recording_stop.set()
+        self.recording_thread.join()
+        self.recording_thread = None
+        for out in self.encoder.output:
+            out.stop()
+        self.encoder = None
+
+    def stop_recording(self):
+        # Like picamera2: stops the camera as well as the encoder
+        self.stop_encoder()
+        self.started = False
+
+    def produce_frames(self, encoder):
+        bitrate = encoder.bitrate or SETTINGS["bitrate"]
+        frame_bytes = max(64, int(bitrate / 8 * self.frame_duration / 1e6))
+        # IDR frames are several times larger than P frames
+        p_size = max(32, int(frame_bytes * encoder.iperiod / (encoder.iperiod + 4)))
+        idr_size = p_size * 5
+        idr_payload = (SPS_PPS if encoder.repeat else b"") + IDR_NAL + random.randbytes(idr_size)
+        p_payload = P_NAL + random.randbytes(p_size)
+        next_time = time.monotonic()
+        start_ns = sensor_clock_ns()
+        index = 0
+        while not self.recording_stop.is_set():
+            timestamp = index * self.frame_duration
+            self.sequence += 1
+            keyframe = index % encoder.iperiod == 0
+            dropped = SETTINGS["drop_rate"] and random.random() < SETTINGS["drop_rate"] and not keyframe
+            if not dropped:
+                # A dropped frame never reaches the application: a sequence gap
+                if self.post_callback:
+                    self.post_callback(FakeRequest(self, start_ns + timestamp * 1000, self.sequence))
+                frame = idr_payload if keyframe else p_payload
+                for out in encoder.output:
+                    out.outputframe(frame, keyframe, timestamp)
+            index += 1
+            if SETTINGS["stall_every"] and index % SETTINGS["stall_every"] == 0:
+                time.sleep(SETTINGS["stall_seconds"])
+            if SETTINGS["speed"]:
+                next_time += self.frame_duration / 1e6 / SETTINGS["speed"]
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def close(self):
+        self.stop()
@@ -0,0 +1,204 @@
+import threading
+import time
+import numpy as np
+
+"""
+Motion / launch detector on the lores stream.
+Every `every`-th frame the Y plane of the 320x240 YUV420 lores buffer is
+subsampled (every `step`-th pixel) and compared with the previous analysed
+frame: the score is the percentage of pixels that changed by more than
+`pixel_delta`, so sensor noise scores ~0 and a small moving object is not
+averaged away. A frame also counts when the mean brightness jumps by more
+than `brightness_jump` (a motor plume lights up the whole frame). An event
+starts when frames keep counting - score above max(threshold, factor x
+running noise floor) - for `min_hits` analyses and ends after `hold` quiet
+ones.
+
+post_callback() only copies the Y plane into a single slot; the analysis
+runs on its own thread and skips frames when it falls behind, so it never
+holds up the camera. on_event(state, pts_us, score) is called with
+state "start" or "end".
+"""
+
+EVERY = 4  # analyse one frame in 4: 30 per second at 120 fps
+STEP = 2  # 160x120 from the 320x240 lores Y plane
+PIXEL_DELTA = 20  # grey levels (0-255) for a pixel to count as changed
+THRESHOLD = 0.5  # percent of changed pixels that always counts as motion
+FACTOR = 4.0  # or this many times the running noise floor
+BRIGHTNESS_JUMP = 8.0  # change of mean grey level between analysed frames
+MIN_HITS = 3
+HOLD = 30  # quiet analyses before an event ends (1 s at 30 per second)
+
+
+class MotionDetector:
+
+    def __init__(self, lores_size, every=EVERY, step=STEP, pixel_delta=PIXEL_DELTA, threshold=THRESHOLD,
+                 factor=FACTOR, brightness_jump=BRIGHTNESS_JUMP, min_hits=MIN_HITS, hold=HOLD,
+                 on_event=None, pts_of=None):
+        self.width, self.height = lores_size
+        self.every = every
+        self.step = step
+        self.pixel_delta = pixel_delta
+        self.threshold = threshold
+        self.factor = factor
+        self.brightness_jump = brightness_jump
+        self.min_hits = min_hits
+        self.hold = hold
+        self.on_event = on_event
+        self.pts_of = pts_of or (lambda sensor_us: None)  # sensor time -> recording PTS
+
+        shape = (-(-self.height // step), -(-self.width // step))
+        self.current = np.zeros(shape, dtype=np.int16)
+        self.previous = np.zeros(shape, dtype=np.int16)
+        self.diff = np.zeros(shape, dtype=np.int16)
+        self.changed = np.zeros(shape, dtype=bool)
+        self.has_previous = False
+        self.noise_floor = None
+        self.last_brightness = None
+        self.hits = 0
+        self.quiet = 0
+        self.active = False
+
+        self.frame_count = 0
+        self.analysed = 0
+        self.skipped = 0
+        self.events = 0
+        self.cpu_seconds = 0.0
+        self.last_score = 0.0
+        self.last_jump = 0.0
+
+        self.slot = None  # (y plane copy, sensor us) waiting for the worker
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+    def analyse(self, y, sensor_us=None):
+        """One frame: y is the full-resolution Y plane; returns the score (None for the first)"""
+        start = time.thread_time()
+        np.copyto(self.current, y[::self.step, ::self.step], casting="unsafe")
+        brightness = float(self.current.mean())
+        score = None
+        if self.has_previous:
+            np.subtract(self.current, self.previous, out=self.diff)
+            np.abs(self.diff, out=self.diff)
+            np.greater(self.diff, self.pixel_delta, out=self.changed)
+            score = 100.0 * np.count_nonzero(self.changed) / self.changed.size
+            self.last_score = score
+            self.last_jump = abs(brightness - self.last_brightness)
+            self.update_state(score, self.last_jump, sensor_us)
+        self.current, self.previous = self.previous, self.current
+        self.has_previous = True
+        self.last_brightness = brightness
+        self.analysed += 1
+        self.cpu_seconds += time.thread_time() - start
+        return score
+
+    def update_state(self, score, jump, sensor_us):
+        floor = self.noise_floor if self.noise_floor is not None else score
+        triggered = score > max(self.threshold, self.factor * floor) or jump > self.brightness_jump
+        if not triggered:
+            # Only quiet frames feed the noise floor, so a long event does not raise it
+            self.noise_floor = score if self.noise_floor is None else 0.95 * self.noise_floor + 0.05 * score
+        if triggered:
+            self.hits += 1
+            self.quiet = 0
+            if not self.active and self.hits >= self.min_hits:
+                self.active = True
+                self.events += 1
+                self.emit("start", sensor_us, score)
+        else:
+            self.hits = 0
+            if self.active:
+                self.quiet += 1
+                if self.quiet >= self.hold:
+                    self.active = False
+                    self.emit("end", sensor_us, score)
+
+    def emit(self, state, sensor_us, score):
+        if self.on_event is None:
+            return
+        pts_us = self.pts_of(sensor_us) if sensor_us is not None else None
+        try:
+            self.on_event(state, pts_us, score)
+        except Exception as e:
+            print(f"Error in motion event callback: {e}")
+
+    # Picamera2 hook, camera thread
+    def post_callback(self, request):
+        self.frame_count += 1
+        if self.frame_count % self.every:
+            return
+        with self.condition:
+            if self.slot is not None:
+                self.skipped += 1  # the worker is behind, drop the older frame
+            yuv = request.make_array("lores")
+            sensor_us = request.get_metadata().get("SensorTimestamp", 0) // 1000
+            self.slot = (yuv[:self.height, :self.width], sensor_us)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.slot is None and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                y, sensor_us = self.slot
+                self.slot = None
+            self.analyse(y, sensor_us)
+
+    def start(self):
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name="motion", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.analysed:
+            print(f"Motion detector: {self.analysed} frames analysed ({self.skipped} skipped), "
+                  f"{self.cpu_seconds / self.analysed * 1e3:.2f} ms CPU per frame, {self.events} events")
+
+
+if __name__ == "__main__":
+    # Benchmark on synthetic lores frames. The camera rides the rocket: a
+    # textured scene with sensor noise, then from frame `--launch-at` the
+    # view slides away faster and faster (ground falling out of the frame)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Motion detector benchmark on synthetic frames")
+    parser.add_argument("--frames", type=int, default=2000, help="analysed frames")
+    parser.add_argument("--launch-at", type=int, default=1000)
+    parser.add_argument("--fps", type=float, default=120)
+    parser.add_argument("--every", type=int, default=EVERY)
+    parser.add_argument("--step", type=int, default=STEP)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    width, height = 320, 240
+    # 8x8 pixel blocks of random grey, a few times larger than the frame
+    blocks = rng.integers(30, 200, (height // 2, width // 8), dtype=np.uint8)
+    scene = np.kron(blocks, np.ones((8, 8), dtype=np.uint8)).astype(np.int16)
+    noise = [rng.integers(-4, 5, (height, width), dtype=np.int16) for _ in range(16)]
+    frames = []
+    for i in range(args.frames):
+        t = max(0, i - args.launch_at)
+        offset = min(scene.shape[0] - height, t * t // 4)  # accelerating
+        frame = scene[offset:offset + height, :width] + noise[i % len(noise)]
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+
+    events = []
+    detector = MotionDetector((width, height), every=args.every, step=args.step,
+                              on_event=lambda state, pts, score: events.append((state, detector.analysed, score)))
+    for frame in frames:
+        detector.analyse(frame)
+    per_frame_ms = detector.cpu_seconds / detector.analysed * 1e3
+    share = per_frame_ms / 1e3 * args.fps / args.every * 100
+    print(f"{per_frame_ms:.3f} ms CPU per analysed frame ({width}x{height} Y, step {args.step}); "
+          f"one in {args.every} frames at {args.fps:g} fps = {share:.2f}% of one core")
+    print(f"Noise floor {detector.noise_floor:.2f}, events: "
+          + ", ".join(f"{state} at frame {frame} (score {score:.1f})" for state, frame, score in events))
@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+import numpy as np
+from pts_analysis import list_pts_files, load_pts
+
+"""
+Flight post-processing: turns every videos_<ts>/ directory into one video.
+Directories are processed concurrently in a process pool. Frame timing
+comes from the .pts files instead of a fixed -r 110.
+
+Modes:
+    remux   stream copy, no re-encode -> <dir>_remux.mkv
+    encode  libx264 quality re-encode -> <dir>_slowmo.mp4 (the name the
+            old fmpeg_processing.sh used)
+With mkvmerge installed both keep the exact per-frame timestamps: encode
+first muxes the segments with the timecodes into a temporary MKV and lets
+ffmpeg encode from it, passing the timestamps through. Without it ffmpeg
+reads the raw H264 at the measured average fps (remux -> <dir>_remux.mp4)
+and the result says so.
+
+Work is skipped when the segments' content hash matches the cache entry
+written next to the output.
+
+Usage: python postprocess.py [dirs ...] [--mode remux|encode] [--jobs N]
+"""
+
+CACHE_FILE = ".postprocess_cache.json"
+HASH_BLOCK = 1024 * 1024
+SEGMENT_PATTERN = re.compile(r"video_(\d+)\.h264$")
+
+
+def discover(root="."):
+    return sorted(d for d in glob(os.path.join(root, "videos_*")) if os.path.isdir(d))
+
+
+def list_segments(directory):
+    """video_NNN.h264 paths in segment order (numeric: video_1000 comes after video_999)"""
+    found = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = SEGMENT_PATTERN.search(entry.name)
+            if match:
+                found.append((int(match.group(1)), entry.path))
+    return [path for _, path in sorted(found)]
+
+
+def content_hash(paths, extra=""):
+    digest = hashlib.blake2b(extra.encode(), digest_size=16)
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(HASH_BLOCK)
+                if not block:
+                    break
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def merge_timestamps(directory, out_path):
+    """Writes one timecode v2 file for all segments; returns (frames, fps)"""
+    offset = 0.0
+    last = None
+    frames = 0
+    interval = None
+    with open(out_path, "w") as out:
+        out.write("# timecode format v2\n")
+        for _, path in list_pts_files(directory):
+            pts = load_pts(path)
+            if not pts.size:
+                continue
+            if pts.size > 1:
+                interval = float((pts[-1] - pts[0]) / (pts.size - 1))
+            if last is not None and pts[0] + offset <= last:
+                # Segments from a restarted encoder start again at 0
+                offset = last + (interval or 0.0) - pts[0]
+            pts = pts + offset
+            np.savetxt(out, pts, fmt="%.3f")
+            frames += pts.size
+            if last is None:
+                first = pts[0]
+            last = float(pts[-1])
+    if frames < 2 or last == first:
+        return frames, None
+    return frames, (frames - 1) / (last - first) * 1000.0
+
+
+def output_path(directory, mode):
+    name = os.path.basename(os.path.normpath(directory))
+    if mode == "encode":
+        return os.path.join(directory, f"{name}_slowmo.mp4")
+    ext = "mkv" if shutil.which("mkvmerge") else "mp4"
+    return os.path.join(directory, f"{name}_remux.{ext}")
+
+
+def mkvmerge_command(segments, timestamps, out):
+    return (["mkvmerge", "-q", "-o", out, "--timestamps", f"0:{timestamps}", "("]
+            + segments + [")"])
+
+
+def build_commands(directory, mode, segments, timestamps, fps, out):
+    """Commands to run in order, and the intermediate files to remove afterwards"""
+    if shutil.which("mkvmerge"):
+        if mode == "remux":
+            return [mkvmerge_command(segments, timestamps, out)], []
+        timed = os.path.join(directory, ".timed.mkv")
+        # The MKV carries one timestamp per frame; passthrough keeps them (VFR) in the MP4
+        encode = ["ffmpeg", "-y", "-loglevel", "error", "-i", timed, "-fps_mode", "passthrough",
+                  "-c:v", "libx264", "-preset", "slow", "-crf", "18", out]
+        return [mkvmerge_command(segments, timestamps, timed), encode], [timed]
+    files_txt = os.path.join(directory, "files.txt")
+    with open(files_txt, "w") as f:
+        for segment in segments:
+            f.write(f"file '{os.path.basename(segment)}'\n")
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-r", f"{fps:.3f}",
+           "-f", "concat", "-safe", "0", "-i", files_txt]
+    if mode == "remux":
+        cmd += ["-c", "copy"]
+    else:
+        cmd += ["-c:v", "libx264", "-preset", "slow", "-crf", "18"]
+    return [cmd + [out]], []
+
+
+def process_directory(directory, mode="remux", fps=None, force=False):
+    start = time.perf_counter()
+    segments = list_segments(directory)
+    result = {"directory": directory, "segments": len(segments), "skipped": False,
+              "bytes": sum(os.path.getsize(s) for s in segments)}
+    if not segments:
+        result["error"] = "no segments"
+        return result
+
+    out = output_path(directory, mode)
+    cache_path = os.path.join(directory, CACHE_FILE)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    timing = "pts" if shutil.which("mkvmerge") else "average fps"
+    key = content_hash(segments, extra=f"{mode}:{fps}:{timing}")
+    if not force and cache.get(out) == key and os.path.exists(out):
+        result.update(skipped=True, output=out, seconds=time.perf_counter() - start)
+        return result
+
+    timestamps = os.path.join(directory, "timestamps.txt")
+    frames, measured_fps = merge_timestamps(directory, timestamps)
+    fps = fps or measured_fps or 120.0
+    commands, intermediates = build_commands(directory, mode, segments, timestamps, fps, out)
+    result["timing"] = timing
+    try:
+        for cmd in commands:
+            try:
+                proc = subprocess.run(cmd, capture_output=True, text=True)
+            except FileNotFoundError:
+                result["error"] = f"{cmd[0]} is not installed"
+                return result
+            # mkvmerge exits with 1 for warnings only
+            if proc.returncode > (1 if cmd[0] == "mkvmerge" else 0):
+                result["error"] = (proc.stderr or proc.stdout).strip()[-500:]
+                break
+    finally:
+        for path in intermediates:
+            if os.path.exists(path):
+                os.remove(path)
+    if "error" not in result:
+        cache[out] = key
+        with open(cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+    result.update(output=out, frames=frames, fps=fps, seconds=time.perf_counter() - start)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel flight video post-processing")
+    parser.add_argument("dirs", nargs="*", help="recording directories (default: discover videos_* here)")
+    parser.add_argument("--mode", choices=("remux", "encode"), default="remux")
+    parser.add_argument("--fps", type=float, default=None, help="override the fps measured from .pts (only used without mkvmerge)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true", help="ignore the cache")
+    args = parser.parse_args()
+
+    dirs = args.dirs or discover()
+    if not dirs:
+        print("No videos_* directories found")
+        raise SystemExit(1)
+
+    start = time.perf_counter()
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(process_directory, d, args.mode, args.fps, args.force) for d in dirs]
+        for future in as_completed(futures):
+            r = future.result()
+            if "error" in r:
+                print(f"{r['directory']}: FAILED: {r['error']}")
+                continue
+            if r["skipped"]:
+                print(f"{r['directory']}: up to date ({r['output']})")
+                continue
+            total_bytes += r["bytes"]
+            rate = r["bytes"] / r["seconds"] / 1e6 if r["seconds"] else 0.0
+            timing = "per-frame timestamps" if r["timing"] == "pts" else f"{r['fps']:.2f} fps (no mkvmerge)"
+            print(f"{r['directory']}: {r['segments']} segments, {r['frames']} frames at "
+                  f"{timing} -> {r['output']} in {r['seconds']:.1f} s ({rate:.1f} MB/s)")
+    elapsed = time.perf_counter() - start
+    print(f"Done: {len(dirs)} directories in {elapsed:.1f} s, "
+          f"{total_bytes / elapsed / 1e6 if elapsed else 0.0:.1f} MB/s overall")
@@ -0,0 +1,117 @@
+import threading
+from collections import deque
+from camera_backend import Output
+
+"""
+Armed-mode output: keeps the last `seconds` of encoded H264 in memory,
+in whole GOPs so the buffer always starts on a keyframe. trigger() writes
+the pre-roll to the downstream output and switches to live pass-through.
+Memory is capped by max_bytes regardless of bitrate.
+"""
+
+PREROLL_MAX_BYTES = 64 * 1024 * 1024  # out of the Pi Zero's 512 MB
+
+
+class PrerollOutput(Output):
+
+    def __init__(self, downstream, seconds=5, max_bytes=PREROLL_MAX_BYTES):
+        super().__init__()
+        self.downstream = downstream
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.gops = deque()  # each GOP: [(frame, keyframe, timestamp), ...]
+        self.buffered_bytes = 0
+        self.peak_bytes = 0
+        self.draining = False
+        self.triggered = False
+
+    @property
+    def buffered_seconds(self):
+        with self.lock:
+            return self.span_us() / 1_000_000
+
+    def span_us(self):
+        if not self.gops:
+            return 0
+        first = self.gops[0][0][2]
+        last = self.gops[-1][-1][2]
+        if first is None or last is None:
+            return 0
+        return last - first
+
+    def trim(self, by_time=True):
+        # Drop whole GOPs from the front, keeping the newest one
+        while len(self.gops) > 1:
+            if self.buffered_bytes <= self.max_bytes and not (
+                    by_time and self.span_us() - self.gop_span(self.gops[0]) >= self.seconds * 1_000_000):
+                break
+            self.drop_oldest_gop()
+        if self.buffered_bytes > self.max_bytes:
+            # A single GOP above the cap: nothing decodable can be kept
+            self.drop_oldest_gop()
+
+    def gop_span(self, gop):
+        if len(self.gops) < 2 or gop[0][2] is None or self.gops[1][0][2] is None:
+            return 0
+        return self.gops[1][0][2] - gop[0][2]
+
+    def drop_oldest_gop(self):
+        gop = self.gops.popleft()
+        self.buffered_bytes -= sum(len(frame) for frame, _, _ in gop)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio or not self.recording:
+            return
+        with self.lock:
+            if self.triggered:
+                live = True
+            else:
+                live = False
+                if keyframe:
+                    self.gops.append([])
+                elif not self.gops:
+                    return  # wait for a keyframe to start the buffer
+                # The encoder may reuse its buffer, keep our own copy
+                self.gops[-1].append((bytes(frame), keyframe, timestamp))
+                self.buffered_bytes += len(frame)
+                self.peak_bytes = max(self.peak_bytes, self.buffered_bytes)
+                # While draining, self.gops only holds frames that arrived after the
+                # snapshot: all of them are kept unless they exceed the byte cap
+                self.trim(by_time=not self.draining)
+        if live:
+            self.downstream.outputframe(frame, keyframe, timestamp)
+
+    def trigger(self):
+        """Write the pre-roll to disk and continue with live recording"""
+        with self.lock:
+            if self.triggered:
+                return
+            self.draining = True
+        print(f"Pre-roll triggered: {self.buffered_bytes} bytes buffered")
+        # Frames keep arriving while we drain; loop until the buffer is empty
+        # and only then switch the encoder thread to pass-through
+        while True:
+            with self.lock:
+                if not self.gops:
+                    self.draining = False
+                    self.triggered = True
+                    break
+                gops = list(self.gops)
+                self.gops.clear()
+                self.buffered_bytes = 0
+            for gop in gops:
+                for frame, keyframe, timestamp in gop:
+                    self.downstream.outputframe(frame, keyframe, timestamp)
+
+    def start(self):
+        super().start()
+        self.downstream.start()
+
+    def stop(self):
+        super().stop()
+        self.downstream.stop()
+        with self.lock:
+            self.gops.clear()
+            self.buffered_bytes = 0
@@ -0,0 +1,194 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import numpy as np
+
+"""
+Dropped-frame and jitter report for a recording directory (videos_<ts>/).
+Each video_NNN.pts file is loaded on its own, so memory stays bounded by
+the largest segment; flight-wide numbers are accumulated as they go.
+
+Usage: python pts_analysis.py videos_<ts>/ [--fps 120] [--json report.json]
+"""
+
+PTS_PATTERN = re.compile(r"video_(\d+)\.pts$")
+HIST_BIN_MS = 0.5   # frame-interval histogram resolution
+HIST_MAX_MS = 100.0  # intervals above this land in the last bin
+TOP_GAPS = 10
+
+
+def list_pts_files(directory):
+    """Return [(index, path)] sorted by segment index"""
+    found = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = PTS_PATTERN.search(entry.name)
+            if match:
+                found.append((int(match.group(1)), entry.path))
+    return sorted(found)
+
+
+def load_pts(path) -> np.ndarray:
+    """Timestamps in ms; skips the '# timecode format v2' header"""
+    try:
+        return np.loadtxt(path, comments="#", dtype=np.float64, ndmin=1)
+    except ValueError:
+        return np.empty(0)
+
+
+def dropped_frames(intervals, nominal_ms):
+    """Frames missing inside intervals that span more than one frame period"""
+    if nominal_ms <= 0 or not intervals.size:
+        return 0
+    missing = np.rint(intervals / nominal_ms) - 1
+    return int(missing[intervals > 1.5 * nominal_ms].sum())
+
+
+class FlightStats:
+
+    def __init__(self, fps=None):
+        self.fps = fps
+        self.bins = np.arange(0.0, HIST_MAX_MS + HIST_BIN_MS, HIST_BIN_MS)
+        self.histogram = np.zeros(len(self.bins) - 1, dtype=np.int64)
+        self.segments = []
+        self.largest_gaps = []  # min-heap of (gap_ms, segment, pts_ms)
+        self.boundary_gaps = []
+        self.frames = 0
+        self.dropped = 0
+        self.first_pts = None
+        self.last_pts = None
+        self.last_index = None
+        self.timebase_resets = 0
+
+    def add_segment(self, index, pts):
+        report = {"segment": index, "frames": int(pts.size)}
+        if pts.size:
+            if self.last_pts is not None:
+                gap = float(pts[0] - self.last_pts)
+                if gap < 0:
+                    # Segments recorded with a restarted encoder begin at 0 again
+                    self.timebase_resets += 1
+                    gap = None
+                self.boundary_gaps.append({"from_segment": self.last_index, "to_segment": index, "gap_ms": gap})
+            if self.first_pts is None:
+                self.first_pts = float(pts[0])
+            self.last_pts = float(pts[-1])
+            self.last_index = index
+        self.frames += int(pts.size)
+
+        if pts.size < 2:
+            self.segments.append(report)
+            return report
+
+        intervals = np.diff(pts)
+        nominal = 1000.0 / self.fps if self.fps else float(np.median(intervals))
+        duration = float(pts[-1] - pts[0])
+        dropped = dropped_frames(intervals, nominal)
+        self.dropped += dropped
+
+        clipped = np.minimum(intervals, HIST_MAX_MS - HIST_BIN_MS / 2)
+        self.histogram += np.histogram(clipped, bins=self.bins)[0]
+
+        k = min(TOP_GAPS, intervals.size)
+        top = np.argpartition(intervals, -k)[-k:]
+        for i in top:
+            item = (float(intervals[i]), index, float(pts[i]))
+            if len(self.largest_gaps) < TOP_GAPS:
+                heapq.heappush(self.largest_gaps, item)
+            else:
+                heapq.heappushpop(self.largest_gaps, item)
+
+        report.update({
+            "duration_s": duration / 1000.0,
+            "effective_fps": (pts.size - 1) / duration * 1000.0 if duration > 0 else None,
+            "nominal_interval_ms": nominal,
+            "mean_interval_ms": float(intervals.mean()),
+            "jitter_ms": float(intervals.std()),
+            "max_interval_ms": float(intervals.max()),
+            "dropped_frames": dropped,
+        })
+        self.segments.append(report)
+        return report
+
+    def summary(self):
+        duration = None
+        effective_fps = None
+        if self.first_pts is not None and not self.timebase_resets:
+            duration = (self.last_pts - self.first_pts) / 1000.0
+            if duration > 0:
+                effective_fps = (self.frames - 1) / duration
+        nonzero = np.nonzero(self.histogram)[0]
+        return {
+            "segments": len(self.segments),
+            "frames": self.frames,
+            "duration_s": duration,
+            "effective_fps": effective_fps,
+            "dropped_frames": self.dropped,
+            "timebase_resets": self.timebase_resets,
+            "largest_gaps": [
+                {"gap_ms": gap, "segment": seg, "at_pts_ms": at}
+                for gap, seg, at in sorted(self.largest_gaps, reverse=True)
+            ],
+            "boundary_gaps": self.boundary_gaps,
+            "interval_histogram": {
+                "bin_ms": HIST_BIN_MS,
+                "counts": {f"{self.bins[i]:.1f}": int(self.histogram[i]) for i in nonzero},
+            },
+            "per_segment": self.segments,
+        }
+
+
+def analyze_directory(directory, fps=None):
+    stats = FlightStats(fps)
+    for index, path in list_pts_files(directory):
+        stats.add_segment(index, load_pts(path))
+    return stats.summary()
+
+
+def format_summary(summary):
+    def num(value, fmt):
+        return "n/a" if value is None else format(value, fmt)
+
+    lines = [
+        f"Segments: {summary['segments']}  Frames: {summary['frames']}",
+        f"Duration: {num(summary['duration_s'], '.2f')} s  "
+        f"Effective fps: {num(summary['effective_fps'], '.2f')}",
+        f"Dropped frames: {summary['dropped_frames']}",
+    ]
+    if summary["timebase_resets"]:
+        lines.append(f"Timebase resets between segments: {summary['timebase_resets']}")
+    lines.append("Largest frame gaps:")
+    for gap in summary["largest_gaps"]:
+        lines.append(f"\t{gap['gap_ms']:8.3f} ms in segment {gap['segment']:03d} at {gap['at_pts_ms']:.3f} ms")
+    lines.append("Segment boundary gaps:")
+    for gap in summary["boundary_gaps"]:
+        lines.append(f"\t{gap['from_segment']:03d} -> {gap['to_segment']:03d}: {num(gap['gap_ms'], '.3f')} ms")
+    lines.append("Frame interval histogram (ms: count):")
+    for start, count in summary["interval_histogram"]["counts"].items():
+        lines.append(f"\t{start:>6}: {count}")
+    lines.append("Per segment:")
+    for seg in summary["per_segment"]:
+        lines.append(f"\t{seg['segment']:03d}: {seg['frames']} frames, "
+                     f"{num(seg.get('effective_fps'), '.2f')} fps, "
+                     f"jitter {num(seg.get('jitter_ms'), '.3f')} ms, "
+                     f"{seg.get('dropped_frames', 0)} dropped")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dropped-frame and jitter report from .pts files")
+    parser.add_argument("directory", help="recording directory, e.g. videos_20250712_102041/")
+    parser.add_argument("--fps", type=float, default=None, help="nominal fps (default: median interval per segment)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the machine-readable report here ('-' for stdout)")
+    args = parser.parse_args()
+
+    summary = analyze_directory(args.directory, args.fps)
+    if args.json_path == "-":
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_summary(summary))
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(summary, f, indent=2)
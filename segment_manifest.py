@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+
+"""
+Append-only manifest of a recording, one JSON object per line in
+<videos dir>/manifest.jsonl:
+    {"type": "idr", "segment": 3, "offset": 81234, "frame": 240, "pts_us": 98000000}
+        every keyframe: byte offset and frame number inside video_003.h264
+    {"type": "segment", "segment": 3, "first_pts_us": ..., "last_pts_us": ...,
+     "bytes": ..., "frames": ...}
+        written when the segment is closed
+    {"type": "event", "kind": "motion", "state": "start", "pts_us": ..., ...}
+        something detected at that PTS (state "start" / "end")
+Each line is flushed as it is written, so a power cut loses at most the
+line being written; a segment without its closing line is cut at its last
+keyframe by plan_clip.
+
+plan_clip maps a time range to the byte and frame ranges that cover it,
+starting on a keyframe, so a clip is a stream copy of only those bytes.
+"""
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class ManifestWriter:
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        # One manifest per recording: it describes the files the recorder is about to (re)write
+        self.file = open(self.path, "w")
+
+    def append(self, entry):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.file.flush()
+
+    def idr(self, segment, offset, frame, pts_us):
+        self.append({"type": "idr", "segment": segment, "offset": offset, "frame": frame, "pts_us": pts_us})
+
+    def segment_closed(self, segment, first_pts_us, last_pts_us, size, frames):
+        self.append({"type": "segment", "segment": segment, "first_pts_us": first_pts_us,
+                     "last_pts_us": last_pts_us, "bytes": size, "frames": frames})
+
+    def event(self, kind, state, pts_us, **extra):
+        self.append({"type": "event", "kind": kind, "state": state, "pts_us": pts_us, **extra})
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def load_manifest(directory):
+    """{segment: {"idrs": [(pts_us, offset, frame), ...], "closed": entry or None}}, events"""
+    segments = {}
+    events = []
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a power cut
+            kind = entry.get("type")
+            if kind == "idr":
+                segment = segments.setdefault(entry["segment"], {"idrs": [], "closed": None})
+                segment["idrs"].append((entry["pts_us"], entry["offset"], entry["frame"]))
+            elif kind == "segment":
+                segments.setdefault(entry["segment"], {"idrs": [], "closed": None})["closed"] = entry
+            else:
+                events.append(entry)
+    return segments, events
+
+
+def plan_clip(segments, start_us, end_us, frame_duration=None):
+    """Byte/frame ranges covering [start_us, end_us):
+    [{"segment", "start", "end", "first_frame", "end_frame", "first_pts_us"}, ...]"""
+    plan = []
+    for index in sorted(segments):
+        idrs = segments[index]["idrs"]
+        closed = segments[index]["closed"]
+        if not idrs:
+            continue
+        points = list(idrs)
+        if closed:
+            # The end of the segment acts as one more cut point
+            points.append((closed["last_pts_us"] + (frame_duration or 1), closed["bytes"], closed["frames"]))
+        if points[-1][0] <= start_us or idrs[0][0] >= end_us:
+            continue
+        first = 0
+        for i, point in enumerate(idrs):
+            if point[0] <= start_us:
+                first = i
+        last = len(points) - 1
+        for i in range(first + 1, len(points)):
+            if points[i][0] >= end_us:
+                last = i
+                break
+        if last <= first:
+            continue
+        plan.append({"segment": index, "start": points[first][1], "end": points[last][1],
+                     "first_frame": points[first][2], "end_frame": points[last][2],
+                     "first_pts_us": points[first][0]})
+    return plan
+
+
+def event_ranges(events, kind="motion"):
+    """[(start_us, end_us or None), ...] of the start/end events of one kind"""
+    ranges = []
+    for entry in events:
+        if entry.get("type") != "event" or entry.get("kind") != kind or entry.get("pts_us") is None:
+            continue
+        if entry.get("state") == "start":
+            ranges.append([entry["pts_us"], None])
+        elif entry.get("state") == "end" and ranges and ranges[-1][1] is None:
+            ranges[-1][1] = entry["pts_us"]
+    return [tuple(r) for r in ranges]
@@ -0,0 +1,157 @@
+import threading
+import time
+from camera_backend import Output
+
+"""
+Rotating H264 output: keeps the encoder running and switches to a new
+video_NNN.h264 / video_NNN.pts pair on the first keyframe after the
+current segment is full, so no frames are lost at segment boundaries.
+
+It can be stopped and started again around an encoder restart (profile
+switch): request_boundary() closes the segment at its natural end instead
+of rotating, and after the restart PTS continue from the last frame plus
+the time the encoder was down, so the timeline stays monotonic.
+"""
+class SegmentedOutput(Output):
+
+    def __init__(self, directory, segment_seconds=30, segment_frames=None, segment_bytes=None,
+                 on_segment=None, frame_duration=None, storage=None, manifest=None):
+        super().__init__()
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.segment_frames = segment_frames
+        self.segment_bytes = segment_bytes
+        self.on_segment = on_segment  # called with (index, h264 path) on every new segment
+        self.frame_duration = frame_duration  # expected us between frames, to count drops
+        self.storage = storage  # optional StorageManager: space checks, preallocation, fsync
+        self.manifest = manifest  # optional ManifestWriter: keyframe offsets and segment extents
+
+        self.lock = threading.Lock()
+        self.segment_index = -1
+        self.file = None
+        self.pts_file = None
+        self.segment_start = None
+        self.segment_last_timestamp = None
+        self.segment_frame_count = 0
+        self.segment_byte_count = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0  # not written because the storage policy stopped us
+        self.last_timestamp = None
+        self.timestamp_offset = 0  # added to encoder timestamps after a restart
+        self.stopped_at = None
+        self.boundary_requested = False
+        self.boundary = threading.Event()
+
+    def request_boundary(self):
+        """Close the current segment when it is full instead of rotating; returns an Event"""
+        with self.lock:
+            self.boundary.clear()
+            self.boundary_requested = True
+            if self.file is None:
+                self.boundary.set()
+        return self.boundary
+
+    def cancel_boundary(self):
+        """Back to normal rotation; a closed segment is followed by a new one on the next keyframe"""
+        with self.lock:
+            self.boundary_requested = False
+
+    def segment_path(self, index, ext):
+        return f"{self.directory}video_{index:03d}.{ext}"
+
+    def segment_full(self, timestamp):
+        if self.segment_frames and self.segment_frame_count >= self.segment_frames:
+            return True
+        if self.segment_bytes and self.segment_byte_count >= self.segment_bytes:
+            return True
+        if self.segment_seconds and timestamp is not None and self.segment_start is not None:
+            return timestamp - self.segment_start >= self.segment_seconds * 1_000_000
+        return False
+
+    def close_segment(self):
+        if self.file:
+            if self.manifest:
+                self.manifest.segment_closed(self.segment_index, self.segment_start, self.segment_last_timestamp,
+                                             self.segment_byte_count, self.segment_frame_count)
+            if self.storage:
+                self.storage.close_segment(self.file)
+            else:
+                self.file.close()
+            self.pts_file.close()
+            self.file = None
+            self.pts_file = None
+
+    def open_segment(self, timestamp):
+        self.close_segment()
+        if self.storage and not self.storage.prepare_segment(self.segment_index + 1):
+            return
+        self.segment_index += 1
+        path = self.segment_path(self.segment_index, "h264")
+        print(f"Recording segment: {path}")
+        self.file = self.storage.open_segment(path) if self.storage else open(path, "wb")
+        self.pts_file = open(self.segment_path(self.segment_index, "pts"), "w")
+        self.pts_file.write("# timecode format v2\n")
+        self.segment_start = timestamp
+        self.segment_last_timestamp = timestamp
+        self.segment_frame_count = 0
+        self.segment_byte_count = 0
+        if self.on_segment:
+            self.on_segment(self.segment_index, path)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio or not self.recording:
+            return
+        with self.lock:
+            if timestamp is not None:
+                if self.stopped_at is not None and self.last_timestamp is not None:
+                    # First frame of a restarted encoder, whose timestamps start again at 0
+                    down_us = int((time.monotonic() - self.stopped_at) * 1_000_000)
+                    self.timestamp_offset = self.last_timestamp + down_us - timestamp
+                    self.last_timestamp = None  # the restart gap is not a drop
+                self.stopped_at = None
+                timestamp += self.timestamp_offset
+            # Only rotate on a keyframe so every segment starts decodable
+            if self.boundary_requested:
+                if self.file is not None and keyframe and self.segment_full(timestamp):
+                    self.close_segment()
+                    self.boundary.set()
+            elif self.file is None and (keyframe or self.segment_index < 0):
+                self.open_segment(timestamp)
+            elif keyframe and self.segment_full(timestamp):
+                self.open_segment(timestamp)
+            if self.file is None:
+                self.frames_skipped += 1
+                return
+            if keyframe and self.manifest and timestamp is not None:
+                self.manifest.idr(self.segment_index, self.segment_byte_count,
+                                  self.segment_frame_count, timestamp)
+            if self.storage:
+                self.storage.write(self.file, frame)
+            else:
+                self.file.write(frame)
+            if timestamp is not None:
+                # Encoder timestamps are in us and run continuously across segments
+                self.pts_file.write(f"{timestamp // 1000}.{timestamp % 1000:03}\n")
+                if self.frame_duration and self.last_timestamp is not None:
+                    gap = timestamp - self.last_timestamp
+                    if gap > 1.5 * self.frame_duration:
+                        self.frames_dropped += round(gap / self.frame_duration) - 1
+                self.last_timestamp = timestamp
+                self.segment_last_timestamp = timestamp
+            self.segment_frame_count += 1
+            self.segment_byte_count += len(frame)
+            self.frames_written += 1
+            self.bytes_written += len(frame)
+
+    def start(self):
+        super().start()
+        with self.lock:
+            self.boundary_requested = False
+
+    def stop(self):
+        super().stop()
+        with self.lock:
+            self.close_segment()
+            self.stopped_at = time.monotonic()
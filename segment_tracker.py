@@ -0,0 +1,100 @@
+import os
+import re
+import threading
+import time
+
+"""
+Keeps track of the segment being recorded at constant cost per update.
+The recorder calls segment_started() on every rotation; without it the
+tracker falls back to probing for the next video_NNN.h264 name, so only
+the newest file is ever stat'ed.
+"""
+
+SEGMENT_PATTERN = re.compile(r"video_(\d+)\.h264$")
+
+
+class SegmentTracker:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.notified = False
+        self.current_index = -1
+        self.current_path = None
+        self.completed_bytes = 0  # size of all closed segments
+
+        # Counters read by the monitor
+        self.video_counter = 0
+        self.current_video_size = 0
+        self.bytes_written = 0
+        self.bytes_per_second = 0.0
+        self.last_update = None
+
+    def segment_path(self, index):
+        return f"{self.directory}video_{index:03d}.h264"
+
+    def segment_started(self, index, path):
+        """Recorder callback, called from the encoder thread"""
+        with self.lock:
+            self.notified = True
+            self.advance(index, path)
+
+    def advance(self, index, path):
+        if self.current_path:
+            try:
+                self.completed_bytes += os.path.getsize(self.current_path)
+            except OSError:
+                pass
+        self.current_index = index
+        self.current_path = path
+        self.video_counter = index + 1
+
+    def initial_scan(self):
+        """One full directory scan, only until the first segment is found"""
+        newest = -1
+        completed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = SEGMENT_PATTERN.search(entry.name)
+                if match:
+                    index = int(match.group(1))
+                    completed += entry.stat().st_size
+                    newest = max(newest, index)
+        if newest >= 0:
+            path = self.segment_path(newest)
+            self.completed_bytes = completed - os.path.getsize(path)
+            self.current_index = newest
+            self.current_path = path
+            self.video_counter = newest + 1
+
+    def poll_directory(self):
+        if self.current_index < 0:
+            self.initial_scan()
+            return
+        while os.path.exists(self.segment_path(self.current_index + 1)):
+            self.advance(self.current_index + 1, self.segment_path(self.current_index + 1))
+
+    def update(self, current_size=None):
+        """Refresh counters; returns False while no segment exists yet.
+        current_size comes from the recorder when it knows it: preallocated
+        segment files report their reserved size, not what was written."""
+        with self.lock:
+            if not self.notified:
+                self.poll_directory()
+            if self.current_path is None:
+                return False
+            if current_size is not None:
+                self.current_video_size = current_size
+            else:
+                try:
+                    self.current_video_size = os.path.getsize(self.current_path)
+                except OSError:
+                    self.current_video_size = 0
+
+            now = time.monotonic()
+            total = self.completed_bytes + self.current_video_size
+            if self.last_update is not None and now > self.last_update:
+                self.bytes_per_second = (total - self.bytes_written) / (now - self.last_update)
+            self.bytes_written = total
+            self.last_update = now
+            return True
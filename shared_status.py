@@ -0,0 +1,150 @@
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+"""
+Fixed-layout status block shared by the supervisor and its child
+processes (capture, link, monitor) in one multiprocessing SharedMemory.
+
+Each region has exactly one writer process and starts with a sequence
+counter (seqlock): the writer makes it odd, packs the fields, then makes
+it even again; a reader retries until it sees the same even value before
+and after unpacking. No lock is shared between processes, so a child
+killed in the middle of a write cannot block anyone: its replacement
+rounds the counter up and carries on.
+
+Every write also stamps the writer's pid and a CLOCK_MONOTONIC heartbeat,
+which the supervisor uses to spot a hung child.
+"""
+
+BLOCK_NAME = "gtxr_status"
+READ_RETRIES = 100
+
+REGIONS = {
+    "capture": (
+        ("heartbeat", "d"), ("pid", "I"), ("recording", "B"), ("storage_full", "B"),
+        ("profile", "B"), ("phase", "B"), ("segment_index", "i"), ("segment_bytes", "Q"),
+        ("frames_written", "Q"), ("bytes_written", "Q"), ("frames_dropped", "I"),
+        ("sensor_drops", "I"), ("interval_p99_us", "I"), ("latency_p99_us", "I"),
+        ("profile_switches", "I"), ("last_latency_us", "I"), ("commands", "I"),
+        ("queue_bytes", "I"), ("queue_high_water", "I"), ("backpressure", "I"),
+        ("video_path", "64s"),
+    ),
+    "monitor": (
+        ("heartbeat", "d"), ("pid", "I"), ("free_disk", "Q"), ("write_rate", "d"),
+        ("cpu_temp", "f"), ("records", "I"),
+    ),
+    "link": (
+        ("heartbeat", "d"), ("pid", "I"), ("connected", "B"), ("packets", "I"),
+        ("forwarded", "I"), ("telemetry_requests", "I"),
+    ),
+    "supervisor": (
+        ("heartbeat", "d"), ("pid", "I"), ("capture_restarts", "I"),
+        ("link_restarts", "I"), ("monitor_restarts", "I"),
+    ),
+}
+SEQUENCE = struct.Struct("<I")
+
+
+class Region:
+
+    def __init__(self, name, fields, offset):
+        self.name = name
+        self.names = tuple(field for field, _ in fields)
+        # seq, 4 bytes of padding, then the fields; regions are 8-byte aligned
+        self.struct = struct.Struct("<I4x" + "".join(fmt for _, fmt in fields))
+        self.offset = offset
+        self.size = (self.struct.size + 7) // 8 * 8
+
+
+def layout():
+    regions = {}
+    offset = 0
+    for name, fields in REGIONS.items():
+        regions[name] = Region(name, fields, offset)
+        offset += regions[name].size
+    return regions, offset
+
+
+class SharedStatus:
+
+    def __init__(self, name=BLOCK_NAME, create=False):
+        self.regions, size = layout()
+        if create:
+            try:
+                # Left over from a supervisor that was killed
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if sys.version_info < (3, 13):
+                # Only the creator may unlink the block when it exits
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.created = create
+        self.values = {}  # last values written by this process, per region
+
+    def write(self, region_name, **fields):
+        """Update some fields of a region this process owns"""
+        region = self.regions[region_name]
+        values = self.values.get(region_name)
+        if values is None:
+            values = self.read(region_name)
+            self.values[region_name] = values
+        values.update(fields)
+        values["heartbeat"] = time.monotonic()
+        values["pid"] = os.getpid()
+        buf = self.shm.buf
+        seq = SEQUENCE.unpack_from(buf, region.offset)[0]
+        seq += seq & 1  # a previous writer died mid-write
+        SEQUENCE.pack_into(buf, region.offset, (seq + 1) & 0xFFFFFFFF)
+        region.struct.pack_into(buf, region.offset, (seq + 1) & 0xFFFFFFFF,
+                                *(values[name] for name in region.names))
+        SEQUENCE.pack_into(buf, region.offset, (seq + 2) & 0xFFFFFFFF)
+
+    def read(self, region_name):
+        region = self.regions[region_name]
+        buf = self.shm.buf
+        for _ in range(READ_RETRIES):
+            before = SEQUENCE.unpack_from(buf, region.offset)[0]
+            unpacked = region.struct.unpack_from(buf, region.offset)
+            if not before & 1 and SEQUENCE.unpack_from(buf, region.offset)[0] == before:
+                break
+        # After READ_RETRIES the last unpack is returned as is: better than stalling
+        return dict(zip(region.names, unpacked[1:]))
+
+    def age(self, region_name):
+        """Seconds since the region's last write (inf if never written)"""
+        heartbeat = self.read(region_name)["heartbeat"]
+        return time.monotonic() - heartbeat if heartbeat else float("inf")
+
+    def close(self):
+        self.shm.close()
+        if self.created:
+            self.shm.unlink()
+
+
+def text(value):
+    """Decode a fixed-size string field"""
+    return value.rstrip(b"\0").decode(errors="replace")
+
+
+if __name__ == "__main__":
+    # Dump the running supervisor's block
+    status = SharedStatus()
+    for name in REGIONS:
+        values = status.read(name)
+        age = status.age(name)
+        print(f"[{name}] updated {age:.1f} s ago")
+        for field, value in values.items():
+            if isinstance(value, bytes):
+                value = text(value)
+            print(f"    {field}: {value}")
+    status.close()
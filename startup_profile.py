@@ -0,0 +1,105 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+"""
+Startup profile written on every boot. Phases are marked as they complete
+(import, init_camera, configure, first_frame), measured from process start;
+since_boot is how long the kernel had been up when the process started, so
+after a brownout the whole outage can be read off one line. Each boot
+appends one JSON line to PROFILE_LOG.
+"""
+
+PROFILE_LOG = "logs/startup_profile.jsonl"
+
+
+def seconds_since_boot():
+    try:
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+    except (AttributeError, OSError):
+        return None
+
+
+def last_recording_end(exclude=None):
+    """mtime of the newest file of the previous recording, or None"""
+    dirs = sorted(d for d in glob.glob("videos_*") if os.path.isdir(d)
+                  and os.path.normpath(d) != os.path.normpath(exclude or ""))
+    if not dirs:
+        return None
+    latest = None
+    with os.scandir(dirs[-1]) as entries:
+        for entry in entries:
+            if entry.is_file():
+                mtime = entry.stat().st_mtime
+                latest = mtime if latest is None else max(latest, mtime)
+    return latest
+
+
+class StartupProfile:
+
+    def __init__(self, path=PROFILE_LOG):
+        self.path = path
+        self.started = time.monotonic()
+        self.since_boot = seconds_since_boot()
+        self.marks = {}
+        self.lock = threading.Lock()
+        self.recorded = False
+
+    def mark(self, name):
+        """Seconds since process start; only the first mark of a phase counts"""
+        with self.lock:
+            if name not in self.marks:
+                self.marks[name] = time.monotonic() - self.started
+            return self.marks[name]
+
+    def phases(self):
+        """Duration of every phase, in the order they were marked"""
+        previous = 0.0
+        phases = {}
+        for name, at in self.marks.items():
+            phases[name] = at - previous
+            previous = at
+        return phases
+
+    def record(self, **extra):
+        with self.lock:
+            if self.recorded:
+                return
+            self.recorded = True
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "since_boot": self.since_boot,
+            "marks": self.marks,
+            "phases": self.phases(),
+        }
+        entry.update(extra)
+        print("Startup profile: " + ", ".join(f"{name} {seconds * 1e3:.0f} ms"
+                                              for name, seconds in entry["phases"].items()))
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Could not write startup profile: {e}")
+        return entry
+
+
+if __name__ == "__main__":
+    # Summary of the recorded boots
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise startup profiles")
+    parser.add_argument("path", nargs="?", default=PROFILE_LOG)
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        boots = [json.loads(line) for line in f if line.strip()]
+    for boot in boots:
+        first = boot["marks"].get("first_frame")
+        gap = boot.get("footage_gap")
+        print(f"{boot['timestamp']}: first frame {first if first is None else f'{first:.2f}'} s "
+              f"after start, {boot['since_boot'] or 0:.1f} s after kernel boot"
+              + (f", {gap:.1f} s of footage lost" if gap is not None else ""))
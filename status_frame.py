@@ -0,0 +1,82 @@
+import struct
+import threading
+import time
+from gt_packet_rasp_pi import GT_HEADER_1, GT_HEADER_2, crc16_ccitt_false
+
+"""
+Pre-assembled response to TELEMETRY_OPCODE (0x04).
+Counters are packed into a ready GT frame as they change, so answering a
+request only patches uptime/latency and recomputes the CRC.
+
+Payload (big endian):
+    opcode u8, flags u8, segment index u32, bytes written u64,
+    free disk u64, frames dropped u32, uptime ms u32, last tc latency us u32,
+    sensor frames dropped u32, p99 frame interval us u32, p99 sensor to encoder latency us u32,
+    recording profile u8, flight phase u8, profile switches u16
+
+flags: bit 0 recording, bit 1 storage full
+"""
+
+STATUS = struct.Struct(">BBIQQIIIIIIBBH")
+FLAG_RECORDING = 0x01
+FLAG_STORAGE_FULL = 0x02
+FIELDS = ("opcode", "flags", "segment_index", "bytes_written", "free_disk",
+          "frames_dropped", "uptime_ms", "last_latency_us", "sensor_drops", "interval_p99_us",
+          "latency_p99_us", "profile", "phase", "profile_switches")
+PAYLOAD_OFFSET = 3  # header 1, header 2, length
+UPTIME_OFFSET = PAYLOAD_OFFSET + struct.calcsize(">BBIQQI")
+
+
+class StatusFrame:
+
+    def __init__(self, opcode=0x04):
+        self.opcode = opcode
+        self.start_time = time.monotonic()
+        self.lock = threading.Lock()
+        self.frame = bytearray(PAYLOAD_OFFSET + STATUS.size + 2)
+        self.frame[0] = GT_HEADER_1
+        self.frame[1] = GT_HEADER_2
+        self.frame[2] = STATUS.size
+        self.recording = False
+        self.storage_full = False
+        self.segment_index = 0
+        self.bytes_written = 0
+        self.free_disk = 0
+        self.frames_dropped = 0
+        self.sensor_drops = 0
+        self.interval_p99_us = 0
+        self.latency_p99_us = 0
+        self.profile = 0
+        self.phase = 0
+        self.profile_switches = 0
+        self.pack()
+
+    def pack(self):
+        flags = (FLAG_RECORDING if self.recording else 0) | (FLAG_STORAGE_FULL if self.storage_full else 0)
+        STATUS.pack_into(self.frame, PAYLOAD_OFFSET, self.opcode, flags,
+                         self.segment_index, self.bytes_written, self.free_disk,
+                         self.frames_dropped, 0, 0, self.sensor_drops,
+                         min(self.interval_p99_us, 0xFFFFFFFF), min(self.latency_p99_us, 0xFFFFFFFF),
+                         self.profile, self.phase, min(self.profile_switches, 0xFFFF))
+
+    def update(self, **counters):
+        """Called by the monitor / state changes, never at request time"""
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, value)
+            self.pack()
+
+    def packet(self, last_latency=0.0) -> bytes:
+        """Complete GT frame with the current uptime and the given latency (s)"""
+        uptime_ms = int((time.monotonic() - self.start_time) * 1000) & 0xFFFFFFFF
+        latency_us = min(int(last_latency * 1e6), 0xFFFFFFFF)
+        with self.lock:
+            struct.pack_into(">II", self.frame, UPTIME_OFFSET, uptime_ms, latency_us)
+            end = PAYLOAD_OFFSET + STATUS.size
+            crc = crc16_ccitt_false(self.frame[PAYLOAD_OFFSET:end])
+            struct.pack_into(">H", self.frame, end, crc)
+            return bytes(self.frame)
+
+
+def parse_status(payload: bytes) -> dict:
+    return dict(zip(FIELDS, STATUS.unpack(payload)))
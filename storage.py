@@ -0,0 +1,175 @@
+import ctypes
+import ctypes.util
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+
+"""
+Storage manager for the recording path.
+Before each segment it checks the free space against the expected segment
+size (from the recent bitrate), applies the retention policy and
+preallocates the file with fallocate(FALLOC_FL_KEEP_SIZE): the blocks are
+reserved but st_size stays the number of bytes written, so size readers
+and a file left behind by a power cut see no zero-filled tail. During the
+segment frames are coalesced into write_block sized writes, each one
+timed, and fsynced on a configurable cadence.
+
+Retention policies:
+    stop           stop writing and raise storage_full (telemetry flag)
+    delete_oldest  delete the oldest segments of this recording until it fits
+"""
+
+MIN_FREE_BYTES = 200 * 1024 * 1024  # keep some room for logs and photos
+DEFAULT_SEGMENT_BYTES = 32 * 1024 * 1024
+LATENCY_SAMPLES = 4096
+WRITE_BLOCK = 256 * 1024  # SD cards prefer large, erase-block friendly writes
+SEGMENT_FILE = re.compile(r"video_(\d+)\.(h264|pts)$")
+FALLOC_FL_KEEP_SIZE = 0x01
+
+
+def load_fallocate():
+    """libc fallocate(fd, mode, offset, len) with 64-bit offsets, or None (not Linux)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fallocate = getattr(libc, "fallocate64", None) or libc.fallocate
+    except (OSError, AttributeError):
+        return None
+    fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    fallocate.restype = ctypes.c_int
+    return fallocate
+
+
+fallocate = load_fallocate()
+
+
+class StorageManager:
+
+    def __init__(self, directory, policy="stop", min_free_bytes=MIN_FREE_BYTES,
+                 fsync_bytes=8 * 1024 * 1024, fsync_seconds=None, preallocate=True,
+                 write_block=WRITE_BLOCK):
+        if policy not in ("stop", "delete_oldest"):
+            raise ValueError(f"Unknown retention policy: {policy}")
+        self.directory = directory
+        self.policy = policy
+        self.min_free_bytes = min_free_bytes
+        self.fsync_bytes = fsync_bytes
+        self.fsync_seconds = fsync_seconds
+        self.preallocate = preallocate
+        self.write_block = write_block
+        self.pending = bytearray()  # frames not yet written, less than one block
+        self.preallocated = 0  # bytes reserved for the current segment
+
+        self.lock = threading.Lock()
+        self.storage_full = False
+        self.expected_segment_bytes = DEFAULT_SEGMENT_BYTES
+        self.deleted_segments = 0
+        self.unsynced_bytes = 0
+        self.last_sync = time.monotonic()
+        # Write latencies in seconds, ring of the most recent samples
+        self.latencies = array("d", bytes(8 * LATENCY_SAMPLES))
+        self.latency_count = 0
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.directory).free
+
+    def oldest_segments(self):
+        indexes = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = SEGMENT_FILE.search(entry.name)
+                if match:
+                    indexes.add(int(match.group(1)))
+        return sorted(indexes)
+
+    def make_room(self, needed, keep_index):
+        for index in self.oldest_segments():
+            if index >= keep_index or self.free_bytes() >= needed:
+                break
+            for ext in ("h264", "pts"):
+                path = f"{self.directory}video_{index:03d}.{ext}"
+                if os.path.exists(path):
+                    os.remove(path)
+            self.deleted_segments += 1
+            print(f"Storage: deleted segment {index:03d} to free space")
+
+    def prepare_segment(self, index):
+        """Returns False when the policy says recording has to stop"""
+        needed = self.expected_segment_bytes + self.min_free_bytes
+        if self.free_bytes() < needed and self.policy == "delete_oldest":
+            self.make_room(needed, index)
+        if self.free_bytes() < needed:
+            if not self.storage_full:
+                print(f"Storage full: {self.free_bytes()} bytes free, segment {index:03d} not started")
+            self.storage_full = True
+            return False
+        self.storage_full = False
+        return True
+
+    def open_segment(self, path):
+        # Unbuffered: write() below already hands the OS whole blocks
+        f = open(path, "wb", buffering=0)
+        self.pending = bytearray()
+        self.preallocated = 0
+        # Not supported (e.g. FAT, not Linux): the file grows as usual
+        if self.preallocate and fallocate is not None:
+            if fallocate(f.fileno(), FALLOC_FL_KEEP_SIZE, 0, self.expected_segment_bytes) == 0:
+                self.preallocated = self.expected_segment_bytes
+        return f
+
+    def close_segment(self, f):
+        if self.pending:
+            self.write_out(f, bytes(self.pending))
+            self.pending.clear()
+        size = f.tell()
+        if self.preallocated:
+            f.truncate(size)  # same size: frees the unused reservation past the end
+        self.preallocated = 0
+        os.fsync(f.fileno())
+        f.close()
+        self.unsynced_bytes = 0
+        self.last_sync = time.monotonic()
+        # Next segment sized after this one, with some headroom
+        if size:
+            self.expected_segment_bytes = int(size * 1.25)
+        print(f"Storage: write latency {self.format_percentiles()}")
+
+    def write(self, f, data):
+        """Coalesces frames and writes whole multiples of write_block"""
+        self.pending += data
+        if len(self.pending) >= self.write_block:
+            n = len(self.pending) - len(self.pending) % self.write_block
+            self.write_out(f, bytes(self.pending[:n]))
+            del self.pending[:n]
+
+    def write_out(self, f, data):
+        start = time.perf_counter()
+        view = memoryview(data)
+        while view:
+            view = view[f.write(view):]
+        self.unsynced_bytes += len(data)
+        now = time.monotonic()
+        if ((self.fsync_bytes and self.unsynced_bytes >= self.fsync_bytes)
+                or (self.fsync_seconds and now - self.last_sync >= self.fsync_seconds)):
+            os.fsync(f.fileno())
+            self.unsynced_bytes = 0
+            self.last_sync = now
+        with self.lock:
+            self.latencies[self.latency_count % LATENCY_SAMPLES] = time.perf_counter() - start
+            self.latency_count += 1
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        with self.lock:
+            count = min(self.latency_count, LATENCY_SAMPLES)
+            samples = sorted(self.latencies[:count])
+        if not samples:
+            return {}
+        result = {f"p{p}": samples[min(count - 1, int(p / 100 * count))] for p in percentiles}
+        result["max"] = samples[-1]
+        return result
+
+    def format_percentiles(self):
+        stats = self.latency_percentiles()
+        return " ".join(f"{name}={value * 1e3:.2f}ms" for name, value in stats.items()) or "no samples"
@@ -0,0 +1,263 @@
+import multiprocessing
+import os
+import shutil
+import signal
+import struct
+import time
+from datetime import datetime
+from gt_link import GTLink, TELEMETRY_OPCODE
+from shared_status import SharedStatus, text
+from status_frame import StatusFrame
+from telemetry_log import TelemetryLog, read_cpu_temperature
+
+"""
+Runs the camera payload as three supervised processes instead of threads
+in one interpreter:
+    capture  camera, recorder and telecommand handlers (capture_process.py)
+    link     serial port: GT parsing, PING, TELEMETRY answers, downlinks
+    monitor  free disk, write rate and the binary telemetry log
+The pure-Python parser and CRC loops of the link no longer hold the GIL
+the camera callbacks need, and a crash only takes down its own process:
+the supervisor restarts that child alone, with a backoff if it keeps
+failing, and also restarts a child whose heartbeat stops.
+
+Status is shared through the fixed-layout block of shared_status.py;
+commands go from the link to the capture process through a pipe, one
+message per command: received_at (f64, CLOCK_MONOTONIC, the same clock in
+every process) followed by the GT payload, so the dispatcher still
+measures the latency from the serial port.
+
+Usage: python supervisor.py [--port /dev/ttyGS0]
+       python shared_status.py   (dump the live status block)
+"""
+
+COMMAND = struct.Struct("<d")
+SUPERVISE_PERIOD = 0.5  # s between child checks
+PUBLISH_PERIOD = 0.5  # s, link heartbeat
+MONITOR_PERIOD = 3  # s, like task_manager's monitor
+HEARTBEAT_TIMEOUT = {"capture": 15.0, "link": 10.0, "monitor": 15.0}
+STARTUP_GRACE = 30.0  # s after a (re)start before a missing heartbeat counts
+BACKOFF_MIN = 0.5  # s before restarting a child, doubled while it keeps failing
+BACKOFF_MAX = 30.0
+STABLE_SECONDS = 60.0  # a child up this long is healthy again: backoff reset
+
+
+def send_command(conn, payload, received_at=None):
+    conn.send_bytes(COMMAND.pack(received_at or time.monotonic()) + payload)
+
+
+def recv_command(conn, timeout):
+    """(received_at, payload) from the command pipe, or None after timeout"""
+    if not conn.poll(timeout):
+        return None
+    data = conn.recv_bytes()
+    return COMMAND.unpack_from(data)[0], data[COMMAND.size:]
+
+
+def log(msg):
+    print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: {msg}", flush=True)
+
+
+class LinkProcess:
+    """gt_link.GTLink whose telemetry comes from the shared status block and
+    whose telecommands go down the command pipe"""
+
+    def __init__(self, shared, commands, ports=None, start_time=None):
+        self.shared = shared
+        self.commands = commands
+        self.status = StatusFrame(TELEMETRY_OPCODE)
+        if start_time is not None:
+            self.status.start_time = start_time  # uptime survives link restarts
+        self.link = GTLink(self.forward, self.telemetry_packet, ports, log=log)
+
+    # Listener thread
+    def forward(self, received_at, payload):
+        send_command(self.commands, payload, received_at)
+
+    def telemetry_packet(self):
+        capture = self.shared.read("capture")
+        monitor = self.shared.read("monitor")
+        self.status.update(
+            recording=bool(capture["recording"]),
+            storage_full=bool(capture["storage_full"]),
+            segment_index=max(0, capture["segment_index"]),
+            bytes_written=capture["bytes_written"],
+            free_disk=monitor["free_disk"],
+            frames_dropped=capture["frames_dropped"],
+            sensor_drops=capture["sensor_drops"],
+            interval_p99_us=capture["interval_p99_us"],
+            latency_p99_us=capture["latency_p99_us"],
+            profile=capture["profile"],
+            phase=capture["phase"],
+            profile_switches=capture["profile_switches"],
+        )
+        return self.status.packet(capture["last_latency_us"] / 1e6)
+
+    # Main thread
+    def publish(self):
+        link = self.link
+        self.shared.write("link", connected=link.gt_port is not None, packets=link.packets,
+                          forwarded=link.forwarded, telemetry_requests=link.telemetry_requests)
+
+    def run(self):
+        self.link.run(PUBLISH_PERIOD, self.publish)
+
+
+def run_link(shared, commands, ports, start_time):
+    LinkProcess(shared, commands, ports, start_time).run()
+
+
+def run_monitor(shared):
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    telemetry = TelemetryLog(f"logs/{ts}-telemetry.bin")
+    records = 0
+    last = None  # (time, bytes written)
+    while True:
+        try:
+            capture = shared.read("capture")
+            now = time.monotonic()
+            written = capture["bytes_written"]
+            rate = 0.0
+            if last is not None and now > last[0] and written >= last[1]:
+                rate = (written - last[1]) / (now - last[0])
+            last = (now, written)
+            path = text(capture["video_path"]) or "."
+            free = shutil.disk_usage(path if os.path.isdir(path) else ".").free
+            temperature = read_cpu_temperature()
+            if capture["heartbeat"]:
+                telemetry.append(capture["segment_index"] + 1, capture["segment_bytes"],
+                                 capture["recording"], rate, cpu_temp=temperature,
+                                 queue_bytes=capture["queue_bytes"],
+                                 queue_high_water=capture["queue_high_water"],
+                                 backpressure=capture["backpressure"],
+                                 sensor_drops=capture["sensor_drops"],
+                                 interval_p99_us=capture["interval_p99_us"],
+                                 latency_p99_us=capture["latency_p99_us"],
+                                 profile=capture["profile"], phase=capture["phase"],
+                                 profile_switches=capture["profile_switches"])
+                records += 1
+            shared.write("monitor", free_disk=free, write_rate=rate, cpu_temp=temperature, records=records)
+        except Exception as e:
+            print("Error in monitor process")
+            print(e)
+        time.sleep(MONITOR_PERIOD)
+
+
+def run_capture(shared, commands):
+    # The camera stack is only ever imported here, never in the supervisor
+    from capture_process import run_capture as capture
+    capture(shared, commands)
+
+
+def run_child(target, args):
+    # Ctrl-C reaches the whole process group: only the supervisor reacts,
+    # and stops the children in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(*args)
+
+
+class Child:
+
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = BACKOFF_MIN
+        self.restart_at = None  # pending restart time after a failure
+
+
+class Supervisor:
+
+    def __init__(self, ports=None):
+        # fork: children inherit the status block and the pipe ends, and a
+        # restart costs no interpreter start-up
+        self.context = multiprocessing.get_context("fork")
+        self.shared = SharedStatus(create=True)
+        self.start_time = time.monotonic()
+        receive, send = self.context.Pipe(duplex=False)
+        self.children = {
+            "capture": Child("capture", run_capture, (self.shared, receive)),
+            "link": Child("link", run_link, (self.shared, send, ports, self.start_time)),
+            "monitor": Child("monitor", run_monitor, (self.shared,)),
+        }
+        self.stopping = False
+
+    def start_child(self, child):
+        child.process = self.context.Process(target=run_child, args=(child.target, child.args), name=child.name)
+        child.process.start()
+        child.started_at = time.monotonic()
+        child.restart_at = None
+        log(f"Started {child.name} (pid {child.process.pid})")
+
+    def stop_child(self, child, timeout=5.0):
+        process = child.process
+        if process is None or not process.is_alive():
+            return
+        process.terminate()  # SIGTERM: the capture child closes its segment
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def check(self, child):
+        now = time.monotonic()
+        if child.restart_at is not None:
+            if now >= child.restart_at:
+                self.start_child(child)
+            return
+        process = child.process
+        reason = None
+        if not process.is_alive():
+            reason = f"exited with code {process.exitcode}"
+        elif now - child.started_at > STARTUP_GRACE:
+            heartbeat = self.shared.read(child.name)["heartbeat"]
+            if heartbeat < child.started_at or now - heartbeat > HEARTBEAT_TIMEOUT[child.name]:
+                reason = "heartbeat lost"
+                self.stop_child(child)
+        if reason is None:
+            if now - child.started_at > STABLE_SECONDS:
+                child.backoff = BACKOFF_MIN
+            return
+        child.restarts += 1
+        log(f"{child.name} {reason}, restarting in {child.backoff:.1f} s (restart {child.restarts})")
+        child.restart_at = now + child.backoff
+        child.backoff = min(child.backoff * 2, BACKOFF_MAX)
+        self.shared.write("supervisor", **{f"{c.name}_restarts": c.restarts for c in self.children.values()})
+
+    def shutdown(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.shutdown)
+        for child in self.children.values():
+            self.start_child(child)
+        try:
+            while not self.stopping:
+                time.sleep(SUPERVISE_PERIOD)
+                for child in self.children.values():
+                    self.check(child)
+                self.shared.write("supervisor")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            log("Stopping children")
+            # Capture first, so the recording is closed while the disk is still watched
+            for name in ("capture", "link", "monitor"):
+                self.stop_child(self.children[name])
+            self.shared.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run capture, link and monitor as supervised processes")
+    parser.add_argument("--port", action="append", help="serial port(s) to probe instead of the default list")
+    args = parser.parse_args()
+
+    for directory in ("logs/", "photos/"):
+        os.makedirs(directory, exist_ok=True)
+    log("Supervisor starting")
+    Supervisor(ports=args.port).run()
@@ -0,0 +1,556 @@
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+from segment_manifest import MANIFEST_NAME, load_manifest
+
+"""
+Resumable, parallel, checksummed download of recording sessions over
+Wi-Fi, replacing scp -r.
+
+Pi side (serve): a small HTTP server over the recordings root, bound to
+the Pi's loopback only: it has no authentication, so the ground reaches
+it through an ssh tunnel (ssh -L 8765:localhost:8765).
+    GET /sessions              session directories (videos_*)
+    GET /manifest/<session>    every file with size, crc32 and whether it
+                               is complete (a segment still being recorded
+                               is not: it has no closing line in the
+                               segment manifest)
+    GET /files/<session>/<path> file contents, honouring Range: bytes=N-
+                               (sent with sendfile, no copy through Python)
+crc32s are cached per session in .sync_crc.json and only recomputed for
+files whose size or mtime changed, so a session is hashed once.
+
+Ground side (pull): compares the remote manifest with the local copy
+(same cache), fetches only missing or changed files over --workers
+parallel connections, continues an interrupted file from the end of its
+.part, retries dropped connections from where they stopped, and renames a
+file into place only once its crc32 matches.
+
+Usage: python sync_recordings.py serve [--root .] [--port 8765] [--host 127.0.0.1] [--idle-timeout 600]
+       python sync_recordings.py list http://localhost:8765   (through the tunnel)
+       python sync_recordings.py pull http://localhost:8765 videos_<ts> [dest] [--workers 4] [--include-open]
+       python sync_recordings.py demo   (loopback server, dropped connections, resume, re-sync)
+"""
+
+PORT = 8765
+HOST = "127.0.0.1"  # no authentication: reach it through ssh -L, never expose it
+CACHE_NAME = ".sync_crc.json"
+BLOCK_SIZE = 1024 * 1024
+WORKERS = 4
+RETRIES = 5  # per file, each one resumes where the previous attempt stopped
+RETRY_DELAY = 0.5  # s, doubled after each failed attempt
+TIMEOUT = 30  # s, socket timeout of the client connections
+
+
+class CrcCache:
+    """crc32 per file, recomputed only when its size or mtime change"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CACHE_NAME)
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def crc(self, name, path):
+        stat = os.stat(path)
+        key = [stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry and entry[:2] == key:
+                return entry[2]
+        crc = file_crc32(path)
+        with self.lock:
+            self.entries[name] = key + [crc]
+            self.dirty = True
+        return crc
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+
+def file_crc32(path):
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+
+def session_files(directory):
+    """Relative paths of every file of a session, sync bookkeeping excluded"""
+    names = []
+    for parent, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.startswith(CACHE_NAME) or name.endswith(".part"):
+                continue
+            names.append(os.path.relpath(os.path.join(parent, name), directory))
+    return names
+
+
+def open_segments(directory):
+    """Names of the files of segments that are still being written"""
+    try:
+        segments, _ = load_manifest(directory)
+    except OSError:
+        return set()  # recorded before the manifest existed: everything is final
+    names = set()
+    for index, segment in segments.items():
+        if segment["closed"] is None:
+            names.update(f"video_{index:03d}{ext}" for ext in (".h264", ".pts"))
+    return names
+
+
+def build_manifest(directory):
+    cache = CrcCache(directory)
+    still_open = open_segments(directory)
+    files = []
+    for name in session_files(directory):
+        path = os.path.join(directory, name)
+        try:
+            files.append({"path": name, "size": os.path.getsize(path), "crc32": cache.crc(name, path),
+                          "complete": name not in still_open and name != MANIFEST_NAME})
+        except OSError:
+            continue  # removed while listing (storage cleanup)
+    cache.save()
+    return {"session": os.path.basename(os.path.normpath(directory)), "files": files}
+
+
+# Pi side
+
+class SyncHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: one connection per client worker
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def resolve(self, relative):
+        """Absolute path inside a session directory, or None"""
+        root = self.server.root
+        path = os.path.realpath(os.path.join(root, unquote(relative)))
+        if os.path.commonpath([path, root]) != root:
+            return None
+        # Only recordings are served, not the logs or the code next to them
+        if not os.path.relpath(path, root).startswith("videos_"):
+            return None
+        return path
+
+    def send_json(self, value):
+        body = json.dumps(value).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.last_request = time.monotonic()
+        route, _, rest = self.path.lstrip("/").partition("/")
+        try:
+            if route == "sessions":
+                root = self.server.root
+                self.send_json(sorted(name for name in os.listdir(root)
+                                      if name.startswith("videos_") and os.path.isdir(os.path.join(root, name))))
+            elif route == "manifest":
+                directory = self.resolve(rest)
+                if directory is None or not os.path.isdir(directory):
+                    self.send_error(404)
+                    return
+                self.send_json(build_manifest(directory))
+            elif route == "files":
+                self.send_file(rest)
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away, it will resume
+
+    def send_file(self, relative):
+        path = self.resolve(relative)
+        if path is None or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size
+            ranged = self.headers.get("Range", "")
+            if ranged.startswith("bytes="):
+                first, _, last = ranged[6:].partition("-")
+                try:
+                    start = int(first)
+                    end = min(size, int(last) + 1) if last else size
+                except ValueError:
+                    start = size + 1
+                if start >= size or start >= end:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(end - start))
+            self.end_headers()
+            self.wfile.flush()
+            count = end - start
+            if self.server.fail_after is not None and count > self.server.fail_after:
+                # Demo: the connection drops part way through the body
+                self.connection.sendfile(f, start, self.server.fail_after)
+                self.close_connection = True
+                return
+            if self.server.rate:
+                self.send_paced(f, start, count)
+            else:
+                self.connection.sendfile(f, start, count)
+
+    def send_paced(self, f, start, count):
+        """Demo: limit each connection to server.rate bytes/s, like one Wi-Fi TCP stream"""
+        f.seek(start)
+        began = time.monotonic()
+        sent = 0
+        while sent < count:
+            block = f.read(min(64 * 1024, count - sent))
+            if not block:
+                break
+            self.wfile.write(block)
+            sent += len(block)
+            delay = began + sent / self.server.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class SyncServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, port=PORT, host=HOST, rate=None, fail_after=None, verbose=False):
+        super().__init__((host, port), SyncHandler)
+        self.root = os.path.realpath(root)
+        self.rate = rate
+        self.fail_after = fail_after
+        self.verbose = verbose
+        self.last_request = time.monotonic()
+
+    def serve(self, idle_timeout=None):
+        """Serves until idle_timeout seconds pass without a request"""
+        if not idle_timeout:
+            self.serve_forever()
+            return
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        while time.monotonic() - self.last_request < idle_timeout:
+            time.sleep(1)
+        print(f"No request for {idle_timeout} s, stopping")
+        self.shutdown()
+
+
+# Ground side
+
+class SyncClient:
+
+    def __init__(self, url, workers=WORKERS, timeout=TIMEOUT, log=print):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.workers = workers
+        self.timeout = timeout
+        self.log = log
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.bytes_received = 0
+        self.resumes = 0  # requests that continued a partial file
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def drop_connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def get_json(self, path):
+        conn = self.connection()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.drop_connection()
+            raise
+        if response.status != 200:
+            raise OSError(f"GET {path}: HTTP {response.status}")
+        return json.loads(body)
+
+    def sessions(self):
+        return self.get_json("/sessions")
+
+    def manifest(self, session):
+        return self.get_json(f"/manifest/{quote(session)}")
+
+    def download(self, session, entry, dest):
+        """Fetches one file into dest, resuming its .part; returns the bytes received"""
+        target = os.path.join(dest, entry["path"])
+        part = target + ".part"
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        received = 0
+        delay = RETRY_DELAY
+        for attempt in range(RETRIES + 1):
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            if offset > entry["size"]:
+                os.remove(part)  # longer than the remote file: it changed, start over
+                offset = 0
+            try:
+                received += self.fetch_range(session, entry["path"], part, offset, entry["size"])
+            except (OSError, http.client.HTTPException) as e:
+                self.drop_connection()
+                if attempt == RETRIES:
+                    raise
+                self.log(f"{entry['path']}: {e.__class__.__name__} at byte "
+                         f"{os.path.getsize(part) if os.path.exists(part) else 0}, resuming")
+                time.sleep(delay)
+                delay *= 2
+                continue
+            if file_crc32(part) == entry["crc32"]:
+                os.replace(part, target)
+                return received
+            # The remote file changed under an old .part (or the bytes are bad): start over
+            self.log(f"{entry['path']}: checksum mismatch, downloading again")
+            os.remove(part)
+        raise OSError(f"{entry['path']}: checksum still wrong after {RETRIES + 1} attempts")
+
+    def fetch_range(self, session, name, part, offset, size):
+        if offset >= size:
+            if not os.path.exists(part):
+                open(part, "wb").close()  # empty file: nothing to fetch, but the .part must exist
+            return 0
+        conn = self.connection()
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            with self.lock:
+                self.resumes += 1
+        conn.request("GET", f"/files/{quote(session)}/{quote(name)}", headers=headers)
+        response = conn.getresponse()
+        if response.status == 200:
+            offset = 0
+        elif response.status != 206:
+            response.read()
+            raise OSError(f"{name}: HTTP {response.status}")
+        expected = int(response.getheader("Content-Length", size - offset))
+        got = 0
+        with open(part, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            while got < expected:
+                block = response.read(min(BLOCK_SIZE, expected - got))
+                if not block:
+                    break
+                f.write(block)
+                got += len(block)
+                with self.lock:
+                    self.bytes_received += len(block)
+        if got < expected:
+            raise http.client.IncompleteRead(b"", expected - got)
+        return got
+
+    def pull(self, session, dest, include_open=False):
+        """Syncs one session into dest/<session>; returns the report dict"""
+        start = time.monotonic()
+        manifest = self.manifest(session)
+        directory = os.path.join(dest, session)
+        os.makedirs(directory, exist_ok=True)
+        cache = CrcCache(directory)
+        todo = []
+        report = {"files": len(manifest["files"]), "up_to_date": 0, "fetched": 0, "resumed": 0,
+                  "skipped_open": 0, "failed": [], "bytes": 0}
+        for entry in manifest["files"]:
+            if not entry["complete"] and not include_open and entry["path"] != MANIFEST_NAME:
+                report["skipped_open"] += 1
+                continue
+            local = os.path.join(directory, entry["path"])
+            if (os.path.exists(local) and os.path.getsize(local) == entry["size"]
+                    and cache.crc(entry["path"], local) == entry["crc32"]):
+                report["up_to_date"] += 1
+                continue
+            todo.append(entry)
+        cache.save()
+        total = sum(entry["size"] for entry in todo)
+        self.log(f"{session}: {len(todo)} of {len(manifest['files'])} files to fetch, {total} bytes, "
+                 f"{self.workers} connections")
+
+        received_before = self.bytes_received
+        resumes_before = self.resumes
+        transfer_start = time.monotonic()
+        # Largest first so the long transfers overlap the many small ones
+        todo.sort(key=lambda entry: -entry["size"])
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sync") as pool:
+            futures = {pool.submit(self.download, session, entry, directory): entry for entry in todo}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    self.log(f"{entry['path']}: failed: {e}")
+                    report["failed"].append(entry["path"])
+                    continue
+                report["fetched"] += 1
+        transfer_seconds = time.monotonic() - transfer_start
+
+        # Final verification of the whole local copy against the manifest
+        cache = CrcCache(directory)
+        mismatched = []
+        for entry in manifest["files"]:
+            local = os.path.join(directory, entry["path"])
+            if not entry["complete"] and not include_open and entry["path"] != MANIFEST_NAME:
+                continue
+            if entry["path"] in report["failed"]:
+                continue
+            if not os.path.exists(local) or cache.crc(entry["path"], local) != entry["crc32"]:
+                mismatched.append(entry["path"])
+        cache.save()
+        report["verified"] = len(manifest["files"]) - report["skipped_open"] - len(report["failed"]) - len(mismatched)
+        report["mismatched"] = mismatched
+        report["bytes"] = self.bytes_received - received_before
+        report["resumed"] = self.resumes - resumes_before
+        report["transfer_seconds"] = transfer_seconds
+        report["seconds"] = time.monotonic() - start
+        report["throughput"] = report["bytes"] / transfer_seconds if transfer_seconds > 0 else 0.0
+        return report
+
+
+def print_report(session, report):
+    print(f"{session}: {report['fetched']} fetched ({report['resumed']} resumed transfers), {report['up_to_date']} up to date, "
+          f"{report['skipped_open']} still recording (--include-open), {len(report['failed'])} failed; "
+          f"{report['bytes'] / 1e6:.1f} MB in {report['transfer_seconds']:.2f} s = "
+          f"{report['throughput'] / 1e6:.1f} MB/s; {report['verified']} files verified"
+          + (f", MISMATCHED: {', '.join(report['mismatched'])}" if report["mismatched"] else ""))
+
+
+def demo(size_mb, segments, rate, workers):
+    """Loopback run: fresh sync with dropped connections, resume, no-op re-sync, one changed file"""
+    root = tempfile.mkdtemp(prefix="sync_root_")
+    dest = tempfile.mkdtemp(prefix="sync_dest_")
+    session = "videos_demo"
+    directory = os.path.join(root, session)
+    os.makedirs(os.path.join(directory, "thumbs"))
+    segment_bytes = size_mb * 1024 * 1024 // segments
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as manifest:
+        for index in range(segments):
+            with open(os.path.join(directory, f"video_{index:03d}.h264"), "wb") as f:
+                f.write(os.urandom(segment_bytes))
+            with open(os.path.join(directory, f"video_{index:03d}.pts"), "w") as f:
+                f.write("# timecode format v2\n" + "".join(f"{i * 8.333:.3f}\n" for i in range(3600)))
+            with open(os.path.join(directory, "thumbs", f"thumb_{index:03d}.jpg"), "wb") as f:
+                f.write(os.urandom(4000))
+            manifest.write(json.dumps({"type": "idr", "segment": index, "offset": 0, "frame": 0,
+                                       "pts_us": index * 30_000_000}) + "\n")
+            if index < segments - 1:  # the last one is still "recording"
+                manifest.write(json.dumps({"type": "segment", "segment": index, "first_pts_us": 0,
+                                           "last_pts_us": 0, "bytes": segment_bytes, "frames": 3600}) + "\n")
+
+    server = SyncServer(root, port=0, host="127.0.0.1", rate=rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        start = time.monotonic()
+        build_manifest(directory)
+        print(f"Pi side: {size_mb} MB in {segments} segments hashed in {time.monotonic() - start:.2f} s")
+
+        for count in sorted({1, workers}):
+            print(f"\n{count} connection(s), fresh copy"
+                  + (f", server limited to {rate / 1e6:.1f} MB/s per connection" if rate else ""))
+            target = os.path.join(dest, f"fresh_{count}")
+            print_report(session, SyncClient(url, workers=count, log=lambda msg: None).pull(session, target))
+
+        target = os.path.join(dest, "resumed")
+        print(f"\n{workers} connections, every response cut after {segment_bytes // 3} bytes")
+        server.fail_after = segment_bytes // 3
+        report = SyncClient(url, workers=workers, log=lambda msg: None).pull(session, target)
+        print_report(session, report)
+        server.fail_after = None
+
+        print("\nSecond sync, nothing changed")
+        print_report(session, SyncClient(url, workers=workers).pull(session, target))
+
+        print("\nOne segment rewritten on the Pi, a stale .part of another left on the ground")
+        with open(os.path.join(directory, "video_000.h264"), "r+b") as f:
+            f.write(os.urandom(1024))
+        stale = os.path.join(target, session, "video_001.h264")
+        with open(stale, "rb") as f, open(stale + ".part", "wb") as part:
+            part.write(f.read(segment_bytes // 2))
+        os.remove(stale)
+        print_report(session, SyncClient(url, workers=workers).pull(session, target))
+    finally:
+        server.shutdown()
+        shutil.rmtree(root)
+        shutil.rmtree(dest)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resumable, parallel, checksummed download of recordings")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Pi side: serve the recordings")
+    serve.add_argument("--root", default=".", help="directory holding the videos_* sessions")
+    serve.add_argument("--port", type=int, default=PORT)
+    serve.add_argument("--host", default=HOST, help="address to bind; the default only accepts tunnelled connections")
+    serve.add_argument("--idle-timeout", type=float, default=None, help="exit after this many idle seconds")
+    serve.add_argument("--verbose", action="store_true")
+    listing = commands.add_parser("list", help="list the sessions on the Pi")
+    listing.add_argument("url")
+    pull = commands.add_parser("pull", help="ground side: sync a session")
+    pull.add_argument("url")
+    pull.add_argument("session")
+    pull.add_argument("dest", nargs="?", default="videos")
+    pull.add_argument("--workers", type=int, default=WORKERS)
+    pull.add_argument("--include-open", action="store_true", help="also fetch the segment being recorded")
+    run_demo = commands.add_parser("demo", help="loopback demo and throughput report")
+    run_demo.add_argument("--size", type=int, default=64, help="MB of video")
+    run_demo.add_argument("--segments", type=int, default=8)
+    run_demo.add_argument("--rate", type=float, default=4e6, help="bytes/s per connection, 0 for unlimited")
+    run_demo.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = SyncServer(args.root, port=args.port, host=args.host, verbose=args.verbose)
+        print(f"Serving {server.root} on {args.host}:{args.port}")
+        server.serve(args.idle_timeout)
+    elif args.command == "list":
+        print("\n".join(SyncClient(args.url).sessions()))
+    elif args.command == "pull":
+        client = SyncClient(args.url, workers=args.workers)
+        report = client.pull(args.session.strip("/"), args.dest, include_open=args.include_open)
+        print_report(args.session, report)
+        if report["failed"] or report["mismatched"]:
+            raise SystemExit(1)
+    else:
+        demo(args.size, args.segments, args.rate or None, args.workers)
@@ -1,9 +1,15 @@
+from startup_profile import StartupProfile, last_recording_end
+startup = StartupProfile()  # before any other import, so import time is measured
+import queue
 import threading
 from datetime import datetime, timedelta
 import os
 import time
-from glob import glob
-import camera_utils
+from segment_tracker import SegmentTracker
+from telemetry_log import TelemetryLog
+from adaptive_profile import ProfileController
+
+INIT_RETRY_SECONDS = 0.25  # every second without a camera is lost footage
 
 """
 Listens for telecommands from the UART port
@@ -15,9 +21,20 @@ class CameraManager():
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.main_video_path = f"videos_{ts}/"
         self.size_log_path = f"logs/{ts}-size_log.txt"
+        self.telemetry_log_path = f"logs/{ts}-telemetry.bin"
         self.current_video_size = 0 
         self.video_counter = 0
+        self.write_rate = 0.0
         self.camera_busy = False
+        self.segments = SegmentTracker(self.main_video_path)
+        self.recording_output = None  # set by camera_utils.record_h264_segments
+        self.write_behind = None
+        self.frame_stats = None
+        self.profile_controller = ProfileController()
+        # File I/O asked for by the recorder's callbacks, done by the monitor thread
+        self.monitor_jobs = queue.Queue()
+        # Read now: recording_resumed runs on the recorder's write path, not the place to scan a directory
+        self.previous_recording_end = last_recording_end(exclude=self.main_video_path)
 
         if not os.path.exists(self.main_video_path):
             os.makedirs(self.main_video_path)
@@ -25,43 +42,86 @@ class CameraManager():
             os.makedirs("logs/")
         if not os.path.exists("photos/"):
             os.makedirs("photos/")
+        self.telemetry = TelemetryLog(self.telemetry_log_path)
     
         
+    def segment_started(self, index, path):
+        """Called by the recorder every time it opens a new segment"""
+        self.segments.segment_started(index, path)
+        if "first_frame" not in startup.marks:
+            # Runs on the write-behind thread with the output lock held: only
+            # take the time here, the logs are written by the monitor
+            startup.mark("first_frame")
+            self.monitor_jobs.put((self.recording_resumed, (time.time(),)))
+
+    def recording_resumed(self, first_frame_time):
+        # First frame on disk: close the startup profile and log the gap since
+        # the previous run's last write (the footage lost to the reboot)
+        previous_end = self.previous_recording_end
+        gap = first_frame_time - previous_end if previous_end else None
+        startup.record(video_path=self.main_video_path, footage_gap=gap)
+        with open(self.size_log_path, "a") as logfile:
+            entry = f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')} Recording resumed, first frame " \
+                    f"{startup.marks['first_frame']:.2f} s after start"
+            if gap is not None:
+                entry += f", {gap:.1f} s since the previous recording"
+            logfile.write(entry + "\n")
+
+    def run_monitor_jobs(self):
+        while True:
+            try:
+                job, args = self.monitor_jobs.get_nowait()
+            except queue.Empty:
+                return
+            job(*args)
+
     # Logs every 3 seconds the state of the recording
     def monitor_size(self):
         print("\nStarting monitor thread")
         while True:
             try:
                 time.sleep(3)
-                # Get latest segment size
-                files = glob(f"{self.main_video_path}*.h264")
-                if not files:
+                self.run_monitor_jobs()
+                # Latest segment size, tracked incrementally
+                output = self.recording_output
+                if not self.segments.update(output.segment_byte_count if output else None):
                     print("No files found in monitoring")
                     continue
-                self.video_counter = len(files)
-                latest_file = max(files, key=os.path.getctime)
-                self.current_video_size = os.path.getsize(latest_file)
-
-                # Log telemtry to SD card
-                with open(self.size_log_path, "a") as logfile:
-                    camera_state_str = f"Camera is busy" if self.camera_busy else f"Camera is free"
-                    count_str = f"Number of recorded segments {float(self.video_counter):.1f}"
-                    size_str = f"Latest segment size: {float(self.current_video_size):.1f} bytes"
-                    timestamp = datetime.now().isoformat()
-                    entry = f"{timestamp}: \t{count_str}\n\t{size_str}\n\t{camera_state_str}"
-                    logfile.write(entry + "\n")
-                    logfile.flush()
-                    
+                self.video_counter = self.segments.video_counter
+                self.current_video_size = self.segments.current_video_size
+                self.write_rate = self.segments.bytes_per_second
+
+                # Log telemetry to the binary ring-buffered log
+                write_behind = self.write_behind
+                stats = self.frame_stats
+                if stats is not None:
+                    print(stats.summary())
+                self.telemetry.append(self.video_counter, self.current_video_size,
+                                      self.camera_busy, self.write_rate,
+                                      queue_bytes=write_behind.queued_bytes if write_behind else 0,
+                                      queue_high_water=write_behind.high_water_bytes if write_behind else 0,
+                                      backpressure=write_behind.backpressure_events if write_behind else 0,
+                                      **(stats.status_counters() if stats else {}),
+                                      **self.profile_controller.status_counters())
+
             except Exception as e:
                 print("Error in monitor size thread")
                 print(e)
 
     def start(self):
-        picam = camera_utils.init_camera()
+        # Deferred: picamera2 and the camera stack are the slowest imports
+        import camera_utils
+        startup.mark("import")
+        # Only the video configuration is needed to get recording
+        picam = camera_utils.init_camera(modes=("video",))
         while picam is None:
-            time.sleep(2)
-            picam = camera_utils.init_camera()
-                
+            time.sleep(INIT_RETRY_SECONDS)
+            picam = camera_utils.init_camera(modes=("video",))
+        startup.mark("init_camera")
+        # The recorder skips configure() as the camera is already in video mode
+        camera_utils.configure_mode(picam, "video")
+        startup.mark("configure")
+
         stop_event = threading.Event()
         camera_thread = threading.Thread(target=camera_utils.record_h264_segments, args = (picam, self, 7200, stop_event))
         monitor_size_thread = threading.Thread(target=self.monitor_size)
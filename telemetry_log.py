@@ -0,0 +1,191 @@
+import math
+import os
+import struct
+import threading
+import time
+
+"""
+Compact binary telemetry log.
+Fixed-size records are appended to an in-memory ring buffer; a background
+writer flushes them in batches with pwrite into a file that is preallocated
+in large chunks. At most `flush_every` records are lost on a power cut.
+
+Convert a log to CSV: python telemetry_log.py logs/<ts>-telemetry.bin [out.csv]
+"""
+
+MAGIC = b"GTTL"
+VERSION = 4
+HEADER = struct.Struct("<4sHH")  # magic, version, record size
+# timestamp, segment count, segment size, busy, bytes/s, cpu temp (C), load avg,
+# write-behind queued bytes, queue high-water mark, backpressure events,
+# sensor frames dropped, p99 frame interval (us), p99 sensor to encoder latency (us),
+# recording profile, flight phase, profile switches
+RECORD = struct.Struct("<dIQB3xfffIIIIIIBBH")
+FIELDS = ("timestamp", "segment_count", "segment_size", "busy", "bytes_per_second", "cpu_temp", "load",
+          "queue_bytes", "queue_high_water", "backpressure", "sensor_drops", "interval_p99_us",
+          "latency_p99_us", "profile", "phase", "profile_switches")
+# Older layouts that read_records still understands
+LEGACY_RECORDS = {1: (struct.Struct("<dIQB3xfff"), FIELDS[:7]),
+                  2: (struct.Struct("<dIQB3xfffIII4x"), FIELDS[:10]),
+                  3: (struct.Struct("<dIQB3xfffIIIIII4x"), FIELDS[:13])}
+PREALLOCATE_RECORDS = 4096
+
+
+def read_cpu_temperature():
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp") as f:
+            return int(f.read()) / 1000.0
+    except (OSError, ValueError):
+        return math.nan
+
+
+def read_load():
+    try:
+        return os.getloadavg()[0]
+    except OSError:
+        return math.nan
+
+
+class TelemetryLog:
+
+    def __init__(self, path, capacity=256, flush_every=10, flush_interval=30.0):
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self.ring = bytearray(RECORD.size * capacity)
+        self.head = 0      # total records appended
+        self.flushed = 0   # total records written to disk
+        self.dropped = 0   # overwritten before they could be written
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self.fd).st_size
+        if size < HEADER.size:
+            os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, RECORD.size), 0)
+            self.file_records = 0
+        else:
+            self.file_records = count_records(path)
+        self.allocated = max(0, (size - HEADER.size) // RECORD.size)
+
+        self.writer = threading.Thread(target=self.run_writer, daemon=True)
+        self.writer.start()
+
+    def append(self, segment_count, segment_size, busy, bytes_per_second,
+               cpu_temp=None, load=None, timestamp=None,
+               queue_bytes=0, queue_high_water=0, backpressure=0,
+               sensor_drops=0, interval_p99_us=0, latency_p99_us=0,
+               profile=0, phase=0, profile_switches=0):
+        """Cheap, non-blocking: packs one record into the ring buffer"""
+        if timestamp is None:
+            timestamp = time.time()
+        if cpu_temp is None:
+            cpu_temp = read_cpu_temperature()
+        if load is None:
+            load = read_load()
+        with self.lock:
+            slot = self.head % self.capacity
+            RECORD.pack_into(self.ring, slot * RECORD.size, timestamp, segment_count,
+                             segment_size, 1 if busy else 0, bytes_per_second, cpu_temp, load,
+                             queue_bytes, queue_high_water, backpressure,
+                             sensor_drops, interval_p99_us, latency_p99_us,
+                             profile, phase, min(profile_switches, 0xFFFF))
+            self.head += 1
+            if self.head - self.flushed > self.capacity:
+                self.dropped += self.head - self.flushed - self.capacity
+                self.flushed = self.head - self.capacity
+            pending = self.head - self.flushed
+        if pending >= self.flush_every:
+            self.wakeup.set()
+
+    def take_pending(self) -> bytes:
+        with self.lock:
+            start, end = self.flushed, self.head
+            if start == end:
+                return b""
+            first = start % self.capacity
+            last = end % self.capacity
+            if first < last:
+                chunk = bytes(self.ring[first * RECORD.size:last * RECORD.size])
+            else:
+                chunk = bytes(self.ring[first * RECORD.size:]) + bytes(self.ring[:last * RECORD.size])
+            self.flushed = end
+            return chunk
+
+    def flush(self):
+        chunk = self.take_pending()
+        if not chunk:
+            return
+        count = len(chunk) // RECORD.size
+        if self.file_records + count > self.allocated:
+            self.allocated = self.file_records + count + PREALLOCATE_RECORDS
+            try:
+                os.posix_fallocate(self.fd, HEADER.size, self.allocated * RECORD.size)
+            except (AttributeError, OSError):
+                pass  # not supported by this OS/filesystem, the file just grows
+        os.pwrite(self.fd, chunk, HEADER.size + self.file_records * RECORD.size)
+        os.fsync(self.fd)
+        self.file_records += count
+
+    def run_writer(self):
+        while not self.stop_event.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing telemetry log: {e}")
+
+    def close(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        self.writer.join()
+        self.flush()
+        os.close(self.fd)
+
+
+def read_records(path):
+    """Yields one dict per record; stops at the preallocated (zeroed) tail"""
+    with open(path, "rb") as f:
+        magic, version, record_size = HEADER.unpack(f.read(HEADER.size))
+        record, fields = (RECORD, FIELDS) if version == VERSION else LEGACY_RECORDS.get(version, (None, None))
+        if magic != MAGIC or record is None or record_size != record.size:
+            raise ValueError(f"{path} is not a version {VERSION} telemetry log")
+        while True:
+            data = f.read(record.size * 1024)
+            for values in record.iter_unpack(data[:len(data) - len(data) % record.size]):
+                if values[0] == 0:
+                    return
+                yield dict(zip(fields, values))
+            if len(data) < record.size * 1024:
+                return
+
+
+def count_records(path):
+    count = 0
+    for _ in read_records(path):
+        count += 1
+    return count
+
+
+def to_csv(path, out):
+    import csv
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    for record in read_records(path):
+        writer.writerow(record)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python telemetry_log.py <telemetry.bin> [out.csv]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", newline="") as out:
+            to_csv(sys.argv[1], out)
+    else:
+        to_csv(sys.argv[1], sys.stdout)
@@ -1,14 +1,16 @@
 import threading
+import queue
+import shutil
 from datetime import datetime, timedelta
 import os
 import time
-from glob import glob
-import gt_packet
 import camera_utils
-from try_ports import try_ports
+from gt_link import GTLink
+from segment_tracker import SegmentTracker
+from status_frame import StatusFrame
+from adaptive_profile import ProfileController, PAD_PHASE, ASCENT_PHASE
 
 """
-Pseudo:
 Constantly listen for commands from the UART port
 Upon receival, parse and immediately complete the task
 """
@@ -18,16 +20,33 @@ class CameraManager():
     SELFIE_OPCODE = b'\x02'
     STOP_RECORDING_OPCODE = b'\x03'
     TELEMETRY_OPCODE = b'\x04'
+    ARM_OPCODE = b'\x05'
+    SET_PHASE_OPCODE = b'\x09'  # payload: flight phase id (adaptive_profile.PHASES)
+    PREROLL_SECONDS = 5
+    SELFIE_DELAY = 3  # seconds between the selfie command and the shot
+    STATUS_PERIOD = 1  # seconds between status frame refreshes
+    SERIAL_PORTS = None  # ports to probe, None: the try_ports default list
+    MOTION_DETECTION = False  # watch the lores stream for launch; see motion_event
     
     def __init__(self):
-        self.gt_buffer = []
-        self.serial_portname = ""
+        # Telecommands as (receive time, payload), consumed in FIFO order
+        self.tc_queue = queue.Queue()
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.main_video_path = f"videos_{ts}/"
         self.size_log_path = f"logs/{ts}-size_log.txt"
         self.current_video_size = 0 
         self.video_counter = 0
         self.camera_busy = False
+        self.last_tc_latency = 0.0
+        self.segments = SegmentTracker(self.main_video_path)
+        self.status = StatusFrame(self.TELEMETRY_OPCODE[0])
+        self.recording_output = None
+        self.write_behind = None
+        self.preroll_output = None
+        self.frame_stats = None
+        self.profile_controller = ProfileController(log=self.log)
+        # Serial port: answers TELEMETRY, PING and downlinks, queues the rest
+        self.link = GTLink(self.queue_command, self.telemetry_packet, self.SERIAL_PORTS, log=self.log)
 
         if not os.path.exists(self.main_video_path):
             os.makedirs(self.main_video_path)
@@ -36,60 +55,190 @@ class CameraManager():
         if not os.path.exists("photos/"):
             os.makedirs("photos/")
 
-        self.gt_port = None
-        self.gt_buffer.append(self.START_RECORDING_OPCODE)
+        self.picam = None
+        self.stop_event = threading.Event()
+        self.camera_thread = None
+        self.handlers = {
+            self.START_RECORDING_OPCODE: self.handle_start_recording,
+            self.SELFIE_OPCODE: self.handle_selfie,
+            self.STOP_RECORDING_OPCODE: self.handle_stop_recording,
+            self.ARM_OPCODE: self.handle_arm,
+            self.SET_PHASE_OPCODE: self.handle_set_phase,
+        }
 
-    def start(self):
-        picam = camera_utils.init_camera()
-        stop_event = threading.Event()
-        camera_thread = threading.Thread(target=camera_utils.record_h264_segments, args = (picam, self, 7200, stop_event))
-            
+        self.submit(self.START_RECORDING_OPCODE)
+
+    def submit(self, payload: bytes):
+        """Queue a telecommand; safe to call from the serial listener thread"""
+        self.link.submit(payload)
+
+    def queue_command(self, received_at, payload):
+        self.tc_queue.put((received_at, payload))
 
+    def telemetry_packet(self):
+        return self.status.packet(self.last_tc_latency)
+
+    def segment_started(self, index, path):
+        """Called by the recorder every time it opens a new segment"""
+        self.segments.segment_started(index, path)
+        self.status.update(segment_index=index)
+
+    # Keeps the pre-assembled status frame up to date
+    def monitor_status(self):
         while True:
             try:
-                time.sleep(2)
-                if self.gt_buffer:
-                    tc = self.gt_buffer.pop()
-                    print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: Running TC: {tc}")
-                    # Log tc
-                    with open(self.size_log_path, "a") as logfile:
-                        entry = f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')} Running TC: {tc}"
-                        logfile.write(entry + "\n")
-                        logfile.flush()
-
-                    # Manage Tasks
-                    if tc is self.START_RECORDING_OPCODE:
-                        if self.camera_busy:
-                            print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: Camera busy, tc ignored")
-                        else:
-                            # Start recording video and monitoring its size
-                            self.camera_busy = True
-                            camera_thread.start()
-                    elif tc is self.STOP_RECORDING_OPCODE:
-                        if not self.camera_busy:
-                            print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: Stop failed, camera not busy")
-                        else:
-                            print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: Stopping video recording")
-                            stop_event.set()
-                            self.camera_busy = False
-                            camera_thread.join()
-                    elif tc is self.SELFIE_OPCODE:
-                        if self.camera_busy:
-                            print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: Selfie failed, camera busy")
-                        else:
-                            self.camera_busy = True
-                            print(f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: Taking a picture")
-                            time.sleep(3) # 3 second delay
-                            camera_utils.take_selfie(picam)
-                            self.camera_busy = False
+                time.sleep(self.STATUS_PERIOD)
+                output = self.recording_output
+                if self.segments.update(output.segment_byte_count if output else None):
+                    self.video_counter = self.segments.video_counter
+                    self.current_video_size = self.segments.current_video_size
+                self.status.update(
+                    recording=self.camera_busy,
+                    segment_index=max(0, self.segments.current_index),
+                    bytes_written=self.segments.bytes_written,
+                    free_disk=shutil.disk_usage(self.main_video_path).free,
+                    frames_dropped=output.frames_dropped if output else 0,
+                    storage_full=bool(output and output.storage and output.storage.storage_full),
+                )
+                if self.frame_stats is not None:
+                    self.status.update(**self.frame_stats.status_counters())
+                self.status.update(**self.profile_controller.status_counters())
+            except Exception as e:
+                print("Error in status monitor thread")
+                print(e)
+
+    def log(self, msg):
+        entry = f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}: {msg}"
+        print(entry)
+        with open(self.size_log_path, "a") as logfile:
+            logfile.write(entry + "\n")
+            logfile.flush()
+
+    def motion_event(self, state, pts_us):
+        """Called from the motion detector thread; acts through the telecommand queue"""
+        when = f" at {pts_us / 1e6:.2f} s" if pts_us is not None else ""
+        self.log(f"Motion {state}{when}")
+        if state != "start":
+            return
+        preroll = self.preroll_output
+        if preroll is not None and not preroll.triggered:
+            # Armed on the pad: movement is the launch, start recording for real
+            self.submit(self.START_RECORDING_OPCODE)
+        if self.profile_controller.phase == PAD_PHASE:
+            self.submit(self.SET_PHASE_OPCODE + bytes([ASCENT_PHASE]))
+
+    # Telecommand handlers
+    def new_session(self):
+        """Fresh videos_<ts>/ directory once the current one holds a recording,
+        so a START after STOP never overwrites video_000 or the manifest"""
+        if not os.listdir(self.main_video_path):
+            return
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = f"videos_{ts}/"
+        suffix = 1
+        while os.path.exists(path):
+            path = f"videos_{ts}_{suffix}/"
+            suffix += 1
+        os.makedirs(path)
+        self.main_video_path = path
+        self.segments = SegmentTracker(path)
+        self.log(f"New recording session in {path}")
+
+    def start_camera_thread(self, preroll_seconds=None):
+        self.new_session()
+        self.camera_busy = True
+        self.stop_event = threading.Event()
+        self.camera_thread = threading.Thread(target=camera_utils.record_h264_segments, args = (self.picam, self, 7200, self.stop_event),
+                                              kwargs={"preroll_seconds": preroll_seconds,
+                                                      "motion": self.MOTION_DETECTION})
+        self.camera_thread.start()
 
+    def handle_start_recording(self, payload):
+        preroll = self.preroll_output
+        if preroll is not None and not preroll.triggered:
+            # Armed: flush the pre-roll and keep recording live
+            self.log(f"Trigger: writing {preroll.buffered_seconds:.1f} s of pre-roll "
+                     f"(peak {preroll.peak_bytes} bytes)")
+            preroll.trigger()
+            return
+        if self.camera_busy:
+            self.log("Camera busy, tc ignored")
+            return
+        # Start recording video and monitoring its size
+        self.start_camera_thread()
+
+    def handle_arm(self, payload):
+        if self.camera_busy:
+            self.log("Arm failed, camera busy")
+            return
+        self.log(f"Arming with {self.PREROLL_SECONDS} s pre-roll")
+        self.start_camera_thread(preroll_seconds=self.PREROLL_SECONDS)
+
+    def handle_stop_recording(self, payload):
+        if not self.camera_busy:
+            self.log("Stop failed, camera not busy")
+            return
+        self.log("Stopping video recording")
+        self.stop_event.set()
+        self.camera_thread.join()
+        self.recording_output = None
+        self.write_behind = None
+        self.preroll_output = None
+        self.camera_busy = False
+
+    def handle_selfie(self, payload):
+        if self.camera_busy and self.recording_output is not None:
+            # Grab the still from the running video stream, recording continues
+            self.log("Taking a picture while recording")
+            time.sleep(self.SELFIE_DELAY)
+            camera_utils.take_still_while_recording(self.picam)
+            return
+        if self.camera_busy:
+            self.log("Selfie failed, camera busy")
+            return
+        self.camera_busy = True
+        try:
+            self.log("Taking a picture")
+            time.sleep(self.SELFIE_DELAY)
+            camera_utils.take_selfie(self.picam)
+        finally:
+            self.camera_busy = False
+
+    def handle_set_phase(self, payload):
+        if len(payload) < 2:
+            self.log("Set phase failed, no phase given")
+            return
+        # The recording loop applies the new profile within half a second
+        self.profile_controller.set_phase(payload[1])
+
+    def dispatch(self, received_at, payload):
+        opcode = payload[:1]
+        handler = self.handlers.get(opcode)
+        self.last_tc_latency = time.monotonic() - received_at
+        self.log(f"Running TC: {payload.hex()} (latency {self.last_tc_latency * 1e3:.2f} ms)")
+        if handler is None:
+            self.log(f"Unknown opcode {opcode.hex()}, tc ignored")
+            return
+        handler(payload)
+        self.status.update(recording=self.camera_busy)
+
+    def start(self):
+        self.picam = camera_utils.init_camera()
+        threading.Thread(target=self.monitor_status, daemon=True).start()
+        threading.Thread(target=self.link.run, name="link", daemon=True).start()
+
+        while True:
+            try:
+                received_at, payload = self.tc_queue.get()
+                self.dispatch(received_at, payload)
 
             except UnicodeDecodeError:
                 print("Received malformed data")
             except KeyboardInterrupt:
                 print("Exiting...")
-                stop_event.set()
+                self.stop_event.set()
                 self.camera_busy = False
+                self.link.close()
                 break
             except Exception as e:
                 print(e)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests run against the hardware-free camera backend from the repo root modules
+os.environ.setdefault("GTXR_CAMERA_BACKEND", "mock")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+import threading
+import types
+import camera_utils
+from adaptive_profile import ProfileController
+from segment_manifest import load_manifest
+
+
+class PressureController(ProfileController):
+    """Asks for the next profile at a segment boundary until one switch is done"""
+
+    def target(self):
+        if self.switches:
+            return None
+        self.reason = "test pressure"
+        return self.index + 1, False
+
+
+def test_switch_runs_as_soon_as_the_segment_closes(tmp_path):
+    controller = PressureController(log=lambda msg: None)
+    manager = types.SimpleNamespace(main_video_path=f"{tmp_path}/", profile_controller=controller)
+    stop_event = threading.Event()
+    picam2 = camera_utils.init_camera()
+    recorder = threading.Thread(target=camera_utils.record_h264_segments, args=(picam2, manager),
+                                kwargs={"stop_event": stop_event, "segment_seconds": None,
+                                        "segment_frames": 30, "thumbnail_seconds": None})
+    recorder.start()
+    try:
+        for _ in range(100):
+            if controller.switches:
+                break
+            stop_event.wait(0.05)
+    finally:
+        stop_event.set()
+        recorder.join(10)
+
+    assert controller.switches == 1 and controller.index == 1
+    # The 0.5 s loop poll alone would skip about 60 frames at 120 fps
+    assert manager.recording_output.frames_skipped < 10
+    segments, _ = load_manifest(manager.main_video_path)
+    assert len(segments) >= 2
@@ -0,0 +1,35 @@
+from clip import extract_clip
+from segment_manifest import ManifestWriter
+from segment_output import SegmentedOutput
+from test_segment_output import FRAME_DURATION, StubEncoder
+
+
+class OffsetEncoder(StubEncoder):
+    """Timestamps that start well after 0, as after a pre-roll or a restart"""
+
+    OFFSET = 5_000_000
+
+    def __init__(self, output):
+        super().__init__(output)
+        outputframe = output.outputframe
+        output.outputframe = lambda frame, keyframe, timestamp: outputframe(frame, keyframe,
+                                                                           timestamp + self.OFFSET)
+
+
+def test_times_are_relative_to_first_frame(tmp_path):
+    directory = f"{tmp_path}/"
+    manifest = ManifestWriter(directory)
+    output = SegmentedOutput(directory, segment_seconds=None, segment_frames=20,
+                             frame_duration=FRAME_DURATION, manifest=manifest)
+    encoder = OffsetEncoder(output)
+    encoder.run(100)
+    manifest.close()
+
+    out = str(tmp_path / "clip.h264")
+    plan, copied, _, origin = extract_clip(directory, 0.0, 0.3, out)
+    assert origin == OffsetEncoder.OFFSET
+    assert plan[0]["first_pts_us"] == origin
+    # From the first frame up to the keyframe at or after 0.3 s
+    end = next(i for i, (_, keyframe, ts) in enumerate(encoder.frames) if keyframe and ts >= 300_000)
+    assert open(out, "rb").read() == b"".join(frame for frame, _, _ in encoder.frames[:end])
+    assert copied == sum(len(frame) for frame, _, _ in encoder.frames[:end])
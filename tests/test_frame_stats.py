@@ -0,0 +1,34 @@
+from adaptive_profile import PROFILES
+from frame_stats import FrameStats
+
+
+class Request:
+
+    def __init__(self, sensor_us, sequence):
+        self.metadata = {"SensorTimestamp": sensor_us * 1000, "SensorSequence": sequence}
+
+    def get_metadata(self):
+        return self.metadata
+
+
+def feed(stats, frame_duration, count):
+    for i in range(count):
+        stats.post_callback(Request(1_000_000 + i * frame_duration, i))
+
+
+def test_interval_buckets_follow_the_profile():
+    fast, slow = PROFILES[0]["frame_duration"], PROFILES[-1]["frame_duration"]
+    stats = FrameStats(fast)
+    feed(stats, fast, 100)
+    assert fast <= stats.status_counters()["interval_p99_us"] <= 1.01 * fast
+
+    # Switched to the slowest profile: on time frames must not land in the overflow bucket
+    stats.restart(slow)
+    feed(stats, slow, 100)
+    assert slow <= stats.status_counters()["interval_p99_us"] <= 1.01 * slow
+    assert stats.status_counters()["sensor_drops"] == 0
+
+    # Same duration: the histogram keeps counting
+    stats.restart(slow)
+    feed(stats, slow, 10)
+    assert sum(stats.interval.counts) == 99 + 9
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import threading
+import time
+import tty
+import pytest
+from gt_packet import GTPacket
+
+
+@pytest.fixture
+def link():
+    """GTPacket on the slave end of a pty pair, the test writes to the master"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    gt = GTPacket(port=os.ttyname(slave), timeout=1)
+    yield gt, master
+    gt.close()
+    os.close(master)
+    os.close(slave)
+
+
+def test_frame_split_across_writes(link):
+    gt, master = link
+    packet = gt.build_packet(b"\x01\x02")
+    os.write(master, packet[:3])
+    time.sleep(0.05)
+    os.write(master, packet[3:])
+    assert gt.receive() == b"\x01\x02"
+
+
+def test_several_packets_in_one_read(link):
+    gt, master = link
+    os.write(master, gt.build_packet(b"\x01") + gt.build_packet(b"\x02\x03") + gt.build_packet(b"\x04"))
+    assert [gt.receive() for _ in range(3)] == [b"\x01", b"\x02\x03", b"\x04"]
+
+
+def test_corrupted_frame_is_rejected(link):
+    gt, master = link
+    corrupted = bytearray(gt.build_packet(b"\x05"))
+    corrupted[3] ^= 0xFF
+    os.write(master, bytes(corrupted) + gt.build_packet(b"\x06"))
+    assert gt.receive() == b"\x06"
+    assert gt.receive() is None  # nothing else: the corrupted frame was dropped
+
+
+def test_bad_crc_bytes_are_rejected(link):
+    gt, master = link
+    corrupted = bytearray(gt.build_packet(b"\x07\x08"))
+    corrupted[-1] ^= 0x01
+    os.write(master, bytes(corrupted))
+    assert gt.receive() is None
+
+
+def test_listener_callback(link):
+    gt, master = link
+    received = []
+    done = threading.Event()
+
+    def callback(payload):
+        received.append(payload)
+        if len(received) == 2:
+            done.set()
+
+    gt.start_listener(callback)
+    os.write(master, gt.build_packet(b"\x09") + gt.build_packet(b"\x0a"))
+    assert done.wait(2)
+    gt.stop_listener()
+    assert received == [b"\x09", b"\x0a"]
+
+
+def test_send_builds_a_valid_frame(link):
+    gt, master = link
+    gt.send(b"\x01")
+    assert os.read(master, 64) == gt.build_packet(b"\x01")
+    assert gt.build_packet(b"\x01")[:3] == b"GT\x01"
+
+
+def test_async_packets(link):
+    gt, master = link
+
+    async def collect():
+        received = []
+        # Split frame, then two frames and a corrupted one in a single write
+        packet = gt.build_packet(b"\x0b\x0c")
+        os.write(master, packet[:2])
+        asyncio.get_running_loop().call_later(0.05, os.write, master, packet[2:])
+        corrupted = bytearray(gt.build_packet(b"\x0d"))
+        corrupted[3] ^= 0xFF
+        asyncio.get_running_loop().call_later(
+            0.1, os.write, master, gt.build_packet(b"\x0e") + bytes(corrupted) + gt.build_packet(b"\x0f"))
+        async for payload in gt.packets():
+            received.append(payload)
+            if len(received) == 3:
+                break
+        return received
+
+    assert asyncio.run(asyncio.wait_for(collect(), 2)) == [b"\x0b\x0c", b"\x0e", b"\x0f"]
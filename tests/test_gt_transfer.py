@@ -0,0 +1,160 @@
+import os
+import random
+import select
+import threading
+import time
+import tty
+import zlib
+import pytest
+from bench_serial_link import corrupt, wire_time
+from gt_packet import GTPacket
+from gt_transfer import (ACK_OPCODE, CHUNK_SIZE, DATA, DATA_OPCODE, DONE, DONE_OPCODE, OFFER, OFFER_OPCODE,
+                         FileReceiver, FileSender, file_crc32)
+
+BAUD = 1_000_000  # paced by the relay; fast enough to keep the tests short
+BER = 5e-5  # about one frame in ten damaged
+
+
+def offer(file_id, name, data):
+    chunks = (len(data) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    return OFFER.pack(OFFER_OPCODE, file_id, len(data), chunks, CHUNK_SIZE, zlib.crc32(data)) + name.encode()
+
+
+def send_file(receiver, file_id, name, data):
+    receiver.handle_packet(offer(file_id, name, data))
+    for seq in range(0, len(data), CHUNK_SIZE):
+        receiver.handle_packet(DATA.pack(DATA_OPCODE, file_id, seq // CHUNK_SIZE) + data[seq:seq + CHUNK_SIZE])
+
+
+@pytest.fixture
+def noisy_link():
+    """Two GTPackets on pty pairs joined by a relay that paces bytes at BAUD and flips bits at BER"""
+    pairs = []
+    for _ in range(2):
+        master, slave = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        pairs.append((master, slave))
+    stop = threading.Event()
+
+    def relay(src, dst, rng):
+        while not stop.is_set():
+            ready, _, _ = select.select([src], [], [], 0.05)
+            if not ready:
+                continue
+            data = os.read(src, 64)
+            time.sleep(wire_time(len(data), BAUD))
+            os.write(dst, corrupt(data, BER, rng))
+
+    (master_a, slave_a), (master_b, slave_b) = pairs
+    relays = [threading.Thread(target=relay, args=(src, dst, random.Random(seed)), daemon=True)
+              for src, dst, seed in ((master_a, master_b, 1), (master_b, master_a, 2))]
+    for thread in relays:
+        thread.start()
+    camera = GTPacket(os.ttyname(slave_a), baudrate=BAUD, timeout=0.1)
+    ground = GTPacket(os.ttyname(slave_b), baudrate=BAUD, timeout=0.1)
+    yield camera, ground
+    stop.set()
+    for thread in relays:
+        thread.join()
+    camera.close()
+    ground.close()
+    for master, slave in pairs:
+        os.close(master)
+        os.close(slave)
+
+
+def transfer(camera, ground, receiver, source, cancel_at=None):
+    """One sender attempt; cancel_at: cancel once the receiver holds that many chunks"""
+    sender = FileSender(camera.send, source, window=16, baud=BAUD, max_idle=10)
+    camera.start_listener(sender.handle_packet)
+    if cancel_at is not None:
+        def watch():
+            while not sender.cancelled and sender.result is None:
+                if receiver.received is not None and sum(receiver.received) >= cancel_at:
+                    sender.cancel()
+                time.sleep(0.01)
+        threading.Thread(target=watch, daemon=True).start()
+    try:
+        return sender.run(), sender
+    finally:
+        camera.stop_listener()
+
+
+def test_file_survives_bit_errors(noisy_link, tmp_path):
+    camera, ground = noisy_link
+    source = tmp_path / "selfie.jpg"
+    source.write_bytes(random.Random(3).randbytes(40 * CHUNK_SIZE + 17))
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    receiver = FileReceiver(ground.send, str(inbox))
+    ground.start_listener(receiver.handle_packet)
+
+    ok, sender = transfer(camera, ground, receiver, str(source))
+    assert ok
+    assert sender.retransmissions > 0
+    assert (inbox / "selfie.jpg").read_bytes() == source.read_bytes()
+    assert not os.path.exists(inbox / "selfie.jpg.part")
+
+
+def test_interrupted_transfer_resumes(noisy_link, tmp_path):
+    camera, ground = noisy_link
+    source = tmp_path / "clip.h264"
+    source.write_bytes(random.Random(4).randbytes(60 * CHUNK_SIZE))
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    receiver = FileReceiver(ground.send, str(inbox))
+    ground.start_listener(receiver.handle_packet)
+
+    ok, first = transfer(camera, ground, receiver, str(source), cancel_at=30)
+    assert not ok
+    time.sleep(0.2)  # frames still on the wire
+    ground.stop_listener()
+    receiver.close()
+    assert os.path.exists(inbox / "clip.h264.part") and os.path.exists(inbox / "clip.h264.part.map")
+
+    # A new receiver (e.g. the ground station restarted) picks the .part up from its map
+    receiver = FileReceiver(ground.send, str(inbox))
+    ground.start_listener(receiver.handle_packet)
+    ok, second = transfer(camera, ground, receiver, str(source))
+    assert ok
+    assert second.chunks_sent < second.chunks  # only what was missing
+    assert file_crc32(inbox / "clip.h264") == file_crc32(source)
+    assert not os.path.exists(inbox / "clip.h264.part.map")
+
+
+def test_empty_file(noisy_link, tmp_path):
+    camera, ground = noisy_link
+    source = tmp_path / "empty.txt"
+    source.write_bytes(b"")
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    receiver = FileReceiver(ground.send, str(inbox))
+    ground.start_listener(receiver.handle_packet)
+
+    ok, _ = transfer(camera, ground, receiver, str(source))
+    assert ok
+    assert (inbox / "empty.txt").read_bytes() == b""
+
+
+def test_reused_file_id_is_a_new_transfer(tmp_path):
+    sent = []
+    receiver = FileReceiver(sent.append, str(tmp_path))
+    first = bytes(range(256)) * 10
+    send_file(receiver, 1, "video_000.h264", first)
+    assert sent[-1] == DONE.pack(DONE_OPCODE, 1, 1)
+
+    # The same offer again (our DONE was lost): answered without a transfer
+    sent.clear()
+    receiver.handle_packet(offer(1, "video_000.h264", first))
+    assert sent == [DONE.pack(DONE_OPCODE, 1, 1)]
+
+    # After a reboot the camera counts from the same id for another file
+    sent.clear()
+    second = bytes(reversed(first))
+    receiver.handle_packet(offer(1, "video_001.h264", second))
+    assert sent[0][0] == ACK_OPCODE
+    send_file(receiver, 1, "video_001.h264", second)
+    assert sent[-1] == DONE.pack(DONE_OPCODE, 1, 1)
+    assert (tmp_path / "video_000.h264").read_bytes() == first
+    assert (tmp_path / "video_001.h264").read_bytes() == second
@@ -0,0 +1,15 @@
+import postprocess
+
+
+def test_segments_sort_numerically_past_999(tmp_path):
+    for index in (1001, 101, 999, 1000, 0):
+        (tmp_path / f"video_{index:03d}.h264").write_bytes(b"")
+        (tmp_path / f"video_{index:03d}.pts").write_text(f"# timecode format v2\n{index * 10}.000\n")
+    (tmp_path / "files.txt").write_text("")
+    names = [path.rsplit("/", 1)[-1] for path in postprocess.list_segments(str(tmp_path))]
+    assert names == ["video_000.h264", "video_101.h264", "video_999.h264", "video_1000.h264", "video_1001.h264"]
+
+    # Same order as the merged timecodes
+    frames, _ = postprocess.merge_timestamps(str(tmp_path), str(tmp_path / "timestamps.txt"))
+    lines = (tmp_path / "timestamps.txt").read_text().split("\n")[1:frames + 1]
+    assert [float(line) for line in lines] == [0.0, 1010.0, 9990.0, 10000.0, 10010.0]
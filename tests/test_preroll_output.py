@@ -0,0 +1,60 @@
+import threading
+from collections import Counter
+from camera_backend import Output
+from preroll_output import PrerollOutput
+
+FRAME = 1000  # bytes
+GOP = 10
+FRAME_DURATION = 10_000  # us
+
+
+class SlowDisk(Output):
+    """Downstream that stalls on its first frame until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+        self.stalled = threading.Event()
+        self.release = threading.Event()
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if not self.frames:
+            self.stalled.set()
+            self.release.wait(5)
+        self.frames.append((keyframe, timestamp))
+
+
+def feed(preroll, start, count):
+    for i in range(start, start + count):
+        preroll.outputframe(bytes(FRAME), i % GOP == 0, i * FRAME_DURATION)
+
+
+def test_byte_cap_holds_while_draining():
+    disk = SlowDisk()
+    preroll = PrerollOutput(disk, seconds=1, max_bytes=5 * GOP * FRAME)
+    preroll.start()
+    feed(preroll, 0, 100)
+    assert preroll.buffered_bytes <= preroll.max_bytes
+
+    trigger = threading.Thread(target=preroll.trigger)
+    trigger.start()
+    assert disk.stalled.wait(2)
+    # The encoder keeps going while the disk is stuck: memory must stay capped
+    peak = 0
+    for start in range(100, 1100, GOP):
+        feed(preroll, start, GOP)
+        peak = max(peak, preroll.buffered_bytes)
+    assert peak <= preroll.max_bytes
+    disk.release.set()
+    trigger.join(5)
+    assert preroll.triggered
+
+    # What reached the disk starts on a keyframe, every GOP is whole and in order
+    assert disk.frames[0][0]
+    timestamps = [ts for _, ts in disk.frames]
+    assert timestamps == sorted(timestamps)
+    for keyframe, ts in disk.frames:
+        assert keyframe == (ts // FRAME_DURATION % GOP == 0)
+    gop_sizes = Counter(ts // FRAME_DURATION // GOP for _, ts in disk.frames)
+    assert set(gop_sizes.values()) == {GOP}
+    preroll.stop()
@@ -0,0 +1,34 @@
+import time
+import camera_utils
+import test_video
+from adaptive_profile import PAD_PHASE, PROFILES
+from segment_manifest import load_manifest
+
+
+def test_phase_switch_while_armed_keeps_the_preroll(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = test_video.CameraManager()
+    manager.picam = camera_utils.init_camera()
+    manager.handle_arm(test_video.CameraManager.ARM_OPCODE)
+    try:
+        time.sleep(1.0)
+        preroll = manager.preroll_output
+
+        # Pad phase asks for the lightest profile right away: not while only memory holds the footage
+        manager.handle_set_phase(test_video.CameraManager.SET_PHASE_OPCODE + bytes([PAD_PHASE]))
+        time.sleep(1.5)
+        assert manager.profile_controller.index == 0
+        assert preroll.buffered_seconds > 1.5
+
+        manager.handle_start_recording(test_video.CameraManager.START_RECORDING_OPCODE)
+        time.sleep(1.5)
+        assert manager.profile_controller.index == len(PROFILES) - 1  # applied after the trigger
+    finally:
+        directory = manager.main_video_path
+        manager.handle_stop_recording(test_video.CameraManager.STOP_RECORDING_OPCODE)
+
+    segments, _ = load_manifest(directory)
+    frames = sum(segment["closed"]["frames"] for segment in segments.values())
+    # The pre-roll at 120 fps alone is well over 150 frames
+    assert frames > 150 + 30
+    assert segments[0]["idrs"][0][1] == 0
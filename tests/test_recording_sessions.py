@@ -0,0 +1,36 @@
+import os
+import time
+import camera_utils
+import test_video
+
+
+def record(manager, seconds):
+    manager.handle_start_recording(test_video.CameraManager.START_RECORDING_OPCODE)
+    time.sleep(seconds)
+    manager.handle_stop_recording(test_video.CameraManager.STOP_RECORDING_OPCODE)
+    return manager.main_video_path
+
+
+def snapshot(directory):
+    return {name: os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory) if os.path.isfile(os.path.join(directory, name))}
+
+
+def test_start_after_stop_keeps_the_first_recording(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = test_video.CameraManager()
+    manager.picam = camera_utils.init_camera()
+
+    first = record(manager, 1.0)
+    before = snapshot(first)
+    assert before["video_000.h264"] > 0
+    with open(os.path.join(first, "manifest.jsonl")) as f:
+        first_manifest = f.read()
+
+    second = record(manager, 1.0)
+    assert second != first
+    assert snapshot(first) == before
+    with open(os.path.join(first, "manifest.jsonl")) as f:
+        assert f.read() == first_manifest
+    assert snapshot(second)["video_000.h264"] > 0
+    assert os.path.getsize(os.path.join(second, "manifest.jsonl")) > 0
@@ -0,0 +1,87 @@
+import os
+import random
+from mock_camera import IDR_NAL, P_NAL, SPS_PPS
+from segment_manifest import ManifestWriter, load_manifest
+from segment_output import SegmentedOutput
+
+FRAME_DURATION = 10_000  # us
+GOP = 7  # frames per keyframe interval, deliberately not a divisor of the segment length
+
+
+class StubEncoder:
+    """Feeds an output like the H264 encoder: an IDR every GOP frames, ideal timestamps"""
+
+    def __init__(self, output):
+        self.output = output
+        self.frames = []  # (bytes, keyframe, timestamp) as sent
+
+    def run(self, count):
+        self.output.start()
+        for i in range(count):
+            keyframe = i % GOP == 0
+            payload = SPS_PPS + IDR_NAL if keyframe else P_NAL
+            frame = payload + random.randbytes(random.randrange(50, 400))
+            timestamp = i * FRAME_DURATION
+            self.frames.append((frame, keyframe, timestamp))
+            self.output.outputframe(frame, keyframe, timestamp)
+        self.output.stop()
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".h264"))
+
+
+def check_segments(directory, encoder, output):
+    names = segment_files(directory)
+    data = b"".join(open(os.path.join(directory, name), "rb").read() for name in names)
+    # Nothing lost or duplicated at the boundaries, in the original order
+    assert data == b"".join(frame for frame, _, _ in encoder.frames)
+    assert output.frames_written == len(encoder.frames)
+    assert output.bytes_written == len(data)
+    assert output.frames_dropped == 0
+
+    timestamps = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            assert f.read(len(SPS_PPS + IDR_NAL)) == SPS_PPS + IDR_NAL
+        with open(os.path.join(directory, name[:-5] + ".pts")) as f:
+            timestamps += [line.strip() for line in f if not line.startswith("#")]
+    assert timestamps == [f"{ts // 1000}.{ts % 1000:03}" for _, _, ts in encoder.frames]
+    return names
+
+
+def test_rotation_on_keyframes_keeps_every_frame(tmp_path):
+    directory = f"{tmp_path}/"
+    manifest = ManifestWriter(directory)
+    output = SegmentedOutput(directory, segment_seconds=None, segment_frames=20,
+                             frame_duration=FRAME_DURATION, manifest=manifest)
+    encoder = StubEncoder(output)
+    encoder.run(200)
+    manifest.close()
+
+    names = check_segments(directory, encoder, output)
+    assert len(names) > 5
+
+    segments, _ = load_manifest(directory)
+    assert sorted(segments) == list(range(len(names)))
+    sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in names}
+    for index, segment in segments.items():
+        closed = segment["closed"]
+        assert closed["bytes"] == sizes[f"video_{index:03d}.h264"]
+        if index < len(names) - 1:
+            assert closed["frames"] >= 20  # only rotated once full, the last one is cut by stop()
+        # Each segment starts on an IDR at offset 0, and only keyframes are indexed
+        assert segment["idrs"][0][1:] == (0, 0)
+        assert all(frame % GOP == 0 for _, _, frame in segment["idrs"])
+    assert sum(segment["closed"]["frames"] for segment in segments.values()) == len(encoder.frames)
+
+
+def test_rotation_by_time_and_size(tmp_path):
+    for name, limits in (("time", {"segment_seconds": 0.25}),
+                         ("size", {"segment_seconds": None, "segment_bytes": 4000})):
+        directory = f"{tmp_path}/{name}/"
+        os.makedirs(directory)
+        output = SegmentedOutput(directory, frame_duration=FRAME_DURATION, **limits)
+        encoder = StubEncoder(output)
+        encoder.run(150)
+        assert len(check_segments(directory, encoder, output)) > 3
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import pytest
+import shared_status
+from shared_status import SEQUENCE, SharedStatus
+
+
+@pytest.fixture
+def status():
+    status = SharedStatus(name=f"gtxr_test_{os.getpid()}", create=True)
+    yield status
+    status.close()
+
+
+def sequence(status, region):
+    return SEQUENCE.unpack_from(status.shm.buf, status.regions[region].offset)[0]
+
+
+def test_write_then_read(status):
+    status.write("capture", segment_index=3, bytes_written=1 << 40, video_path=b"videos_x/")
+    values = status.read("capture")
+    assert values["segment_index"] == 3 and values["bytes_written"] == 1 << 40
+    assert values["video_path"].rstrip(b"\0") == b"videos_x/"
+    assert values["pid"] == os.getpid()
+    assert sequence(status, "capture") == 2
+    # Only the named fields change, the rest keep the last value written
+    status.write("capture", segment_index=4)
+    assert status.read("capture")["bytes_written"] == 1 << 40
+    assert status.read("monitor")["heartbeat"] == 0.0
+
+
+def write_loop(status, count):
+    # Forked: the child writes through the inherited mapping, like the supervisor's children
+    for i in range(count):
+        status.write("capture", frames_written=i, bytes_written=i, segment_bytes=i)
+
+
+def test_reads_are_never_torn(status, monkeypatch):
+    # A writer this busy is nearly always mid-write: never fall back to a torn read
+    monkeypatch.setattr(shared_status, "READ_RETRIES", 10 ** 9)
+    writer = multiprocessing.get_context("fork").Process(target=write_loop, args=(status, 200_000))
+    writer.start()
+    reads = 0
+    while writer.is_alive() or not reads:
+        values = status.read("capture")
+        assert values["frames_written"] == values["bytes_written"] == values["segment_bytes"]
+        reads += 1
+    writer.join()
+    assert writer.exitcode == 0
+    assert status.read("capture")["frames_written"] == 199_999
+    assert sequence(status, "capture") % 2 == 0
+
+
+def test_recovers_from_a_writer_killed_mid_write(status):
+    status.write("link", packets=5)
+    offset = status.regions["link"].offset
+    # A writer killed between making the sequence odd and making it even again
+    SEQUENCE.pack_into(status.shm.buf, offset, 7)
+    assert status.read("link")["packets"] == 5  # gives up retrying instead of blocking
+
+    status.values.clear()  # as in the restarted child
+    status.write("link", packets=6)
+    assert sequence(status, "link") == 10  # rounded up to even, then one write
+    assert status.read("link")["packets"] == 6
@@ -0,0 +1,21 @@
+import os
+import storage
+from storage import StorageManager
+
+
+def test_preallocation_keeps_the_file_size_truthful(tmp_path):
+    directory = f"{tmp_path}/"
+    manager = StorageManager(directory, min_free_bytes=0, write_block=4096)
+    manager.expected_segment_bytes = 4 * 1024 * 1024
+    path = f"{directory}video_000.h264"
+    f = manager.open_segment(path)
+    assert os.path.getsize(path) == 0
+    if storage.fallocate is not None and manager.preallocated:
+        assert os.stat(path).st_blocks * 512 >= manager.expected_segment_bytes
+
+    for _ in range(10):
+        manager.write(f, bytes(1000))
+    assert os.path.getsize(path) == 8192  # whole blocks written so far, no reserved tail
+    manager.close_segment(f)
+    assert os.path.getsize(path) == 10_000
+    assert os.stat(path).st_blocks * 512 < 1024 * 1024  # the reservation was given back
@@ -0,0 +1,118 @@
+import os
+import types
+import pytest
+import shared_status
+import supervisor
+from supervisor import BACKOFF_MAX, BACKOFF_MIN, STABLE_SECONDS, STARTUP_GRACE, Supervisor
+
+
+class FakeProcess:
+    """Stands in for a forked child; tests decide when it dies"""
+
+    def __init__(self, target=None, args=(), name=None):
+        self.name = name
+        self.alive = False
+        self.exitcode = None
+        self.pid = 1000
+        self.terminated = False
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def die(self, code=1):
+        self.alive = False
+        self.exitcode = code
+
+    def terminate(self):
+        self.terminated = True
+        self.die(-15)
+
+    def join(self, timeout=None):
+        pass
+
+
+@pytest.fixture
+def supervised(monkeypatch):
+    """A Supervisor with fake children on a fake clock; yields (supervisor, clock)"""
+    clock = types.SimpleNamespace(now=1000.0)
+    fake_time = types.SimpleNamespace(monotonic=lambda: clock.now)
+    monkeypatch.setattr(supervisor, "time", fake_time)
+    monkeypatch.setattr(shared_status, "time", fake_time)  # heartbeats on the same clock
+    monkeypatch.setattr(supervisor, "log", lambda msg: None)
+    # Never the live block of a supervisor running on this machine
+    monkeypatch.setattr(supervisor, "SharedStatus",
+                        lambda create: shared_status.SharedStatus(name=f"gtxr_test_{os.getpid()}", create=create))
+    sup = Supervisor()
+    sup.context = types.SimpleNamespace(Process=FakeProcess)
+    for child in sup.children.values():
+        sup.start_child(child)
+    yield sup, clock
+    sup.shared.close()
+
+
+def check_all(sup, hung=()):
+    """One supervisor pass; every running child heartbeats first unless hung"""
+    for child in sup.children.values():
+        if child.process.is_alive() and child.name not in hung:
+            sup.shared.write(child.name)
+    for child in sup.children.values():
+        sup.check(child)
+
+
+def test_only_the_failed_child_is_restarted(supervised):
+    sup, clock = supervised
+    processes = {name: child.process for name, child in sup.children.items()}
+    processes["link"].die()
+    clock.now += 0.1
+    check_all(sup)
+    link = sup.children["link"]
+    assert link.restarts == 1 and link.restart_at == clock.now + BACKOFF_MIN
+
+    clock.now += BACKOFF_MIN
+    check_all(sup)
+    assert link.process is not processes["link"] and link.process.is_alive()
+    assert link.restart_at is None
+    for name in ("capture", "monitor"):
+        assert sup.children[name].process is processes[name]
+        assert sup.children[name].restarts == 0
+    restarts = sup.shared.read("supervisor")
+    assert (restarts["link_restarts"], restarts["capture_restarts"], restarts["monitor_restarts"]) == (1, 0, 0)
+
+
+def test_backoff_doubles_then_resets_once_stable(supervised):
+    sup, clock = supervised
+    child = sup.children["monitor"]
+    delays = []
+    for _ in range(8):
+        child.process.die()
+        check_all(sup)
+        delays.append(child.restart_at - clock.now)
+        clock.now = child.restart_at
+        check_all(sup)
+    assert delays == [min(BACKOFF_MIN * 2 ** i, BACKOFF_MAX) for i in range(8)]
+    assert child.restarts == 8
+
+    # Up for less than STABLE_SECONDS: the next failure still waits the long backoff
+    clock.now += STABLE_SECONDS / 2
+    check_all(sup)
+    assert child.backoff == BACKOFF_MAX
+    clock.now += STABLE_SECONDS
+    check_all(sup)
+    assert child.backoff == BACKOFF_MIN
+    child.process.die()
+    check_all(sup)
+    assert child.restart_at - clock.now == BACKOFF_MIN
+
+
+def test_lost_heartbeat_restarts_a_hung_child(supervised):
+    sup, clock = supervised
+    check_all(sup)
+    hung = sup.children["capture"].process
+    clock.now += STARTUP_GRACE + 1
+    check_all(sup, hung=("capture",))
+    assert hung.terminated
+    assert sup.children["capture"].restarts == 1
+    assert not sup.children["link"].process.terminated and sup.children["link"].restarts == 0
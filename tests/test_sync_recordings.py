@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import pytest
+import sync_recordings
+from segment_manifest import MANIFEST_NAME
+from sync_recordings import SyncClient, SyncServer, file_crc32
+
+SESSION = "videos_test"
+SEGMENT_BYTES = 300_000
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    """A session with closed segments, a thumbnail and an empty file behind a port-0 loopback server"""
+    monkeypatch.setattr(sync_recordings, "RETRY_DELAY", 0.01)
+    directory = tmp_path / "root" / SESSION
+    os.makedirs(directory / "thumbs")
+    with open(directory / MANIFEST_NAME, "w") as manifest:
+        for index in range(3):
+            (directory / f"video_{index:03d}.h264").write_bytes(os.urandom(SEGMENT_BYTES))
+            (directory / f"video_{index:03d}.pts").write_text("# timecode format v2\n0.000\n")
+            manifest.write(json.dumps({"type": "segment", "segment": index, "first_pts_us": 0,
+                                       "last_pts_us": 0, "bytes": SEGMENT_BYTES, "frames": 1}) + "\n")
+    (directory / "thumbs" / "thumb_000.jpg").write_bytes(os.urandom(4000))
+    (directory / "thumbs" / "empty.jpg").write_bytes(b"")
+    server = SyncServer(tmp_path / "root", port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, directory, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def pull(url, dest):
+    return SyncClient(url, workers=2, log=lambda msg: None).pull(SESSION, str(dest))
+
+
+def check_copy(source, copy):
+    names = sorted(os.path.relpath(os.path.join(parent, name), source)
+                   for parent, _, files in os.walk(source) for name in files if not name.startswith(".sync"))
+    assert names == sorted(os.path.relpath(os.path.join(parent, name), copy)
+                           for parent, _, files in os.walk(copy) for name in files if not name.startswith(".sync"))
+    for name in names:
+        assert file_crc32(os.path.join(copy, name)) == file_crc32(os.path.join(source, name))
+
+
+def test_server_listens_on_loopback_only(served):
+    server, _, _ = served
+    assert server.server_address[0] == "127.0.0.1"
+
+
+def test_fresh_sync_then_noop(served, tmp_path):
+    _, directory, url = served
+    report = pull(url, tmp_path / "dest")
+    assert report["failed"] == [] and report["mismatched"] == []
+    assert report["fetched"] == report["files"] == 9
+    check_copy(directory, tmp_path / "dest" / SESSION)
+    assert os.path.getsize(tmp_path / "dest" / SESSION / "thumbs" / "empty.jpg") == 0
+
+    report = pull(url, tmp_path / "dest")
+    assert report["fetched"] == 0 and report["bytes"] == 0
+    assert report["up_to_date"] == report["verified"] == 9
+
+
+def test_resume_after_cut_responses(served, tmp_path):
+    server, directory, url = served
+    server.fail_after = SEGMENT_BYTES // 4
+    report = pull(url, tmp_path / "dest")
+    assert report["failed"] == [] and report["mismatched"] == []
+    # Each segment needs four requests: one fresh, three continuing its .part
+    assert report["resumed"] == 3 * 3
+    assert report["bytes"] == sum(os.path.getsize(os.path.join(parent, name))
+                                  for parent, _, files in os.walk(directory) for name in files
+                                  if not name.startswith(".sync"))
+    check_copy(directory, tmp_path / "dest" / SESSION)
+    assert not [name for name in os.listdir(tmp_path / "dest" / SESSION) if name.endswith(".part")]
@@ -0,0 +1,55 @@
+import pytest
+import telemetry_log
+from telemetry_log import FIELDS, HEADER, LEGACY_RECORDS, MAGIC, RECORD, VERSION, TelemetryLog, read_records
+
+
+def sample(index, fields):
+    """One record's values: distinct per field and exactly representable as f32"""
+    values = {}
+    for position, name in enumerate(fields):
+        if name == "timestamp":
+            values[name] = 1_750_000_000.0 + index
+        elif name in ("bytes_per_second", "cpu_temp", "load"):
+            values[name] = index + position + 0.5
+        elif name in ("busy", "profile", "phase"):
+            values[name] = (index + position) % 2
+        else:
+            values[name] = index * 100 + position
+    return values
+
+
+@pytest.mark.parametrize("version", [1, 2, 3])
+def test_legacy_versions_round_trip(tmp_path, version):
+    record, fields = LEGACY_RECORDS[version]
+    expected = [sample(i, fields) for i in range(5)]
+    path = tmp_path / f"v{version}.bin"
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, record.size))
+        for values in expected:
+            f.write(record.pack(*(values[name] for name in fields)))
+        f.write(bytes(record.size * 3))  # preallocated tail
+    assert list(read_records(path)) == expected
+
+
+def test_current_version_round_trip(tmp_path):
+    path = str(tmp_path / f"v{VERSION}.bin")
+    expected = [sample(i, FIELDS) for i in range(20)]
+    log = TelemetryLog(path, capacity=8, flush_every=4)
+    for values in expected:
+        log.append(**{name: values[name] for name in FIELDS[1:]}, timestamp=values["timestamp"])
+        log.flush()  # the ring holds only 8 records
+    log.close()
+    with open(path, "rb") as f:
+        assert HEADER.unpack(f.read(HEADER.size)) == (MAGIC, VERSION, RECORD.size)
+    assert list(read_records(path)) == expected
+    assert telemetry_log.count_records(path) == len(expected)
+
+
+def test_unknown_version_is_rejected(tmp_path):
+    path = tmp_path / "v99.bin"
+    path.write_bytes(HEADER.pack(MAGIC, 99, 40) + bytes(40))
+    with pytest.raises(ValueError):
+        list(read_records(path))
+    path.write_bytes(HEADER.pack(MAGIC, 1, 40) + bytes(40))  # v1 number, wrong record size
+    with pytest.raises(ValueError):
+        list(read_records(path))
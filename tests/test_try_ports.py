@@ -0,0 +1,58 @@
+import os
+import threading
+import tty
+import pytest
+import try_ports
+from gt_packet_rasp_pi import GTPacketParser, build_gt_packet
+
+
+@pytest.fixture
+def peer(tmp_path, monkeypatch):
+    """A flight computer on a pty pair that answers PING; yields (port, bytes it received)"""
+    monkeypatch.setattr(try_ports, "CACHE_PATH", str(tmp_path / "last_port.txt"))
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    received = bytearray()
+    stop = threading.Event()
+
+    def answer():
+        parser = GTPacketParser()
+        while not stop.is_set():
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            received.extend(data)
+            for payload in parser.feed(data):
+                if payload[0] == try_ports.PING_OPCODE:
+                    os.write(master, build_gt_packet(bytes([try_ports.PONG_OPCODE]) + payload[1:]))
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    yield os.ttyname(slave), received
+    stop.set()
+    os.close(slave)
+    os.close(master)
+
+
+def test_explicit_pty_is_probed_and_cached(peer):
+    port, received = peer
+    assert try_ports.try_ports([port], handshake_timeout=0.5) == port
+    assert try_ports.read_cache() == port
+
+
+def test_default_list_never_pings_a_pty(peer, monkeypatch):
+    port, received = peer
+    try_ports.write_cache(port)  # left over from an earlier run with an explicit port
+    monkeypatch.setattr(try_ports, "possible_ports", [port])
+    assert try_ports.try_ports(handshake_timeout=0.5) is None
+    assert not received
+
+
+def test_console_is_not_a_candidate(monkeypatch):
+    monkeypatch.setattr(try_ports, "console_devices", lambda: {"/dev/null"})
+    monkeypatch.setattr(try_ports, "possible_ports", ["/dev/null"])
+    assert try_ports.candidates(handshake=True) == []
+    assert try_ports.candidates() == ["/dev/null"]
+    assert try_ports.candidates(["/dev/null"], handshake=True) == ["/dev/null"]
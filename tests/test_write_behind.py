@@ -0,0 +1,44 @@
+import threading
+from camera_backend import Output
+from write_behind import WriteBehindOutput
+
+
+class GatedDisk(Output):
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        self.entered.set()
+        self.gate.wait(5)
+        self.frames.append(frame)
+
+
+def test_backpressure_counts_only_real_waits():
+    disk = GatedDisk()
+    output = WriteBehindOutput(disk, max_bytes=1000)
+    output.start()
+    # Larger than the whole queue, but the queue is empty: no wait
+    output.outputframe(bytes(1500))
+    assert output.backpressure_events == 0
+
+    disk.gate.set()
+    output.stop()
+    disk.gate.clear()
+    disk.entered.clear()
+    output.start()
+    output.outputframe(bytes(600))
+    assert disk.entered.wait(2)  # the writer is stuck on the first frame
+    output.outputframe(bytes(300))
+    blocked = threading.Thread(target=output.outputframe, args=(bytes(300),))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()  # held back until the writer catches up
+    disk.gate.set()
+    blocked.join(2)
+    output.stop()
+    assert output.backpressure_events == 1
+    assert [len(frame) for frame in disk.frames] == [1500, 600, 300, 300]
@@ -0,0 +1,182 @@
+import io
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+"""
+Small JPEG previews that fit a few GT transfer windows.
+Thumbnails come from the 320x240 YUV420 lores stream: taking every other
+luma sample gives 160x120, exactly the size of the U and V planes, so the
+RGB conversion needs no decoding and no resampling. Without a lores
+stream the main RGB buffer is strided down instead. JPEG quality is
+lowered until the file fits max_bytes.
+
+CPU time (thread time) of every thumbnail is accumulated in `stats`.
+"""
+
+THUMBNAIL_MAX_BYTES = 8 * 1024
+THUMBNAIL_WIDTH = 160
+QUALITIES = (75, 60, 45, 30, 20, 10)
+
+stats = {"count": 0, "cpu_seconds": 0.0, "max_cpu_seconds": 0.0, "bytes": 0}
+stats_lock = threading.Lock()
+
+
+def yuv420_to_rgb(yuv, width, height):
+    """Half-resolution RGB from a planar YUV420 buffer of height*3/2 rows"""
+    y = yuv[:height, :width][::2, ::2].astype(np.float32)
+    chroma = yuv[height:height + height // 2].reshape(-1)
+    u = chroma[:width * height // 4].reshape(height // 2, width // 2).astype(np.float32) - 128
+    v = chroma[width * height // 4:width * height // 2].reshape(height // 2, width // 2).astype(np.float32) - 128
+    rgb = np.empty((height // 2, width // 2, 3), dtype=np.float32)
+    rgb[..., 0] = y + 1.402 * v
+    rgb[..., 1] = y - 0.344136 * u - 0.714136 * v
+    rgb[..., 2] = y + 1.772 * u
+    return np.clip(rgb, 0, 255).astype(np.uint8)
+
+
+def downsample_rgb(array, width=THUMBNAIL_WIDTH):
+    """Strided view of an (h, w, 3|4) buffer, then one small copy"""
+    step = max(1, -(-array.shape[1] // width))
+    return np.ascontiguousarray(array[::step, ::step, :3])
+
+
+def lores_rgb(array, lores_size):
+    width, height = lores_size
+    return yuv420_to_rgb(array, width, height)
+
+
+def encode_jpeg(rgb, max_bytes=THUMBNAIL_MAX_BYTES):
+    from PIL import Image
+    image = Image.fromarray(rgb)
+    while True:
+        for quality in QUALITIES:
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG", quality=quality, optimize=True)
+            if buf.tell() <= max_bytes:
+                return buf.getvalue()
+        # Still too big at the lowest quality: halve the resolution
+        if image.width <= 16:
+            return buf.getvalue()
+        image = image.resize((image.width // 2, image.height // 2))
+
+
+def make_thumbnail(array, lores_size=None, max_bytes=THUMBNAIL_MAX_BYTES):
+    """JPEG bytes from a lores YUV420 array (lores_size given) or a main RGB array"""
+    start = time.thread_time()
+    rgb = lores_rgb(array, lores_size) if lores_size else downsample_rgb(array)
+    jpeg = encode_jpeg(rgb, max_bytes)
+    cpu = time.thread_time() - start
+    with stats_lock:
+        stats["count"] += 1
+        stats["cpu_seconds"] += cpu
+        stats["max_cpu_seconds"] = max(stats["max_cpu_seconds"], cpu)
+        stats["bytes"] += len(jpeg)
+    return jpeg
+
+
+def thumbnail_path(photo_path):
+    root, _ = os.path.splitext(photo_path)
+    return root + "_thumb.jpg"
+
+
+def write_thumbnail(array, path, lores_size=None, max_bytes=THUMBNAIL_MAX_BYTES):
+    try:
+        jpeg = make_thumbnail(array, lores_size, max_bytes)
+        with open(path, "wb") as f:
+            f.write(jpeg)
+        print(f"Thumbnail saved to {path} ({len(jpeg)} bytes)")
+    except Exception as e:
+        print(f"Error, thumbnail unsuccessful: {e}")
+    return path
+
+
+def capture_arrays(request, config):
+    """Copy what a thumbnail needs out of a request; returns (array, lores_size)"""
+    lores = (config or {}).get("lores")
+    if lores:
+        return request.make_array("lores"), tuple(lores["size"])
+    return request.make_array("main"), None
+
+
+def stats_summary():
+    with stats_lock:
+        count = stats["count"]
+        if not count:
+            return "no thumbnails yet"
+        return (f"{count} thumbnails, mean {stats['cpu_seconds'] / count * 1e3:.1f} ms CPU, "
+                f"max {stats['max_cpu_seconds'] * 1e3:.1f} ms, mean {stats['bytes'] // count} bytes")
+
+
+class ThumbnailSampler:
+    """Saves a thumbnail of the running video every `interval` seconds"""
+
+    def __init__(self, picam2, directory, interval=10, worker=None):
+        self.picam2 = picam2
+        self.directory = os.path.join(directory, "thumbs")
+        self.interval = interval
+        self.worker = worker  # executor for the JPEG encoding, None: inline
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="thumbnails", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        print(f"Video thumbnails: {stats_summary()}")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                request = self.picam2.capture_request()
+                try:
+                    array, lores_size = capture_arrays(request, self.picam2.camera_config)
+                finally:
+                    request.release()
+            except Exception as e:
+                print(f"Thumbnail capture failed: {e}")
+                continue
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(self.directory, f"thumb_{ts}.jpg")
+            if self.worker:
+                self.worker.submit(write_thumbnail, array, path, lores_size)
+            else:
+                write_thumbnail(array, path, lores_size)
+
+
+if __name__ == "__main__":
+    # CPU cost per thumbnail on synthetic frames
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Thumbnail CPU cost benchmark")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--max-bytes", type=int, default=THUMBNAIL_MAX_BYTES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Smooth gradients plus noise compress like a real scene, pure noise would not
+    yy, xx = np.mgrid[0:240, 0:320]
+    luma = ((xx + yy) % 256).astype(np.uint8)
+    lores = np.concatenate([luma, np.full((120, 320), 128, np.uint8)])
+    lores = np.clip(lores + rng.integers(0, 16, lores.shape), 0, 255).astype(np.uint8)
+    yy, xx = np.mgrid[0:2464, 0:3280]
+    still = np.dstack([(xx // 13) % 256, (yy // 10) % 256, ((xx + yy) // 23) % 256]).astype(np.uint8)
+
+    for name, array, size in (("lores 320x240 YUV420", lores, (320, 240)),
+                              (f"main {still.shape[1]}x{still.shape[0]} RGB", still, None)):
+        make_thumbnail(array, size, args.max_bytes)  # warm up (PIL import)
+        with stats_lock:
+            stats.update(count=0, cpu_seconds=0.0, max_cpu_seconds=0.0, bytes=0)
+        for _ in range(args.count):
+            make_thumbnail(array, size, args.max_bytes)
+        print(f"{name}: {stats_summary()}")
+    frame_ms = 1000 / 120
+    print(f"(a 120 fps frame interval is {frame_ms:.1f} ms; thumbnails run on a separate worker thread)")
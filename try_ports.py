@@ -1,5 +1,21 @@
 import serial
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gt_packet_rasp_pi import GTPacketParser, build_gt_packet
+
+"""
+Finds the serial port the flight computer is on. The cached last good port
+is tried first; then every existing candidate (symlinks resolved, so
+/dev/serial0 and its target are probed once) is opened concurrently and
+sent a GT PING. The first port whose peer answers with a PONG carrying the
+same nonce wins and is written to the cache.
+
+A PING is bytes written to the device, so the default list skips ports
+that belong to someone else: the kernel / login console UART and the
+pseudo-terminals under /dev/pts. They are only probed when passed
+explicitly in `ports` (e.g. a pty pair in a bench test).
+"""
 
 # List of possible serial ports
 possible_ports = [
@@ -32,17 +48,121 @@ possible_ports = [
 baudrate = 115200  # Change if needed
 timeout = 1        # Seconds
 
-def try_ports():
-    ser = None
-    for port in possible_ports:
-        try:
-            if os.path.exists(port):
-                ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)
-                print(f"Connected to serial port: {port}")
-                ser.close()
-                return port
-        except Exception as e:
-            # print(f"Failed to open {port}: {e}")
+PING_OPCODE = 0x07  # payload: opcode + nonce, answered by PONG + the same nonce
+PONG_OPCODE = 0x08
+CACHE_PATH = "logs/last_port.txt"
+PTY_DIR = "/dev/pts/"
+
+
+def probe(port, nonce, handshake_timeout=timeout):
+    """True if a GT peer on `port` answers our PING"""
+    try:
+        ser = serial.Serial(port, baudrate=baudrate, timeout=0.05)
+    except Exception:
+        return False
+    try:
+        ser.reset_input_buffer()
+        ser.write(build_gt_packet(bytes([PING_OPCODE]) + nonce))
+        parser = GTPacketParser()
+        deadline = time.monotonic() + handshake_timeout
+        while time.monotonic() < deadline:
+            chunk = ser.read(max(1, ser.in_waiting))
+            for payload in parser.feed(chunk):
+                if payload == bytes([PONG_OPCODE]) + nonce:
+                    return True
+        return False
+    except Exception:
+        return False
+    finally:
+        ser.close()
+
+
+def read_cache():
+    try:
+        with open(CACHE_PATH) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_cache(port):
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, "w") as f:
+            f.write(port + "\n")
+    except OSError as e:
+        print(f"Could not cache serial port: {e}")
+
+
+def console_devices():
+    """Real paths of the devices the kernel console and its login getty use"""
+    names = []
+    try:
+        with open("/sys/class/tty/console/active") as f:
+            names += f.read().split()
+    except OSError:
+        pass
+    try:
+        with open("/proc/cmdline") as f:
+            names += [arg[len("console="):].split(",")[0] for arg in f.read().split()
+                      if arg.startswith("console=")]
+    except OSError:
+        pass
+    return {os.path.realpath(f"/dev/{name}") for name in names if name}
+
+
+def candidates(ports=None, handshake=False):
+    """Existing ports, in order, one path per real device"""
+    seen = set()
+    found = []
+    if handshake and not ports:
+        # Never write a PING to a terminal that was not asked for
+        seen |= console_devices()
+    for port in ports or possible_ports:
+        real = os.path.realpath(port)
+        if real in seen or not os.path.exists(port):
             continue
-    else:
+        if handshake and not ports and real.startswith(PTY_DIR):
+            continue
+        seen.add(real)
+        found.append(port)
+    return found
+
+
+def try_ports(ports=None, handshake=True, handshake_timeout=timeout):
+    """Port of the flight computer, or None if nobody answered"""
+    if not handshake:
+        # Legacy behaviour: first port that exists and opens
+        for port in candidates(ports):
+            try:
+                serial.Serial(port, baudrate=baudrate, timeout=timeout).close()
+                return port
+            except Exception:
+                continue
         return None
+
+    nonce = os.urandom(4)
+    ports = candidates(ports, handshake=True)
+    cached = read_cache()
+    # Only a port we may probe anyway: a cached /dev/pts/N may be someone's terminal by now
+    if cached in ports and probe(cached, nonce, handshake_timeout):
+        print(f"Connected to serial port: {cached} (cached)")
+        return cached
+
+    ports = [port for port in ports if port != cached]
+    if not ports:
+        return None
+    start = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="port-probe")
+    try:
+        futures = {pool.submit(probe, port, nonce, handshake_timeout): port for port in ports}
+        for future in as_completed(futures):
+            if future.result():
+                port = futures[future]
+                print(f"Connected to serial port: {port} "
+                      f"({len(ports)} probed in {time.monotonic() - start:.2f} s)")
+                write_cache(port)
+                return port
+    finally:
+        pool.shutdown(wait=False)
+    return None
@@ -0,0 +1,86 @@
+import threading
+from collections import deque
+from camera_backend import Output
+
+"""
+Write-behind output between the H264 encoder and the SD card.
+outputframe() only queues the encoded frame; a dedicated writer thread
+drains the queue into the downstream output (SegmentedOutput, whose
+StorageManager turns the frames into large aligned writes). A stalled
+card then fills the queue instead of blocking the encoder. Past max_bytes
+the encoder is held back (backpressure) until the writer catches up.
+"""
+
+WRITE_BEHIND_MAX_BYTES = 48 * 1024 * 1024
+
+
+class WriteBehindOutput(Output):
+
+    def __init__(self, downstream, max_bytes=WRITE_BEHIND_MAX_BYTES):
+        super().__init__()
+        self.downstream = downstream
+        self.max_bytes = max_bytes
+
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.writer = None
+        self.stopping = False
+
+        # Counters for the monitor and telemetry
+        self.queued_bytes = 0
+        self.high_water_bytes = 0
+        self.backpressure_events = 0
+
+    @property
+    def queue_depth(self):
+        return len(self.queue)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio or not self.recording:
+            return
+        # The encoder reuses its buffers, keep our own copy
+        item = (bytes(frame), keyframe, timestamp)
+        with self.condition:
+            if self.queued_bytes + len(item[0]) > self.max_bytes and self.queue:
+                # Only counted when the encoder really has to wait; a single frame
+                # above the cap goes into an empty queue straight away
+                self.backpressure_events += 1
+                while self.queued_bytes + len(item[0]) > self.max_bytes and self.queue:
+                    self.condition.wait()
+            self.queue.append(item)
+            self.queued_bytes += len(item[0])
+            self.high_water_bytes = max(self.high_water_bytes, self.queued_bytes)
+            self.condition.notify_all()
+
+    def run_writer(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.stopping:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                batch = list(self.queue)
+                self.queue.clear()
+            for frame, keyframe, timestamp in batch:
+                self.downstream.outputframe(frame, keyframe, timestamp)
+            with self.condition:
+                self.queued_bytes -= sum(len(frame) for frame, _, _ in batch)
+                self.condition.notify_all()
+
+    def start(self):
+        super().start()
+        self.downstream.start()
+        self.stopping = False
+        self.writer = threading.Thread(target=self.run_writer, name="write-behind", daemon=True)
+        self.writer.start()
+
+    def stop(self):
+        super().stop()
+        # Drain everything that was queued before closing the files
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.writer:
+            self.writer.join()
+            self.writer = None
+        self.downstream.stop()